@@ -0,0 +1,207 @@
+from gametable import GameTable, COLUMN_GENRE, SALES_COLUMNS
+from instrument import profiled
+from memo import memoized
+
+# the names of the statistics every group gets
+STATS = ("count", "sum", "mean", "min", "max")
+
+
+def key_function(key):
+    """
+    Does:
+        Turns the different ways of describing a group key into a function
+        that gets the key out of a row
+
+    Parameters:
+        •key
+            •None (everything in one group), a column index, a tuple of
+            column indexes, or a function that takes a row
+
+    Returns:
+        function that takes a row and returns its group key
+    """
+    if key is None:
+        return lambda row: None
+    if callable(key):
+        return key
+    if isinstance(key, tuple):
+        return lambda row: tuple(row[col] for col in key)
+    return lambda row: row[key]
+
+
+def table_pairs(table, key, value_cols):
+    """
+    Does:
+        Makes the (group key, values) pairs for a GameTable by zipping its
+        columns together, so no rows have to be built. Category columns are
+        grouped on their codes, which get decoded at the very end
+
+    Parameters:
+        •table (GameTable)
+        •key
+            •None, a column index, or a tuple of column indexes
+        •value_cols (list of ints)
+
+    Returns:
+        tuple of the iterator of pairs and a function for decoding the keys
+    """
+    values = zip(*[table.columns[col] for col in value_cols]) if value_cols else None
+
+    if key is None:
+        keys = [None] * len(table)
+        decode = lambda code: code
+    elif isinstance(key, tuple):
+        keys = zip(*[table.columns[col] for col in key])
+        vocabs = [table.vocabularies.get(col) for col in key]
+        decode = lambda codes: tuple(vocab[code] if vocab is not None else code
+                                     for code, vocab in zip(codes, vocabs))
+    else:
+        keys = table.columns[key]
+        vocab = table.vocabularies.get(key)
+        decode = (lambda code: vocab[code]) if vocab is not None else (lambda code: code)
+
+    if values is None:
+        values = [()] * len(table)
+
+    return zip(keys, values), decode
+
+
+def running_totals(data, key, value_cols):
+    """
+    Does:
+        The single pass behind group_by, without turning the totals into
+        dicts at the end (which is most of the work when there are lots of
+        small groups)
+
+    Parameters:
+        •data, key, value_cols
+            •the same as group_by
+
+    Returns:
+        dict of group key : [count, sums, mins, maxes], where each of the
+        last three is a list in the order of value_cols
+    """
+    value_cols = list(value_cols)
+
+    # a database works out the totals itself with a GROUP BY (anything with
+    # its own running_totals is asked, so the backend isn't imported here)
+    database_totals = getattr(data, "running_totals", None)
+    if database_totals is not None and not callable(key):
+        return database_totals(key, value_cols)
+
+    # getting an iterator of (key, values) pairs for whatever kind of data this is
+    if isinstance(data, GameTable) and not callable(key):
+        pairs, decode = table_pairs(data, key, value_cols)
+    else:
+        key_of = key_function(key)
+        pairs = ((key_of(row), [row[col] for col in value_cols]) for row in data)
+        decode = None
+
+    # the running totals for each group, kept as lists since they're
+    # quicker to update than dicts: [count, sums, mins, maxes]
+    groups = {}
+    positions = range(len(value_cols))
+
+    for group_key, values in pairs:
+        running = groups.get(group_key)
+
+        # first game in the group sets all the running values
+        if running is None:
+            groups[group_key] = [1, list(values), list(values), list(values)]
+            continue
+
+        running[0] += 1
+        sums, mins, maxes = running[1], running[2], running[3]
+        for i in positions:
+            value = values[i]
+            sums[i] += value
+            if value < mins[i]:
+                mins[i] = value
+            elif value > maxes[i]:
+                maxes[i] = value
+
+    # table groups were keyed on codes, so they get their real keys back
+    if decode is not None:
+        groups = {decode(group_key): running for group_key, running in groups.items()}
+
+    return groups
+
+
+@profiled
+@memoized
+def group_by(data, key, value_cols):
+    """
+    Does:
+        Groups the games by a key and works out the count, sum, mean, min and
+        max of each of the value columns for every group, going through the
+        data only once (each game is dropped straight into its group's
+        running totals using a dictionary lookup)
+
+    Parameters:
+        •data
+            •2D list of lists, a GameTable, a sqlstore.SalesDatabase (which
+            runs it as SQL), or any iterable of rows (like a generator from
+            the streaming pipeline)
+        •key
+            •None to put every game in one group, a column index, a tuple of
+            column indexes, or a function that takes a row and returns a key
+                •a function only works on rows, so a GameTable (or
+                database) is iterated row by row in that case
+        •value_cols (list of ints)
+            •the columns to work out statistics for (can be empty, in which
+            case only the counts are worked out)
+
+    Returns:
+        •A dict where
+            •the keys are the group keys, in the order they first show up
+            •the values are dicts with "count" (int) and "sum", "mean",
+            "min" and "max" (each a dict of value column : number)
+        •the same result is handed back for the same data and arguments
+        (see memo.py), so it shouldn't be changed
+    """
+    value_cols = list(value_cols)
+    return totals_to_stats(running_totals(data, key, value_cols), value_cols)
+
+
+def totals_to_stats(groups, value_cols):
+    """
+    Does:
+        Turns running totals (from running_totals) into the finished
+        statistics that group_by gives
+
+    Parameters:
+        •groups (dict)
+            •group key : [count, sums, mins, maxes]
+        •value_cols (list of ints)
+            •the columns the sums, mins and maxes are in the order of
+
+    Returns:
+        group_by result
+    """
+    result = {}
+    for group_key, (count, sums, mins, maxes) in groups.items():
+        result[group_key] = {
+            "count": count,
+            "sum": dict(zip(value_cols, sums)),
+            "mean": {col: total / count for col, total in zip(value_cols, sums)},
+            "min": dict(zip(value_cols, mins)),
+            "max": dict(zip(value_cols, maxes)),
+        }
+    return result
+
+
+def group_by_genre(data):
+    """
+    Does:
+        Works out the statistics of every sales column for each genre in a
+        single pass. This is everything the genre/region analysis functions
+        need, so it can be worked out once and handed to each of them
+
+    Parameters:
+        •data
+            •2D list of lists, a GameTable, or any iterable of rows
+
+    Returns:
+        group_by result keyed by genre name
+    """
+    return group_by(data, COLUMN_GENRE, SALES_COLUMNS)
@@ -1,4 +1,6 @@
-from clean import read_file, remove_missing_data, convert_str_to_float, remove_games_before_year
+from clean import load_cleaned_data
+from aggregate import group_by, group_by_genre
+from instrument import profiled
 FILENAME = "vgsales.csv"
 COLUMN_RANK = 0
 COLUMN_NAME = 1
@@ -12,27 +14,17 @@ COLUMN_JP = 8
 COLUMN_OTHER = 9
 COLUMN_GLOBAL = 10
 
-# reading the CSV file into a 2d list
-data = read_file(FILENAME)
-
-# removing any games that have any missing pieces of data associated with them
-non_empty_data = remove_missing_data(data)
-
-# converting any numeric values into proper integer format instead of strings
-converted_type_data = convert_str_to_float(non_empty_data, COLUMN_RANK, COLUMN_YEAR, COLUMN_NA,
-                                           COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL)
-
-# removing any games before the year range we are working with
-cleaned_data = remove_games_before_year(converted_type_data)
-
-
 # constant dictionary for correlating the column numbers (in the processed data) with what their values mean
 COLS = {"rank" : 0, "name" : 1, "platform" : 2, "year" : 3, "genre" : 4,
         "publisher" : 5, "region_NA" : 6, "region_EU" : 7, "region_JP" : 8,
         "region_other" : 9}
 
+# the sales columns of the four regions, in the same order as the regions are listed
+REGION_COLUMNS = [COLS["region_NA"], COLS["region_EU"], COLS["region_JP"], COLS["region_other"]]
 
-def calc_region_totals(data, regions):
+
+@profiled
+def calc_region_totals(data, regions, genre_stats=None):
     """
     Does:
         Calculates the total game sales in each region (both as an absolute
@@ -40,7 +32,7 @@ def calc_region_totals(data, regions):
 
     Parameters:
         •data
-            •2D list of lists
+            •2D list of lists (or a GameTable)
             •Dataset containing game information
         •regions - list of strings
             •The names of the regions - in order
@@ -48,6 +40,11 @@ def calc_region_totals(data, regions):
              because their info is not included in the data lists; it's only in
              the CSV's headers, which weren't included since we processed each
              row as a list instead of a dictionary
+        •genre_stats - dict (optional)
+            •the result of aggregate.group_by_genre(data), if it has already
+             been worked out, so the data doesn't have to be gone through again
+             (data can then be None, e.g. when the stats came from the
+             streaming pipeline in clean.stream_cleaned_data)
 
     Returns:
         •A 2D dictionary where
@@ -56,24 +53,24 @@ def calc_region_totals(data, regions):
           the total sums at the end)
     """
 
+    # getting the sums of every genre in one go through the data
+    if genre_stats is None:
+        genre_stats = group_by(data, COLS["genre"], REGION_COLUMNS)
+
     # creating an empty dictionary to add stuff into
     regional_totals = {}
 
-    # getting a list of genres
-    list_of_genres = find_genres(data)
-
-    # going through the list of regions and adding portions for them to the dict
-    # each of which contains a (currently empty) dictionary
-    for region in regions:
+    # each region lines up with one of the sales columns, in order
+    for region, region_col in zip(regions, REGION_COLUMNS):
         regional_totals[region] = {}
 
-        # then each of those inner-dicts is given a spot for each region
-        # (set to 0 already so it can be added to later)
-        for genre in list_of_genres:
-            regional_totals[region][genre] = 0
+        # the inner dict gets each genre's sum (the genres come out of the
+        # group-by in the order they first show up, like find_genres)
+        for genre, stats in genre_stats.items():
+            regional_totals[region][genre] = stats["sum"][region_col]
 
         # also then adding one last section to the region: its total sales
-        regional_totals[region]["total_sales"] = 0
+        regional_totals[region]["total_sales"] = sum(regional_totals[region].values())
 
     # thus, this is now the setup: more or less
     '''
@@ -83,144 +80,126 @@ def calc_region_totals(data, regions):
             ...
         }
     '''
-    # which seems ready to collect the sums!
-
-    # finally going through the data itself...
-    for game in data:
-
-        # for each game, it gets tested against each of the genres
-        for genre in list_of_genres:
-            if game[COLS["genre"]] == genre:
-                # and gets added only to genre-specific sum it fits
-                regional_totals[regions[0]][genre] += game[COLS["region_NA"]]
-                regional_totals[regions[1]][genre] += game[COLS["region_EU"]]
-                regional_totals[regions[2]][genre] += game[COLS["region_JP"]]
-                regional_totals[regions[3]][genre] += game[COLS["region_other"]
-                ]
-
-        # also, their sales are generally added to each region's total sales
-        regional_totals[regions[0]]["total_sales"] += game[COLS["region_NA"]]
-        regional_totals[regions[1]]["total_sales"] += game[COLS["region_EU"]]
-        regional_totals[regions[2]]["total_sales"] += game[COLS["region_JP"]]
-        regional_totals[regions[3]]["total_sales"] += game[COLS["region_other"]
-        ]
 
     # returning the 2d dict
     return regional_totals
 
 
-def find_genres(data):
+@profiled
+def find_genres(data, genre_stats=None):
     """
     Does:
         Returns a list of all the genres featured in a dataset
 
     Parameters:
         •data
-            •list of lists: a dataset containing games and their information
+            •list of lists (or a GameTable): a dataset containing games and
+            their information
+        •genre_stats - dict (optional)
+            •the result of aggregate.group_by_genre(data), if already worked out
+             (data can be None then)
 
     Returns:
         list of genre names (as strings)
     """
 
-    # creating an empty list to append into
-    genre_list = []
-
-    # going through all the games in the data set
-    for game in data:
-        # if the game's genre hasn't been seen yet, it is added to the genre list
-        if game[COLS["genre"]] not in genre_list:
-            genre_list.append(game[COLS["genre"]])
+    # the group-by keeps the genres in the order they first show up in
+    if genre_stats is None:
+        genre_stats = group_by(data, COLS["genre"], [])
 
     # list of genres is returned
-    return genre_list
+    return list(genre_stats.keys())
 
-def get_genre_sizes(data, genres):
+@profiled
+def get_genre_sizes(data, genres, genre_stats=None):
     """
     Does:
         Finds out how many games are in each genre
 
     Parameters:
         •data
-            •2D list of games and their information
+            •2D list of games and their information (or a GameTable)
         •genres
             •list of lists holding the different genre names
+        •genre_stats - dict (optional)
+            •the result of aggregate.group_by_genre(data), if already worked out
+             (data can be None then)
 
     Returns:
         dict of genre names correlated with integer values of the number
         of games in that genre
     """
 
+    # counting the games in every genre in one go through the data
+    if genre_stats is None:
+        genre_stats = group_by(data, COLS["genre"], [])
+
     # creating a dict of the number of games in each genre
+    # (genres without any games in the data just get a count of 0)
     num_of_games = {}
-
-    # going through each genre and setting up their genre with a count of 0
-    # so that i can add to it later when counting
     for genre in genres:
-        num_of_games[genre] = 0
-
-    # going through all the games
-    for game in data:
-        # comparing each game to all the genres
-        for genre in num_of_games.keys():
-            # and increasing the count of whichever genre it fits into by one
-            if game[COLS["genre"]] == genre:
-                num_of_games[genre] += 1
+        num_of_games[genre] = genre_stats[genre]["count"] if genre in genre_stats else 0
 
     return num_of_games
 
-def get_genre_total_sales(data, genres):
+@profiled
+def get_genre_total_sales(data, genres, genre_stats=None):
   """
     Does:
          Finds out total global sales from each genre
 
     Parameters:
       •data
-          •2D list of games and their information
+          •2D list of games and their information (or a GameTable)
       •genres
           •list of lists holding the different genre names
+      •genre_stats - dict (optional)
+          •the result of aggregate.group_by_genre(data), if already worked out
+           (data can be None then)
 
     Returns:
         dict of genre names correlated with float values of the number
         of the number of games in that genre in millions
     """
 
-  # creating a dict of the number of games in each genre
-  genre_sales = {}
+  # summing the global sales of every genre in one go through the data
+  if genre_stats is None:
+      genre_stats = group_by(data, COLUMN_GENRE, [COLUMN_GLOBAL])
 
-  # going through each genre and setting up their genre with a count of 0
-  # so that i can add to it later when counting
+  # creating a dict of the total sales in each genre
+  # (genres without any games in the data just get 0)
+  genre_sales = {}
   for genre in genres:
-      genre_sales[genre] = 0
-
-  # going through all the games
-  for game in data:
-      # comparing each game to all the genres
-      for genre in genre_sales.keys():
-          # and adding the game's total sales to that genre's count
-          if game[COLUMN_GENRE] == genre:
-              genre_sales[genre] += game[COLUMN_GLOBAL]
+      genre_sales[genre] = genre_stats[genre]["sum"][COLUMN_GLOBAL] if genre in genre_stats else 0
 
   return genre_sales
 
 
 
-
 def main():
+    # reading, cleaning and converting the data, and removing any games
+    # before the year range we are working with
+    non_empty_data, cleaned_data, rows_in_file = load_cleaned_data(FILENAME)
+
+    # going through the data once to get every genre's count and sales in
+    # every region, which all of the functions below can share
+    genre_stats = group_by_genre(cleaned_data)
+
     # calculating the number of sales of all the games in each genre, for each region
     # and also finds the total sales of all games (regardless of their genre) from each region
-    regional_totals = calc_region_totals(cleaned_data, ["NA", "EU", "JP", "Other"])
+    regional_totals = calc_region_totals(cleaned_data, ["NA", "EU", "JP", "Other"], genre_stats)
 
     # making a list of the genres to input into things later
-    genre_list = find_genres(cleaned_data)
+    genre_list = find_genres(cleaned_data, genre_stats)
 
     # finding the total number of games in each genre
     # (not their sales, just the number of actual games there are in each)
-    game_numbers_in_each_genre = get_genre_sizes(cleaned_data, genre_list)
+    game_numbers_in_each_genre = get_genre_sizes(cleaned_data, genre_list, genre_stats)
 
 
     # finding the total number of global sales in each genre
-    total_sales_by_genre = get_genre_total_sales(cleaned_data, genre_list)
-
+    total_sales_by_genre = get_genre_total_sales(cleaned_data, genre_list, genre_stats)
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
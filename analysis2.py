@@ -1,5 +1,9 @@
-from clean import read_file, remove_missing_data, convert_str_to_float, remove_games_before_year
+from clean import load_cleaned_data
 from analysis import calc_region_totals, find_genres
+from aggregate import group_by, group_by_genre
+from gametable import GameTable
+from topk import top_k
+from instrument import profiled
 FILENAME = "vgsales.csv"
 NA = 'NA_Sales'
 EU = 'EU_Sales'
@@ -18,17 +22,23 @@ COLUMN_GLOBAL = 10
 '''Are there regional preferences for game genres among consumers since (2006/2013)?  '''
 
 
+@profiled
 def count_total_games(game_list):
     """
     Does:
         Gets the total number of games in file
 
     Parameters:
-      •game_list: the 2d list of the games and their data
+      •game_list: the 2d list of the games and their data (or a GameTable
+      or sqlstore.SalesDatabase)
 
     Returns:
         Total the number of games in the file
     """
+    # a table already knows how long it is (and a database can count)
+    if isinstance(game_list, GameTable) or hasattr(game_list, "running_totals"):
+        return len(game_list)
+
     total = 0
     for line in game_list:
         total += 1
@@ -37,48 +47,44 @@ def count_total_games(game_list):
 
 
 # Top x Ranking
-def rank_top_x(data, name_col, how_many=5):
+@profiled
+def rank_top_x(data, name_col, how_many=5, metric=COLUMN_GLOBAL):
     """
     Does:
         Ranks and returns the top <x> number of games in the dataset
 
     Parameters:
-        •data: 2d list
+        •data: 2d list (or a GameTable)
             •the games in the data file
         •name_col: int
             •the index of the cell the game's name is in
         •how_many: int
             •the number of top picks to choose from - default of 5
+        •metric: int
+            •the sales column to rank by - global sales by default
 
     Returns:
         a list containing the top <x> highest selling games in order
     """
 
-    # creating list of games to return
-    top_five_list = []
-
-    # making sure it won't try to go over the length of the list
-    if how_many >= len(data):
-        how_many = len(data)
-    # and if the count is invalid, it just returns nothing
-    elif how_many <= 0:
+    # if the count is invalid, it just returns nothing
+    if how_many <= 0:
         return None
 
-    for i in range(how_many):
-        top_five_list.append(data[i][name_col])
-        i += 1
-
-    return top_five_list
+    # the games with the highest sales (it used to take the first rows,
+    # which only worked because the file is sorted by global sales)
+    return [game[name_col] for game in top_k(data, how_many, metric)]
 
 
 # Average sales per genre per country
-def average_per_genre_in_region(data, genre_string, genre_column, country_column):
+@profiled
+def average_per_genre_in_region(data, genre_string, genre_column, country_column, index=None):
     """
     Does:
         Calculates average sales a game from the targeted genre in the targeted countries
 
     Parameters:
-      •data (2d list)
+      •data (2d list or GameTable)
           •list of each of the games and their associated values from the file
       •genre_string (str)
           •String of chosen genre
@@ -89,32 +95,44 @@ def average_per_genre_in_region(data, genre_string, genre_column, country_column
           JP: 8, Other: 9, Global: 10)
       •country_name (str)
           •String of country targeted: NA, EU, JP, Others, Global
+      •index (TableIndex, optional)
+          •an index of the GameTable, so only the genre's own games are
+          looked at instead of every row
 
     Returns:
         float, average sales of a single game from the targeted genre in
         the targeted country
     """
+    # with an index, only the rows in the genre get looked at
+    if index is not None:
+        sales = data.columns[country_column]
+        genre_rows = index.rows_with("genre", genre_string)
+        return sum(sales[row_id] for row_id in genre_rows) / len(genre_rows)
+
+    # grouping by genre only has to look at the two columns that matter
+    genre_stats = group_by(data, genre_column, [country_column])
+
+    # a genre with no games ends up dividing by zero, the same as before
     count = 0
     divide = 0
-
-    for game in data:
-        if game[genre_column] == genre_string:
-            count += game[country_column]
-            divide += 1
+    if genre_string in genre_stats:
+        count = genre_stats[genre_string]["sum"][country_column]
+        divide = genre_stats[genre_string]["count"]
     average = count / divide
 
     return average
 
 
-# calling that previous function repeatedly to get all region+genre combos
-def get_all_genre_averages_by_region(data, regions_and_cols, genre_list, genre_column):
+# getting all region+genre combos out of a single group-by
+@profiled
+def get_all_genre_averages_by_region(data, regions_and_cols, genre_list, genre_column, genre_stats=None):
   """
   Does:
       •creates a 2d dictionary containing the average sales of a single game
       in each genre for each region
 
   Parameters:
-      •data - 2D list of lists
+      •data - 2D list of lists (or a GameTable)
           •Dataset containing game information
       •regions_and_cols - dict of strings : ints
           •keys are the names of the regions in order
@@ -123,6 +141,9 @@ def get_all_genre_averages_by_region(data, regions_and_cols, genre_list, genre_c
           •names of the genres
       •genre_column - int
           •the index of the genres in the 2d data list
+      •genre_stats - dict (optional)
+          •the result of aggregate.group_by_genre(data), if already worked out
+           (data can be None then)
 
     Returns:
         •A 2D dictionary where
@@ -131,6 +152,11 @@ def get_all_genre_averages_by_region(data, regions_and_cols, genre_list, genre_c
           game in each genre
     """
 
+  # getting every genre's count and sales sums for all of the regions at once,
+  # instead of going through the data again for each region+genre pair
+  if genre_stats is None:
+      genre_stats = group_by(data, genre_column, list(regions_and_cols.values()))
+
   regional_averages = {}
 
 
@@ -145,7 +171,13 @@ def get_all_genre_averages_by_region(data, regions_and_cols, genre_list, genre_c
         # also it gets rounded before the actual int change statement so that
         # it actually *rounds* instead of truncating
       for genre in genre_list:
-          regional_averages[region][genre] = int(round(average_per_genre_in_region(data, genre, genre_column, region_col), 0))
+          # (a genre with no games divides by zero, the same as the single version)
+          sales = 0
+          count = 0
+          if genre in genre_stats:
+              sales = genre_stats[genre]["sum"][region_col]
+              count = genre_stats[genre]["count"]
+          regional_averages[region][genre] = int(round(sales / count, 0))
 
   # returning the 2d dict
   return regional_averages
@@ -191,7 +223,7 @@ def print_regional_values(regional_values, list_of_genres):
 
     # then going through each of the genres to get their scores for each
     # subsequent row
-    for genre in genre_list:
+    for genre in list_of_genres:
         # starting the row with the genre's name
         formatted_row_string = "{:<12}".format(genre)
 
@@ -205,22 +237,37 @@ def print_regional_values(regional_values, list_of_genres):
         # printing the completed row before the loop moves on to the next one
         print(formatted_row_string)
 
-def main():
-    data = read_file(FILENAME)
-    non_empty_data = remove_missing_data(data)
-    converted_type_data = convert_str_to_float(non_empty_data, COLUMN_RANK, COLUMN_YEAR, COLUMN_NA,
-                                               COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL)
-    cleaned_data = remove_games_before_year(converted_type_data)
+def print_report(cleaned_data, rows_in_file, genre_stats=None):
+    """
+    Does:
+        Prints the comparison of the games before and after cleaning, the
+        top games, and the regional sales and averages of each genre
+
+    Parameters:
+        •cleaned_data - GameTable or 2D list
+            •the games released in or after 2013
+        •rows_in_file - int
+            •how many games were in the file before cleaning
+        •genre_stats - dict (optional)
+            •the result of aggregate.group_by_genre(cleaned_data), if it has
+            already been worked out
+
+    Returns:
+        nothing; it just prints
+    """
+    # Going through the cleaned data once for every genre's counts and sales
+    if genre_stats is None:
+        genre_stats = group_by_genre(cleaned_data)
 
     # Generated list of genres in cleaned data
-    genre_list = find_genres(cleaned_data)
+    genre_list = find_genres(cleaned_data, genre_stats)
     # Generated list of genres and their sales in cleaned data
-    regional_totals = calc_region_totals(cleaned_data, ["NA", "EU", "JP", "Other"])
+    regional_totals = calc_region_totals(cleaned_data, ["NA", "EU", "JP", "Other"], genre_stats)
 
     # Comparison of games before and after cleaning
-    print('There are', count_total_games(data), 'games in the uncleaned data')
+    print('There are', rows_in_file, 'games in the uncleaned data')
     print('There are', count_total_games(cleaned_data), 'games in the cleaned data')
-    print(count_total_games(data) - count_total_games(cleaned_data), 'games were created before 2013 '
+    print(rows_in_file - count_total_games(cleaned_data), 'games were created before 2013 '
                                                                      'and filtered out in the cleaned data. ')
 
     # creating a space before the next set of numbers
@@ -258,11 +305,18 @@ def main():
 
     regions_to_cols = {"NA": COLUMN_NA, "EU": COLUMN_EU, "JP": COLUMN_JP, "Other": COLUMN_OTHER}
 
-    regional_averages = get_all_genre_averages_by_region(cleaned_data, regions_to_cols, genre_list, COLUMN_GENRE)
+    regional_averages = get_all_genre_averages_by_region(cleaned_data, regions_to_cols, genre_list, COLUMN_GENRE,
+                                                         genre_stats)
 
     print("Average sales of a single game in a genre in each region")
     print("-" * 60)
     print_regional_values(regional_averages, genre_list)
-    
 
-main()
+
+def main():
+    non_empty_data, cleaned_data, rows_in_file = load_cleaned_data(FILENAME)
+    print_report(cleaned_data, rows_in_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,823 @@
+"""
+Approximate answers for feeds too big to analyse exactly: one pass over the
+raw CSV that keeps a fixed amount of state no matter how long the file is,
+and gives every answer with an error bound
+
+    python approx.py huge_feed.csv
+    python approx.py huge_feed.csv --sample-size 500 --first-year 0
+    python approx.py vgsales.csv --exact        # also prints the exact answers
+
+    •per-genre regional averages and shares come from a stratified sample:
+     every genre keeps a uniform random sample of its games (the ones with
+     the smallest random keys, which is the same as a reservoir), and how
+     many games are in each genre is counted exactly
+    •distinct titles and publishers are counted with HyperLogLog sketches
+    •the biggest publishers and platforms (by global sales) are found with
+     count-min sketches
+
+Only the sampled rows' sales are kept (as the text from the file, converted
+when they're asked for). Everything else is done a batch at a time on whole
+columns with numpy, so it runs in about half the time of loading the file
+exactly, and the memory doesn't grow with the file
+
+Every answer is a dict of {"estimate", "error"}. For the averages, shares
+and distinct counts, estimate ± error is a normal approximation interval
+meant to hold the true value with CONFIDENCE probability. Sales are very
+uneven (a few hits and lots of games that barely sold), so for the averages
+and shares it holds less often than that. Over repeated seeds the true
+average was outside it:
+    •6-8% of the time at the default 2000 games per genre, on 330k made up
+     rows (benchmark.make_scaled_csv)
+    •14% of the time at 200 games per genre, on every year of vgsales.csv
+    •13% at 50 games per genre on vgsales.csv from 2013 on, and 23.5% on
+     every year
+So the bounds are a guide to how far off an answer could be, not a
+guarantee, and smaller samples make them less trustworthy. For the heavy
+hitters the true sales are between estimate - error and the estimate, since
+a count-min sketch can only count too much
+
+The sketches use Python's own hash(), which is different in every run, so
+they can't be saved and merged with ones from another run
+"""
+import argparse
+import csv
+import gc
+import heapq
+import math
+import time
+from itertools import islice
+
+# unlike the other scripts this one can't do anything without numpy, so it's
+# imported straight away
+import numpy as np
+
+from clean import FILENAME, SALES_UNITS, parse_sales_column
+from gametable import (COLUMN_NAME, COLUMN_PLATFORM, COLUMN_YEAR, COLUMN_GENRE,
+                       COLUMN_PUBLISHER, COLUMN_NA, COLUMN_EU, COLUMN_JP, COLUMN_OTHER,
+                       COLUMN_GLOBAL, SALES_COLUMNS)
+from instrument import profiled
+
+REGIONS_TO_COLS = {"NA": COLUMN_NA, "EU": COLUMN_EU, "JP": COLUMN_JP, "Other": COLUMN_OTHER}
+
+# how many raw rows are handled together
+BATCH_SIZE = 4096
+
+# games sampled from each genre (a genre with fewer games than this is kept
+# whole, and its answers are exact)
+SAMPLE_SIZE = 2000
+
+# HyperLogLog uses 2**precision registers, and is off by about
+# 1.04 / sqrt(2**precision) (0.8% at 14)
+HLL_PRECISION = 14
+
+# count-min sketch size: every estimate is at most e / width of the total
+# too high, except with probability exp(-depth)
+CMS_WIDTH = 2048
+CMS_DEPTH = 5
+
+# how many heavy hitter candidates are kept per sketch
+HEAVY_HITTER_CANDIDATES = 64
+
+# how sure the error bounds are meant to be, and the matching normal
+# quantile (the averages and shares fall short of it, see above)
+CONFIDENCE = 0.95
+_Z = 1.959964
+
+# odd 64 bit multipliers for the count-min rows (multiply-shift hashing)
+_CMS_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                    0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53,
+                    0x94D049BB133111EB, 0xBF58476D1CE4E5B9)
+
+
+def _convert(column, convert):
+    # converts every different value in a column only once (rows with 'N/A'
+    # get 0, since they're left out anyway)
+    values = {text: convert(text) for text in set(column) if text != 'N/A'}
+    values['N/A'] = 0
+    return map(values.__getitem__, column)
+
+
+def _hashes(values):
+    # 64 bit hashes of a batch of strings, as an array
+    return np.fromiter(map(hash, values), np.int64, len(values)).view(np.uint64)
+
+
+class HyperLogLog:
+    """
+    Does:
+        Estimates how many different values have been added, in 2**precision
+        bytes however many there are
+
+    Attributes:
+        •precision (int)
+        •registers (numpy array of uint8)
+            •the most leading zeros (plus one) seen among the hashes that
+            fell into each register
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, np.uint8)
+
+    def add_many(self, values, hashes=None):
+        """
+        Does:
+            Adds a batch of values (adding a value twice doesn't change
+            anything, so repeats are fine)
+
+        Parameters:
+            •values (sequence of str)
+            •hashes (numpy array of uint64 or None)
+                •the values' hashes, if they've already been worked out
+
+        Returns:
+            None
+        """
+        if hashes is None:
+            hashes = _hashes(values)
+        if not len(hashes):
+            return
+
+        # the top bits pick the register, and the next 32 bits give the rank
+        # (the position of their first 1 bit)
+        registers = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        rest = ((hashes >> np.uint64(32 - self.precision)) & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        # frexp gives bit_length for nonzero values, and 0 for 0, so an
+        # all-zero rest gets the biggest rank (33)
+        ranks = (33 - np.frexp(rest)[1]).astype(np.uint8)
+        np.maximum.at(self.registers, registers, ranks)
+
+    def relative_error(self):
+        # the standard error of the estimate, as a fraction of it
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self):
+        """
+        Does:
+            Estimates the number of different values added so far
+
+        Returns:
+            dict of "estimate" (float) and "error" (float, the bound at
+            CONFIDENCE)
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+
+        # small counts are more accurate from how many registers are empty
+        empty = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and empty:
+            estimate = m * math.log(m / empty)
+        else:
+            estimate = float(raw)
+        return {"estimate": estimate, "error": _Z * self.relative_error() * estimate}
+
+
+class CountMinSketch:
+    """
+    Does:
+        Keeps approximate totals for any number of keys in a fixed table of
+        depth x width counters, along with the keys that look biggest so far
+        (the heavy hitter candidates)
+
+    Attributes:
+        •width, depth (int)
+            •width is rounded up to a power of 2
+        •counters (numpy array of int64, depth x width)
+        •total (int)
+            •everything added, which the error bound is a fraction of
+        •candidates (dict)
+            •key : its estimate when it was last seen
+        •capacity (int)
+            •most candidates that are kept
+    """
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH, capacity=HEAVY_HITTER_CANDIDATES):
+        if depth > len(_CMS_MULTIPLIERS):
+            raise ValueError("depth can be at most {}".format(len(_CMS_MULTIPLIERS)))
+        self.bits = max(1, (width - 1).bit_length())
+        self.width = 1 << self.bits
+        self.depth = depth
+        self.counters = np.zeros((depth, self.width), np.int64)
+        self.total = 0
+        self.capacity = capacity
+        self.candidates = {}
+
+    def _columns(self, hashes):
+        # which counter each hash lands on, for every row of the table
+        shift = np.uint64(64 - self.bits)
+        return [((hashes * np.uint64(multiplier)) >> shift).astype(np.intp)
+                for multiplier in _CMS_MULTIPLIERS[:self.depth]]
+
+    def _estimates(self, hashes):
+        columns = self._columns(hashes)
+        return np.min([self.counters[row][cols] for row, cols in enumerate(columns)], axis=0)
+
+    def add_many(self, keys, amounts, hashes=None):
+        """
+        Does:
+            Adds an amount for every key in a batch, then updates the heavy
+            hitter candidates with the keys that were in it
+
+        Parameters:
+            •keys (sequence of str)
+            •amounts (numpy array of int)
+                •one per key (keys that only get 0 aren't added at all)
+            •hashes (numpy array of uint64 or None)
+                •the keys' hashes, if they've already been worked out
+
+        Returns:
+            None
+        """
+        if hashes is None:
+            hashes = _hashes(keys)
+        if not len(hashes):
+            return
+
+        # the same key usually comes up many times in a batch, so its amounts
+        # are added up first and it only goes into the counters once
+        distinct, first, codes = np.unique(hashes, return_index=True, return_inverse=True)
+        sums = np.bincount(codes.ravel(), weights=amounts, minlength=len(distinct)).astype(np.int64)
+
+        # keys that got nothing are left out (rows that are skipped can be
+        # given an amount of 0)
+        if not sums.all():
+            added = np.flatnonzero(sums)
+            distinct, first, sums = distinct[added], first[added], sums[added]
+        with np.errstate(over="ignore"):
+            for row, cols in enumerate(self._columns(distinct)):
+                np.add.at(self.counters[row], cols, sums)
+            self.total += int(sums.sum())
+
+            # every candidate's estimate is brought up to date before the
+            # smallest ones are dropped
+            batch_keys = [keys[position] for position in first.tolist()]
+            in_batch = set(batch_keys)
+            others = [key for key in self.candidates if key not in in_batch]
+            estimates = self._estimates(np.concatenate([distinct, _hashes(others)]))
+        self.candidates = dict(zip(batch_keys + others, estimates.tolist()))
+        if len(self.candidates) > self.capacity:
+            kept = heapq.nlargest(self.capacity, self.candidates.items(), key=lambda item: item[1])
+            self.candidates = dict(kept)
+
+    def error(self):
+        # the most any estimate is too high by (at CMS_DEPTH rows, except
+        # with probability exp(-depth))
+        return math.e / self.width * self.total
+
+    def estimate(self, key):
+        """
+        Does:
+            Estimates one key's total
+
+        Parameters:
+            •key (str)
+
+        Returns:
+            dict of "estimate" and "error" (the true total is between
+            estimate - error and estimate)
+        """
+        with np.errstate(over="ignore"):
+            estimate = int(self._estimates(_hashes([key]))[0])
+        return {"estimate": estimate, "error": self.error()}
+
+    def heavy_hitters(self, k):
+        """
+        Does:
+            Gets the k keys with the biggest estimated totals
+
+        Parameters:
+            •k (int)
+
+        Returns:
+            list of (key, {"estimate", "error"}), biggest first
+        """
+        biggest = heapq.nlargest(k, self.candidates.items(), key=lambda item: item[1])
+        error = self.error()
+        return [(key, {"estimate": estimate, "error": error}) for key, estimate in biggest]
+
+
+class StratifiedSample:
+    """
+    Does:
+        Keeps a uniform random sample of up to sample_size games from every
+        genre. Every game gets a random key and each genre keeps the games
+        with the smallest keys, so deciding whether a game is sampled is one
+        comparison, and only the few that are have their sales kept
+
+    Attributes:
+        •sample_size (int)
+        •genres (dict)
+            •genre : its position in counts
+        •counts (list of int)
+            •how many games each genre has had (exactly)
+        •samples (list of lists)
+            •for each genre, a heap of (-key, tuple of the sales figures as
+            text, in the order of SALES_COLUMNS)
+    """
+
+    def __init__(self, sample_size=SAMPLE_SIZE, seed=None):
+        # it takes two games to see how spread out a genre's sales are
+        if sample_size < 2:
+            raise ValueError("the sample size has to be at least 2")
+        self.sample_size = sample_size
+        self.random = np.random.default_rng(seed)
+        self.genres = {}
+        self.counts = []
+        self.samples = []
+        # the biggest key that would still be sampled in each genre
+        self.thresholds = np.zeros(0)
+
+    def add_many(self, genres, sales, kept=None):
+        """
+        Does:
+            Adds a batch of games
+
+        Parameters:
+            •genres (sequence of str)
+                •the genre column of the batch
+            •sales (list)
+                •the batch's sales columns as text, in the order of
+                SALES_COLUMNS
+            •kept (numpy array of bool or None)
+                •which rows to use (the rest are skipped), None uses all
+
+        Returns:
+            None
+        """
+        batch_genres = {genre: code for code, genre in enumerate(dict.fromkeys(genres))}
+        batch_codes = np.fromiter(map(batch_genres.__getitem__, genres), np.intp, len(genres))
+        used_codes = batch_codes if kept is None else batch_codes[kept]
+        counts = np.bincount(used_codes, minlength=len(batch_genres)).tolist()
+
+        # new genres are added in the order their first used game shows up
+        # (like find_genres), and a genre that only had skipped games isn't
+        batch_list = list(batch_genres)
+        present, first = np.unique(used_codes, return_index=True)
+        for batch_code in present[np.argsort(first)].tolist():
+            genre = batch_list[batch_code]
+            if genre not in self.genres:
+                self.genres[genre] = len(self.counts)
+                self.counts.append(0)
+                self.samples.append([])
+                self.thresholds = np.append(self.thresholds, 1.0)
+
+        translation = [self.genres.get(genre, 0) for genre in batch_list]
+        for code, count in zip(translation, counts):
+            if count:
+                self.counts[code] += count
+        codes = np.array(translation, np.intp)[batch_codes]
+
+        keys = self.random.random(len(genres))
+        if kept is not None:
+            # more than any threshold, so the skipped rows are never sampled
+            keys[~kept] = 2.0
+        for position in np.flatnonzero(keys < self.thresholds[codes]).tolist():
+            code = codes[position]
+            key = keys[position]
+            sample = self.samples[code]
+            if len(sample) < self.sample_size:
+                heapq.heappush(sample, (-key, tuple(column[position] for column in sales)))
+            elif key < -sample[0][0]:
+                heapq.heapreplace(sample, (-key, tuple(column[position] for column in sales)))
+            else:
+                continue
+            if len(sample) == self.sample_size:
+                self.thresholds[code] = -sample[0][0]
+
+    def genre_sales(self, genre):
+        """
+        Does:
+            Gets the sampled sales of one genre
+
+        Parameters:
+            •genre (str)
+
+        Returns:
+            numpy array (sampled games x SALES_COLUMNS) of single sales
+        """
+        sample = self.samples[self.genres[genre]]
+        if not sample:
+            return np.zeros((0, len(SALES_COLUMNS)))
+        columns = zip(*[sales for key, sales in sample])
+        return np.array([parse_sales_column(column) for column in columns], np.float64).T
+
+    def mean(self, genre, col):
+        """
+        Does:
+            Estimates a genre's average sales in one column
+
+        Parameters:
+            •genre (str)
+            •col (int)
+                •one of SALES_COLUMNS
+
+        Returns:
+            dict of "estimate", "error" and "standard_error" (both 0 for a
+            genre sampled whole, and inf for one with a single game sampled
+            out of more)
+        """
+        values = self.genre_sales(genre)[:, SALES_COLUMNS.index(col)]
+        population = self.counts[self.genres[genre]]
+        sampled = len(values)
+        mean = float(values.mean())
+
+        # a genre that was sampled whole is exact, but one game out of many
+        # says nothing about how far off it is
+        if sampled == population:
+            standard_error = 0.0
+        elif sampled < 2:
+            standard_error = math.inf
+        else:
+            # with the finite population correction, since a big part of a
+            # small genre can be in the sample
+            correction = (population - sampled) / (population - 1)
+            standard_error = float(values.std(ddof=1)) / math.sqrt(sampled) * math.sqrt(correction)
+        return {"estimate": mean, "error": _Z * standard_error, "standard_error": standard_error}
+
+
+class ApproximateSales:
+    """
+    Does:
+        Goes through the raw rows once, dropping the ones with missing data
+        and (like remove_games_before_year) the ones before first_year, and
+        keeps the sample and sketches everything is answered from
+
+    Attributes:
+        •first_year (int or None)
+            •None keeps every year
+        •sample (StratifiedSample)
+        •titles, publishers (HyperLogLog)
+        •publisher_sales, platform_sales (CountMinSketch)
+            •global sales, in single units
+        •rows_read, rows_used (int)
+    """
+
+    def __init__(self, first_year=2013, sample_size=SAMPLE_SIZE, precision=HLL_PRECISION,
+                 width=CMS_WIDTH, depth=CMS_DEPTH, seed=None):
+        self.first_year = first_year
+        self.sample = StratifiedSample(sample_size, seed)
+        self.titles = HyperLogLog(precision)
+        self.publishers = HyperLogLog(precision)
+        self.publisher_sales = CountMinSketch(width, depth)
+        self.platform_sales = CountMinSketch(width, depth)
+        self.rows_read = 0
+        self.rows_used = 0
+
+    def add_rows(self, rows):
+        """
+        Does:
+            Adds one batch of raw rows (lists of strings, like
+            clean.read_file gives)
+
+        Parameters:
+            •rows (list of lists of str)
+
+        Returns:
+            None
+        """
+        self.rows_read += len(rows)
+        if not rows:
+            return
+
+        # everything from here on works on whole columns
+        columns = list(zip(*rows))
+        size = len(rows)
+
+        # rows with missing data are found column by column, since most
+        # columns never have any
+        kept = None
+        for column in columns:
+            if 'N/A' in column:
+                present = np.fromiter(map('N/A'.__ne__, column), bool, size)
+                kept = present if kept is None else kept & present
+
+        if self.first_year is not None:
+            years = np.fromiter(_convert(columns[COLUMN_YEAR], int), np.int64, size)
+            recent = years >= self.first_year
+            kept = recent if kept is None else kept & recent
+
+        if kept is not None:
+            used = int(np.count_nonzero(kept))
+            if used == 0:
+                return
+            if used == size:
+                kept = None
+        else:
+            used = size
+        self.rows_used += used
+
+        # rows that are left out add 0 to the count-min sketches, and their
+        # hashes are taken out before they get to the HyperLogLogs
+        global_sales = np.rint(np.fromiter(_convert(columns[COLUMN_GLOBAL], float), np.float64, size)
+                               * SALES_UNITS).astype(np.int64)
+        if kept is not None:
+            global_sales[~kept] = 0
+
+        # each column is only hashed once, for every sketch that uses it
+        name_hashes = _hashes(columns[COLUMN_NAME])
+        publisher_hashes = _hashes(columns[COLUMN_PUBLISHER])
+
+        self.sample.add_many(columns[COLUMN_GENRE], [columns[col] for col in SALES_COLUMNS], kept)
+        self.titles.add_many(None, name_hashes if kept is None else name_hashes[kept])
+        self.publishers.add_many(None, publisher_hashes if kept is None else publisher_hashes[kept])
+        self.publisher_sales.add_many(columns[COLUMN_PUBLISHER], global_sales, publisher_hashes)
+        self.platform_sales.add_many(columns[COLUMN_PLATFORM], global_sales)
+
+    def add_csv(self, filename):
+        """
+        Does:
+            Reads a CSV file (same columns as vgsales.csv) a batch at a time
+
+        Parameters:
+            •filename (str)
+
+        Returns:
+            int number of rows in the file
+        """
+        rows_before = self.rows_read
+
+        # the rows never refer back to each other, so there's nothing for the
+        # garbage collector to find, and it would otherwise spend a good part
+        # of the time going over every batch
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            with open(filename) as csvfile:
+                reader = csv.reader(csvfile, delimiter=",")
+
+                # skip first line so that the header isn't used in the data set
+                next(reader, None)
+
+                while True:
+                    batch = list(islice(reader, BATCH_SIZE))
+                    if not batch:
+                        break
+                    self.add_rows(batch)
+                    # so the next batch isn't read while this one's still kept
+                    del batch
+        finally:
+            if collecting:
+                gc.enable()
+        return self.rows_read - rows_before
+
+    def genres(self):
+        # in the order they first showed up, like find_genres
+        return list(self.sample.genres)
+
+    def genre_sizes(self):
+        """
+        Does:
+            Gets how many games are in each genre (these are counted exactly)
+
+        Returns:
+            dict of genre : int
+        """
+        return {genre: self.sample.counts[code] for genre, code in self.sample.genres.items()}
+
+    def genre_averages(self, regions_and_cols=REGIONS_TO_COLS):
+        """
+        Does:
+            Approximate version of get_all_genre_averages_by_region
+
+        Parameters:
+            •regions_and_cols (dict of str : int)
+
+        Returns:
+            2D dict of region : {genre : {"estimate", "error"}}, in single
+            sales (the bounds hold less often than CONFIDENCE, see the top
+            of the file)
+        """
+        averages = {}
+        for region, col in regions_and_cols.items():
+            averages[region] = {}
+            for genre in self.sample.genres:
+                mean = self.sample.mean(genre, col)
+                averages[region][genre] = {"estimate": mean["estimate"], "error": mean["error"]}
+        return averages
+
+    def genre_shares(self, regions_and_cols=REGIONS_TO_COLS):
+        """
+        Does:
+            Approximate version of heatmap.calculate_relative_portions: each
+            genre's part of a region's sales. A genre's total is its exact
+            size times its sampled average, and the bound comes from how
+            uncertain every genre's total is (they're sampled separately)
+
+        Parameters:
+            •regions_and_cols (dict of str : int)
+
+        Returns:
+            2D dict of region : {genre : {"estimate", "error"}}, as fractions
+        """
+        shares = {}
+        for region, col in regions_and_cols.items():
+            totals = {}
+            variances = {}
+            for genre, code in self.sample.genres.items():
+                mean = self.sample.mean(genre, col)
+                size = self.sample.counts[code]
+                totals[genre] = size * mean["estimate"]
+                variances[genre] = (size * mean["standard_error"]) ** 2
+
+            region_total = sum(totals.values())
+            region_variance = sum(variances.values())
+            shares[region] = {}
+            for genre, total in totals.items():
+                if region_total == 0:
+                    shares[region][genre] = {"estimate": 0.0, "error": 0.0}
+                    continue
+                share = total / region_total
+                # the delta method for total / (total + everything else)
+                variance = (variances[genre] * (1 - share) ** 2
+                            + share ** 2 * (region_variance - variances[genre])) / region_total ** 2
+                shares[region][genre] = {"estimate": share, "error": _Z * math.sqrt(variance)}
+        return shares
+
+    def distinct_titles(self):
+        return self.titles.estimate()
+
+    def distinct_publishers(self):
+        return self.publishers.estimate()
+
+    def top_publishers(self, k=5):
+        return self.publisher_sales.heavy_hitters(k)
+
+    def top_platforms(self, k=5):
+        return self.platform_sales.heavy_hitters(k)
+
+    def nbytes(self):
+        """
+        Does:
+            Roughly measures how much memory the sample and sketches take up
+            (which stays the same however big the file is)
+
+        Returns:
+            int number of bytes
+        """
+        total = self.titles.registers.nbytes + self.publishers.registers.nbytes
+        total += self.publisher_sales.counters.nbytes + self.platform_sales.counters.nbytes
+        # a heap entry (the list slot, its tuple and key) and the sales text
+        total += sum(len(sample) for sample in self.sample.samples) * (8 + 56 + 24 + 80 + 56 * len(SALES_COLUMNS))
+        return total
+
+
+@profiled
+def approximate_file(filename, first_year=2013, sample_size=SAMPLE_SIZE, seed=None):
+    """
+    Does:
+        Goes through a CSV file once and gets everything the approximate
+        answers are worked out from (see ApproximateSales)
+
+    Parameters:
+        •filename (str)
+        •first_year (int or None)
+        •sample_size (int)
+            •games sampled from each genre
+        •seed (int or None)
+            •for the same sample every time
+
+    Returns:
+        ApproximateSales
+    """
+    approximate = ApproximateSales(first_year, sample_size, seed=seed)
+    approximate.add_csv(filename)
+    return approximate
+
+
+def _format(result, scale=1, digits=0):
+    return "{:.{digits}f} ± {:.{digits}f}".format(result["estimate"] / scale, result["error"] / scale,
+                                                  digits=digits)
+
+
+def print_summary(approximate, exact=None, k=5):
+    """
+    Does:
+        Prints every approximate answer with its error bound, and the exact
+        ones next to them if they're given
+
+    Parameters:
+        •approximate (ApproximateSales)
+        •exact (dict or None)
+            •what exact_answers gave
+        •k (int)
+            •how many publishers and platforms to list
+
+    Returns:
+        None
+    """
+    print("Read {} rows, used {} (nominal {:.0f}% confidence bounds)".format(
+        approximate.rows_read, approximate.rows_used, CONFIDENCE * 100))
+    print("Distinct titles:     {}{}".format(_format(approximate.distinct_titles()),
+                                             "   exact {}".format(exact["titles"]) if exact else ""))
+    print("Distinct publishers: {}{}".format(_format(approximate.distinct_publishers()),
+                                             "   exact {}".format(exact["publishers"]) if exact else ""))
+
+    print("\nAverage sales of a game by genre by region (thousands)")
+    print("-" * 60)
+    averages = approximate.genre_averages()
+    print("{:<14}".format("") + "".join("{:>18}".format(region) for region in averages))
+    for genre in approximate.genres():
+        print("{:<14}".format(genre) + "".join("{:>18}".format(_format(averages[region][genre], 1000, 1))
+                                               for region in averages))
+        if exact:
+            print("{:<14}".format("  exact") + "".join("{:>18.1f}".format(exact["averages"][region][genre] / 1000)
+                                                       for region in averages))
+
+    print("\nShare of each region's sales by genre (%)")
+    print("-" * 60)
+    shares = approximate.genre_shares()
+    print("{:<14}".format("") + "".join("{:>18}".format(region) for region in shares))
+    for genre in approximate.genres():
+        print("{:<14}".format(genre) + "".join("{:>18}".format(_format(shares[region][genre], 0.01, 2))
+                                               for region in shares))
+        if exact:
+            print("{:<14}".format("  exact") + "".join("{:>18.2f}".format(exact["shares"][region][genre] * 100)
+                                                       for region in shares))
+
+    for label, hitters, exact_key in (("publishers", approximate.top_publishers(k), "publisher_sales"),
+                                      ("platforms", approximate.top_platforms(k), "platform_sales")):
+        print("\nTop {} {} by global sales (millions, at most this much too high)".format(k, label))
+        print("-" * 60)
+        for key, result in hitters:
+            line = "{:<40}{:>12.2f} (- {:.2f})".format(key, result["estimate"] / 1e6, result["error"] / 1e6)
+            if exact:
+                line += "   exact {:.2f}".format(exact[exact_key].get(key, 0) / 1e6)
+            print(line)
+
+
+def exact_answers(filename, first_year=2013):
+    """
+    Does:
+        Works out the same answers exactly with the usual pipeline, to check
+        the approximate ones against
+
+    Parameters:
+        •filename (str)
+        •first_year (int or None)
+
+    Returns:
+        dict of "titles", "publishers", "averages", "shares",
+        "publisher_sales" and "platform_sales"
+    """
+    from clean import load_non_empty_table, remove_games_before_year
+    from aggregate import group_by
+
+    data, rows_in_file = load_non_empty_table(filename, use_cache=False)
+    if first_year is not None:
+        data = remove_games_before_year(data, year=first_year)
+
+    genre_stats = group_by(data, COLUMN_GENRE, list(REGIONS_TO_COLS.values()))
+    averages = {region: {genre: stats["sum"][col] / stats["count"] for genre, stats in genre_stats.items()}
+                for region, col in REGIONS_TO_COLS.items()}
+    shares = {}
+    for region, col in REGIONS_TO_COLS.items():
+        region_total = sum(stats["sum"][col] for stats in genre_stats.values())
+        shares[region] = {genre: stats["sum"][col] / region_total if region_total else 0.0
+                          for genre, stats in genre_stats.items()}
+
+    return {"titles": len(set(data.decoded(COLUMN_NAME))),
+            "publishers": len(set(data.decoded(COLUMN_PUBLISHER))),
+            "averages": averages, "shares": shares,
+            "publisher_sales": {key: stats["sum"][COLUMN_GLOBAL] for key, stats in
+                                group_by(data, COLUMN_PUBLISHER, [COLUMN_GLOBAL]).items()},
+            "platform_sales": {key: stats["sum"][COLUMN_GLOBAL] for key, stats in
+                               group_by(data, COLUMN_PLATFORM, [COLUMN_GLOBAL]).items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Approximate genre, publisher and platform answers with error "
+                                                 "bounds, in one pass over a CSV")
+    parser.add_argument("file", nargs="?", default=FILENAME, help="CSV file to read (default: %(default)s)")
+    parser.add_argument("--first-year", type=int, default=2013,
+                        help="leave out games released before this, 0 for every year (default: %(default)s)")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE,
+                        help="games sampled from each genre (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=5, help="publishers and platforms to list (default: %(default)s)")
+    parser.add_argument("--seed", type=int, help="random seed, for the same sample every run")
+    parser.add_argument("--exact", action="store_true",
+                        help="also work out the exact answers with the usual pipeline, for comparing")
+    args = parser.parse_args()
+    if args.sample_size < 2:
+        parser.error("--sample-size has to be at least 2")
+
+    first_year = args.first_year or None
+    start = time.perf_counter()
+    approximate = approximate_file(args.file, first_year, args.sample_size, args.seed)
+    seconds = time.perf_counter() - start
+
+    exact = None
+    if args.exact:
+        start = time.perf_counter()
+        exact = exact_answers(args.file, first_year)
+        exact_seconds = time.perf_counter() - start
+
+    print_summary(approximate, exact, args.top)
+    print("\nApproximate pass: {:.2f}s, about {:.0f} KB of samples and sketches".format(
+        seconds, approximate.nbytes() / 1024))
+    if exact is not None:
+        print("Exact pipeline:   {:.2f}s".format(exact_seconds))
+
+
+if __name__ == "__main__":
+    main()
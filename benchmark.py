@@ -0,0 +1,515 @@
+"""
+Times every stage of the cleaning pipeline and every analysis function at
+several multiples of the size of vgsales.csv, and saves the results as JSON
+so runs can be compared
+
+    python benchmark.py                          # 1x, 10x and 100x
+    python benchmark.py --scales 1,10,100,1000
+    python benchmark.py --compare last_run.json  # flag anything that got slower
+    python benchmark.py --synthetic              # made up games instead of copies
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import analysis
+import analysis2
+import approx
+import bubblechart
+import cache
+import clean
+import generate
+import heatmap
+import memo
+from aggregate import group_by, group_by_genre
+from cube import SalesCube
+from rowfilter import RowFilter
+from sqlstore import SalesDatabase
+from yearindex import YearIndex, sliding_windows
+
+FILENAME = "vgsales.csv"
+REGIONS = ["NA", "EU", "JP", "Other"]
+REGIONS_TO_COLS = {"NA": clean.COLUMN_NA, "EU": clean.COLUMN_EU,
+                   "JP": clean.COLUMN_JP, "Other": clean.COLUMN_OTHER}
+
+# where the scaled copies of the CSV are written
+DATA_DIR = "benchmark_data"
+
+# a stage is slower than before if it takes this much longer (0.2 = 20%)
+DEFAULT_THRESHOLD = 0.2
+
+
+def make_scaled_csv(scale, source=FILENAME, folder=DATA_DIR, synthetic=False):
+    """
+    Does:
+        Writes a copy of the CSV with its rows repeated <scale> times (the
+        header only once), reusing it if it was already made
+
+    Parameters:
+        •scale (int)
+        •source (str)
+            •the CSV to copy
+        •folder (str)
+            •where to write it
+        •synthetic (bool)
+            •True writes the same number of made up games (see generate.py)
+            instead of repeating the real ones
+
+    Returns:
+        str path of the scaled CSV
+    """
+    if synthetic:
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, "synthetic_x{}.csv".format(scale))
+        if not os.path.exists(path):
+            with open(source) as file:
+                rows = sum(1 for line in file) - 1
+            generate.write_csv(path, rows * scale)
+        return path
+
+    if scale == 1:
+        return source
+
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, "vgsales_x{}.csv".format(scale))
+    if os.path.exists(path):
+        return path
+
+    with open(source) as file:
+        header = file.readline()
+        body = file.read()
+    if not body.endswith("\n"):
+        body += "\n"
+
+    with open(path, "w") as file:
+        file.write(header)
+        for i in range(scale):
+            file.write(body)
+
+    return path
+
+
+class Inputs:
+    """
+    Does:
+        Works out (and remembers) the inputs the stages need for one scaled
+        file, so that e.g. the convert stage is timed on its own instead of
+        including the reading it depends on
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._values = {}
+
+    def get(self, name):
+        if name not in self._values:
+            self._values[name] = getattr(self, "_" + name)()
+        return self._values[name]
+
+    def _rows(self):
+        return clean.read_file(self.path)
+
+    def _non_empty_rows(self):
+        return clean.remove_missing_data(self.get("rows"))
+
+    def _converted_rows(self):
+        return clean.convert_str_to_float(self.get("non_empty_rows"), clean.COLUMN_RANK, clean.COLUMN_YEAR,
+                                          clean.COLUMN_NA, clean.COLUMN_EU, clean.COLUMN_JP,
+                                          clean.COLUMN_OTHER, clean.COLUMN_GLOBAL)
+
+    def _table(self):
+        return clean.read_table(self.path)
+
+    def _non_empty_table(self):
+        return clean.remove_missing_data(self.get("table"))
+
+    def _cleaned(self):
+        return clean.remove_games_before_year(self.get("non_empty_table"))
+
+    def _genres(self):
+        return analysis.find_genres(self.get("cleaned"))
+
+    def _region_totals(self):
+        return analysis.calc_region_totals(self.get("cleaned"), REGIONS)
+
+    def _database(self):
+        return SalesDatabase.create(":memory:", self.get("non_empty_table"))
+
+    def _year_index(self):
+        return YearIndex.build(self.get("non_empty_table"), ("genre", "platform"))
+
+    def _publisher_platform(self):
+        return group_by(self.get("non_empty_table"), (clean.COLUMN_PUBLISHER, clean.COLUMN_PLATFORM),
+                        [clean.COLUMN_GLOBAL])
+
+
+# each stage's setup takes the Inputs, gets whatever the stage needs ready,
+# and returns the function to time
+
+
+def _read_file(inputs):
+    return lambda: clean.read_file(inputs.path)
+
+
+def _remove_missing_rows(inputs):
+    rows = inputs.get("rows")
+    return lambda: clean.remove_missing_data(rows)
+
+
+def _convert_rows(inputs):
+    rows = inputs.get("non_empty_rows")
+    return lambda: clean.convert_str_to_float(rows, clean.COLUMN_RANK, clean.COLUMN_YEAR, clean.COLUMN_NA,
+                                              clean.COLUMN_EU, clean.COLUMN_JP, clean.COLUMN_OTHER,
+                                              clean.COLUMN_GLOBAL)
+
+
+def _remove_early_rows(inputs):
+    rows = inputs.get("converted_rows")
+    return lambda: clean.remove_games_before_year(rows)
+
+
+def _read_table(inputs):
+    return lambda: clean.read_table(inputs.path)
+
+
+def _remove_missing_table(inputs):
+    table = inputs.get("table")
+    return lambda: clean.remove_missing_data(table)
+
+
+def _remove_early_table(inputs):
+    table = inputs.get("non_empty_table")
+    return lambda: clean.remove_games_before_year(table)
+
+
+def _cold_cache_load(inputs):
+    def load():
+        cache.clear_cache(inputs.path)
+        return clean.load_non_empty_table(inputs.path)
+    return load
+
+
+def _warm_cache_load(inputs):
+    # making sure there is a cache to load before it gets timed
+    clean.load_non_empty_table(inputs.path)
+    return lambda: clean.load_non_empty_table(inputs.path)
+
+
+def _stream_group_by_genre(inputs):
+    return lambda: group_by_genre(clean.stream_cleaned_data(inputs.path))
+
+
+def _approximate_file(inputs):
+    return lambda: approx.approximate_file(inputs.path, seed=0)
+
+
+def _group_by_genre(inputs):
+    data = inputs.get("cleaned")
+    return lambda: group_by_genre(data)
+
+
+def _create_database(inputs):
+    table = inputs.get("non_empty_table")
+    return lambda: SalesDatabase.create(":memory:", table)
+
+
+def _database_group_by_genre(inputs):
+    database = inputs.get("database")
+    return lambda: group_by_genre(database.where(RowFilter(years=(2013, None))))
+
+
+def _build_cube(inputs):
+    table = inputs.get("non_empty_table")
+    return lambda: SalesCube.build(table)
+
+
+def _cube_genre_stats(inputs):
+    cube = SalesCube.build(inputs.get("non_empty_table"))
+    return lambda: SalesCube(cube.cells).genre_stats()
+
+
+def _build_year_index(inputs):
+    table = inputs.get("non_empty_table")
+    return lambda: YearIndex.build(table, ("genre", "platform"))
+
+
+def _year_index_windows(inputs):
+    index = inputs.get("year_index")
+    windows = sliding_windows(index.first_year, index.last_year, 4)
+    return lambda: [index.genre_stats(*window) for window in windows]
+
+
+def _calc_region_totals(inputs):
+    data = inputs.get("cleaned")
+    return lambda: analysis.calc_region_totals(data, REGIONS)
+
+
+def _find_genres(inputs):
+    data = inputs.get("cleaned")
+    return lambda: analysis.find_genres(data)
+
+
+def _get_genre_sizes(inputs):
+    data, genres = inputs.get("cleaned"), inputs.get("genres")
+    return lambda: analysis.get_genre_sizes(data, genres)
+
+
+def _get_genre_total_sales(inputs):
+    data, genres = inputs.get("cleaned"), inputs.get("genres")
+    return lambda: analysis.get_genre_total_sales(data, genres)
+
+
+def _rank_top_x(inputs):
+    data = inputs.get("cleaned")
+    return lambda: analysis2.rank_top_x(data, clean.COLUMN_NAME, 5)
+
+
+def _average_per_genre_in_region(inputs):
+    data = inputs.get("cleaned")
+    return lambda: analysis2.average_per_genre_in_region(data, "Action", clean.COLUMN_GENRE, clean.COLUMN_NA)
+
+
+def _genre_averages_by_region(inputs):
+    data, genres = inputs.get("cleaned"), inputs.get("genres")
+    return lambda: analysis2.get_all_genre_averages_by_region(data, REGIONS_TO_COLS, genres, clean.COLUMN_GENRE)
+
+
+def _relative_portions(inputs):
+    totals = inputs.get("region_totals")
+    return lambda: heatmap.calculate_relative_portions(totals, "total_sales")
+
+
+def _publisher_platform_shares(inputs):
+    groups = inputs.get("publisher_platform")
+    return lambda: heatmap.share_matrix(heatmap.group_matrix(groups, clean.COLUMN_GLOBAL)[0], "column")
+
+
+def _sales_by_genre_region(inputs):
+    data = inputs.get("cleaned")
+    return lambda: bubblechart.calculate_sales_by_genre_region(data)
+
+
+# every stage: (name, whether it works on the 2D lists, its setup)
+#   •the list stages are the slow original path and can be skipped at big scales
+STAGES = [
+    ("clean.read_file", True, _read_file),
+    ("clean.remove_missing_data", True, _remove_missing_rows),
+    ("clean.convert_str_to_float", True, _convert_rows),
+    ("clean.remove_games_before_year (lists)", True, _remove_early_rows),
+    ("clean.read_table", False, _read_table),
+    ("clean.remove_missing_data (table)", False, _remove_missing_table),
+    ("clean.remove_games_before_year (table)", False, _remove_early_table),
+    ("clean.load_non_empty_table (cold cache)", False, _cold_cache_load),
+    ("clean.load_non_empty_table (warm cache)", False, _warm_cache_load),
+    ("clean.stream_cleaned_data + group_by_genre", False, _stream_group_by_genre),
+    ("approx.approximate_file (sample + sketches)", False, _approximate_file),
+    ("aggregate.group_by_genre", False, _group_by_genre),
+    ("sqlstore.SalesDatabase.create (in memory)", False, _create_database),
+    ("sqlstore group_by_genre (2013 on)", False, _database_group_by_genre),
+    ("cube.SalesCube.build", False, _build_cube),
+    ("cube.SalesCube.genre_stats", False, _cube_genre_stats),
+    ("yearindex.YearIndex.build (genre x platform)", False, _build_year_index),
+    ("yearindex genre_stats (every 4 year window)", False, _year_index_windows),
+    ("analysis.calc_region_totals", False, _calc_region_totals),
+    ("analysis.find_genres", False, _find_genres),
+    ("analysis.get_genre_sizes", False, _get_genre_sizes),
+    ("analysis.get_genre_total_sales", False, _get_genre_total_sales),
+    ("analysis2.rank_top_x", False, _rank_top_x),
+    ("analysis2.average_per_genre_in_region", False, _average_per_genre_in_region),
+    ("analysis2.get_all_genre_averages_by_region", False, _genre_averages_by_region),
+    ("heatmap.calculate_relative_portions", False, _relative_portions),
+    ("heatmap.group_matrix + share_matrix (publisher x platform)", False, _publisher_platform_shares),
+    ("bubblechart.calculate_sales_by_genre_region", False, _sales_by_genre_region),
+]
+
+
+def time_call(function, repeat):
+    """
+    Does:
+        Runs a function several times and keeps the fastest time, which is
+        the one least affected by whatever else the machine was doing
+
+    Parameters:
+        •function (callable with no arguments)
+        •repeat (int)
+
+    Returns:
+        float seconds
+    """
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def peak_memory(function):
+    """
+    Does:
+        Runs a function once with tracemalloc on, to find the most memory it
+        had allocated at any point (done separately from the timing, since
+        tracing makes everything slower)
+
+    Parameters:
+        •function (callable with no arguments)
+
+    Returns:
+        int bytes
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(scales, repeat=3, include_lists=True, measure_memory=True, stage_filter=None, synthetic=False,
+        log=print):
+    """
+    Does:
+        Runs every stage at every scale
+
+    Parameters:
+        •scales (list of int)
+        •repeat (int)
+            •how many times each stage is timed
+        •include_lists (bool)
+            •False skips the 2D list stages (which need a lot of memory at
+            big scales)
+        •measure_memory (bool)
+        •stage_filter (str or None)
+            •only runs stages with this in their name
+        •synthetic (bool)
+            •use made up games instead of copies of the real ones
+        •log (function)
+            •called with a line of progress for each stage
+
+    Returns:
+        list of result dicts
+    """
+    results = []
+
+    # every repeat has to do the real work instead of finding the last result
+    memo.disable()
+
+    for scale in scales:
+        path = make_scaled_csv(scale, synthetic=synthetic)
+        inputs = Inputs(path)
+
+        for name, uses_lists, setup in STAGES:
+            if uses_lists and not include_lists:
+                continue
+            if stage_filter is not None and stage_filter not in name:
+                continue
+
+            function = setup(inputs)
+            seconds = time_call(function, repeat)
+            result = {"stage": name, "scale": scale, "synthetic": synthetic, "seconds": seconds}
+            if measure_memory:
+                result["peak_bytes"] = peak_memory(function)
+            results.append(result)
+
+            log("{:<48}{:>6}x{:>12.4f}s{:>14}".format(
+                name, scale, seconds,
+                "" if not measure_memory else "{:.1f} MB".format(result["peak_bytes"] / 1e6)))
+
+        # the scaled files' caches aren't needed once they've been timed
+        if path != FILENAME:
+            cache.clear_cache(path)
+
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous, threshold=DEFAULT_THRESHOLD):
+    """
+    Does:
+        Finds the stages that got slower than in an earlier run
+
+    Parameters:
+        •results (list of dicts)
+            •from run
+        •previous (dict)
+            •an earlier saved benchmark file
+        •threshold (float)
+            •how much slower counts as a regression (0.2 = 20%)
+
+    Returns:
+        list of (stage, scale, old seconds, new seconds) for each regression
+    """
+    # real and made up data of the same size aren't comparable
+    old_times = {(result["stage"], result["scale"], result.get("synthetic", False)): result["seconds"]
+                 for result in previous["results"]}
+
+    regressions = []
+    for result in results:
+        old = old_times.get((result["stage"], result["scale"], result["synthetic"]))
+        if old is not None and result["seconds"] > old * (1 + threshold):
+            regressions.append((result["stage"], result["scale"], old, result["seconds"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the cleaning and analysis functions")
+    parser.add_argument("--scales", default="1,10,100",
+                        help="comma separated multiples of vgsales.csv (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="times to run each stage (default: %(default)s)")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="where to save the results (default: %(default)s)")
+    parser.add_argument("--compare", help="an earlier results file to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown that counts as a regression (default: %(default)s)")
+    parser.add_argument("--skip-lists", action="store_true",
+                        help="skip the 2D list stages (they need a lot of memory at big scales)")
+    parser.add_argument("--no-memory", action="store_true", help="only measure time")
+    parser.add_argument("--stage", help="only run stages with this in their name")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="use made up games (see generate.py) instead of copies of vgsales.csv")
+    args = parser.parse_args(argv)
+
+    scales = [int(scale) for scale in args.scales.split(",")]
+    results = run(scales, args.repeat, not args.skip_lists, not args.no_memory, args.stage, args.synthetic)
+
+    saved = {
+        "meta": {
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(saved, file, indent=2)
+    print("Saved results to", args.output)
+
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+        regressions = compare(results, previous, args.threshold)
+        for stage, scale, old, new in regressions:
+            print("REGRESSION: {} at {}x went from {:.4f}s to {:.4f}s".format(stage, scale, old, new))
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
-from clean import read_file, remove_missing_data, convert_str_to_float, remove_games_before_year
-import matplotlib.pyplot as plt
+from clean import load_cleaned_data
+from aggregate import group_by
+from instrument import profiled
 
 FILENAME = "vgsales.csv"
 NA = 'NA_Sales'
@@ -17,57 +18,40 @@ COLUMN_JP = 8
 COLUMN_OTHER = 9
 COLUMN_GLOBAL = 10
 
-def calculate_sales_by_genre_region(data):
+@profiled
+def calculate_sales_by_genre_region(data, genre_stats=None):
     """
     Does:
         Aggregates sales data by genre for each region
 
     Parameters:
       •data (list)
-          •A 2D list of cleaned and processed data
+          •A 2D list of cleaned and processed data (or a GameTable)
+      •genre_stats (dict, optional)
+          •the result of aggregate.group_by_genre(data), if it has already
+          been worked out (data can be None then)
 
     Returns:
         A dictionary with genres as keys and total sales
         as values: {region: {genre: total_sales}}
     """
-    regions = ['NA_Sales', 'EU_Sales', 'JP_Sales', 'Other_Sales']
+    # each region's name and the column its sales are in
+    regions = {'NA_Sales': COLUMN_NA, 'EU_Sales': COLUMN_EU,
+               'JP_Sales': COLUMN_JP, 'Other_Sales': COLUMN_OTHER}
+
+    # summing every region's sales for each genre in one pass over the data
+    if genre_stats is None:
+        genre_stats = group_by(data, COLUMN_GENRE, list(regions.values()))
+
     genre_sales = {}
-    for region in regions:
+    for region, region_col in regions.items():
         genre_sales[region] = {}
-
-    for row in data:
-        genre = row[COLUMN_GENRE]
-        na_sales = row[COLUMN_NA]
-        eu_sales = row[COLUMN_EU]
-        jp_sales = row[COLUMN_JP]
-        other_sales = row[COLUMN_OTHER]
-
-        # add sales to NA region
-        if genre not in genre_sales['NA_Sales']:
-            genre_sales['NA_Sales'][genre] = na_sales
-        else:
-            genre_sales['NA_Sales'][genre] += na_sales
-
-        # add sales to EU region
-        if genre not in genre_sales['EU_Sales']:
-            genre_sales['EU_Sales'][genre] = eu_sales
-        else:
-            genre_sales['EU_Sales'][genre] += eu_sales
-
-        # add sales to JP region
-        if genre not in genre_sales['JP_Sales']:
-            genre_sales['JP_Sales'][genre] = jp_sales
-        else:
-            genre_sales['JP_Sales'][genre] += jp_sales
-
-        # add sales to Other region
-        if genre not in genre_sales['Other_Sales']:
-            genre_sales['Other_Sales'][genre] = other_sales
-        else:
-            genre_sales['Other_Sales'][genre] += other_sales
+        for genre, stats in genre_stats.items():
+            genre_sales[region][genre] = stats["sum"][region_col]
     return genre_sales
 
-def plot_bubble_chart(genre_sales):
+@profiled
+def plot_bubble_chart(genre_sales, filename="bubblechart.png", show=True):
     """
     Does:
         Creates a bubble chart of sales by genre and region
@@ -75,10 +59,19 @@ def plot_bubble_chart(genre_sales):
     Parameters:
       •genre_sales (dict)
           •A dictionary of region and genre sales data
+      •filename (str)
+          •where to save the chart
+      •show (bool)
+          •False to only save the chart without opening a window (for
+          rendering on a server, see render.py)
 
     Returns:
         None
     """
+    # matplotlib is only imported once something actually gets drawn, since
+    # it takes a while to load
+    import matplotlib.pyplot as plt
+
     # x variable - region, y variable - genres
     regions = []
     genres = []
@@ -111,28 +104,47 @@ def plot_bubble_chart(genre_sales):
     for size in sizes:
         bubble_sizes.append(size * 10)
 
-    # create the chart
-    plt.scatter(x, y, s=bubble_sizes, alpha=0.6, edgecolors="w")
+    # create the chart, on a figure of its own
+    figure, axes = plt.subplots()
+    axes.scatter(x, y, s=bubble_sizes, alpha=0.6, edgecolors="w")
     # add labels and title
-    plt.xticks(range(len(regions)), regions)
-    plt.yticks(range(len(genres)), genres)
-    plt.xlabel("Regions")
-    plt.ylabel("Genres")
-    plt.title("Bubble Chart: Sales by Genre and Region")
-    plt.savefig("bubblechart.png", bbox_inches='tight')
-    plt.show()
+    axes.set_xticks(range(len(regions)), regions)
+    axes.set_yticks(range(len(genres)), genres)
+    axes.set_xlabel("Regions")
+    axes.set_ylabel("Genres")
+    axes.set_title("Bubble Chart: Sales by Genre and Region")
+    figure.savefig(filename, bbox_inches='tight')
+    if show:
+        plt.show()
+    else:
+        plt.close(figure)
+
+def show_bubble_chart(cleaned_data, genre_stats=None):
+    """
+    Does:
+        Works out the sales by genre and region and draws the bubble chart
 
-def main():
-    data = read_file(FILENAME)
-    non_empty_data = remove_missing_data(data)
-    converted_type_data = convert_str_to_float(non_empty_data, COLUMN_RANK, COLUMN_YEAR, COLUMN_NA,
-                                               COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL)
-    cleaned_data = remove_games_before_year(converted_type_data)
+    Parameters:
+      •cleaned_data (list or GameTable)
+          •the games released in or after 2013
+      •genre_stats (dict, optional)
+          •the result of aggregate.group_by_genre(cleaned_data), if it has
+          already been worked out
 
+    Returns:
+        None
+    """
     # calculate sales by genre
-    genre_sales = calculate_sales_by_genre_region(cleaned_data)
+    genre_sales = calculate_sales_by_genre_region(cleaned_data, genre_stats)
 
     # plot the bubble chart
     plot_bubble_chart(genre_sales)
 
-main()
\ No newline at end of file
+
+def main():
+    non_empty_data, cleaned_data, rows_in_file = load_cleaned_data(FILENAME)
+    show_bubble_chart(cleaned_data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+from gametable import GameTable, COLUMN_TYPES, NUM_COLUMNS
+
+# the cache files go in a folder next to the CSV they were made from
+CACHE_DIR = ".vgsales_cache"
+CACHE_EXTENSION = ".vgc"
+
+# the first bytes of every cache file, so random files aren't mistaken for one
+MAGIC = b"VGSCACHE"
+
+# has to be changed whenever the layout (or the way the numbers are converted)
+# changes, so that older cache files get rebuilt instead of misread
+CACHE_VERSION = 3
+
+# every block in the file starts on a multiple of this many bytes, so the
+# typed columns can be looked at straight from the memory map
+ALIGNMENT = 8
+
+# separates the strings in each vocabulary block
+VOCABULARY_SEPARATOR = "\x00"
+
+
+def cache_path(filename):
+    """
+    Does:
+        Works out where the cache for a CSV file is kept
+
+    Parameters:
+        •filename (str)
+            •path to the CSV file
+
+    Returns:
+        str path of the cache file
+    """
+    folder, base = os.path.split(os.path.abspath(filename))
+    return os.path.join(folder, CACHE_DIR, base + CACHE_EXTENSION)
+
+
+def file_hash(filename):
+    """
+    Does:
+        Works out the sha256 of a file's contents, reading it in chunks so
+        big files don't have to fit in memory
+
+    Parameters:
+        •filename (str)
+
+    Returns:
+        str hex digest
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def padding(length):
+    # how many zero bytes are needed to get to the next aligned position
+    return (-length) % ALIGNMENT
+
+
+def write_cache(path, table, fingerprint, rows_in_file):
+    """
+    Does:
+        Writes a cleaned GameTable to a cache file: a small JSON header
+        (fingerprint, where each block is) followed by the raw bytes of each
+        typed column and a block for each category column's vocabulary
+
+    Parameters:
+        •path (str)
+            •where to write the cache file
+        •table (GameTable)
+            •the cleaned dataset
+        •fingerprint (dict)
+            •the size, mtime and sha256 of the CSV the table came from
+        •rows_in_file (int)
+            •how many games the CSV had before anything was removed
+
+    Returns:
+        None
+    """
+    blocks = []
+    columns = []
+    vocabularies = {}
+    offset = 0
+
+    # laying out each of the columns one after another
+    for col in range(NUM_COLUMNS):
+        data = bytes(table.columns[col])
+        columns.append({"col": col, "typecode": COLUMN_TYPES[col],
+                        "offset": offset, "length": len(data)})
+        blocks.append(data)
+        offset += len(data) + padding(len(data))
+
+    # and then the vocabularies, each as one block of separated strings
+    for col, vocab in table.vocabularies.items():
+        data = VOCABULARY_SEPARATOR.join(vocab).encode("utf-8")
+        vocabularies[str(col)] = {"offset": offset, "length": len(data), "count": len(vocab)}
+        blocks.append(data)
+        offset += len(data) + padding(len(data))
+
+    header = {
+        "version": CACHE_VERSION,
+        "byteorder": sys.byteorder,
+        "fingerprint": fingerprint,
+        "rows_in_file": rows_in_file,
+        "rows": len(table),
+        "columns": columns,
+        "vocabularies": vocabularies,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * padding(len(header_bytes))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # writing to a temporary file first and then swapping it in, so a half
+    # written cache is never picked up (and any open memory maps of the old
+    # one stay valid)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<Q", len(header_bytes)))
+        file.write(header_bytes)
+        for data in blocks:
+            file.write(data)
+            file.write(b"\0" * padding(len(data)))
+    os.replace(temporary_path, path)
+
+
+def read_cache_header(path):
+    """
+    Does:
+        Reads just the header of a cache file
+
+    Parameters:
+        •path (str)
+
+    Returns:
+        dict of the header, or None if the file is missing, isn't a cache
+        file, or was written by a different version
+    """
+    try:
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                return None
+            (header_length,) = struct.unpack("<Q", file.read(8))
+            header = json.loads(file.read(header_length))
+    except (OSError, ValueError, struct.error):
+        return None
+
+    if header.get("version") != CACHE_VERSION or header.get("byteorder") != sys.byteorder:
+        return None
+    return header
+
+
+def map_cache(path):
+    """
+    Does:
+        Memory-maps a cache file and builds a GameTable on top of it. The
+        typed columns are views straight into the mapped file, so nothing is
+        parsed or copied; only the vocabularies are decoded
+
+    Parameters:
+        •path (str)
+
+    Returns:
+        tuple of the GameTable and the header dict, or None if the cache
+        can't be used
+    """
+    header = read_cache_header(path)
+    if header is None:
+        return None
+
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(mapped)
+    data_start = len(MAGIC) + 8
+    data_start += struct.unpack("<Q", mapped[len(MAGIC):data_start])[0]
+
+    vocabularies = {}
+    for col, place in header["vocabularies"].items():
+        start = data_start + place["offset"]
+        text = bytes(view[start:start + place["length"]]).decode("utf-8")
+        vocabularies[int(col)] = text.split(VOCABULARY_SEPARATOR) if place["count"] else []
+
+    table = GameTable(vocabularies)
+    for column in header["columns"]:
+        start = data_start + column["offset"]
+        table.columns[column["col"]] = view[start:start + column["length"]].cast(column["typecode"])
+
+    return table, header
+
+
+def lookup(filename):
+    """
+    Does:
+        Gets the cached table for a CSV file only if the cache is still up to
+        date, without ever building one
+
+        The cache counts as up to date when the CSV's size and mtime haven't
+        changed. If either has, the contents get hashed, and if the hash is
+        the same (the file was only touched or copied) the cache is kept and
+        just given the new size and mtime
+
+    Parameters:
+        •filename (str)
+            •path to the CSV file
+
+    Returns:
+        tuple of the cleaned GameTable and the number of games in the file,
+        or None if there's no usable cache
+    """
+    path = cache_path(filename)
+    header = read_cache_header(path)
+    if header is None:
+        return None
+
+    stat = os.stat(filename)
+    fingerprint = header["fingerprint"]
+
+    if fingerprint["size"] == stat.st_size and fingerprint["mtime_ns"] == stat.st_mtime_ns:
+        mapped = map_cache(path)
+        if mapped is not None:
+            return mapped[0], header["rows_in_file"]
+        return None
+
+    # the file's details changed, but the contents might not have
+    content_hash = file_hash(filename)
+    if content_hash != fingerprint["sha256"]:
+        return None
+
+    mapped = map_cache(path)
+    if mapped is None:
+        return None
+    table, header = mapped
+    new_fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": content_hash}
+    write_cache(path, table, new_fingerprint, header["rows_in_file"])
+    return table, header["rows_in_file"]
+
+
+def load_table(filename, build, use_cache=True):
+    """
+    Does:
+        Gets the cleaned table for a CSV file, from the cache if it's still
+        up to date (see lookup), otherwise by running the build function and
+        saving what it returns for next time
+
+    Parameters:
+        •filename (str)
+            •path to the CSV file
+        •build (function)
+            •takes the filename and returns a tuple of the cleaned GameTable
+            and the number of games in the file
+        •use_cache (bool)
+            •False skips the cache completely
+
+    Returns:
+        tuple of the cleaned GameTable and the number of games in the file
+    """
+    if not use_cache:
+        return build(filename)
+
+    cached = lookup(filename)
+    if cached is not None:
+        return cached
+
+    # no usable cache, so the CSV has to be parsed after all
+    stat = os.stat(filename)
+    table, rows_in_file = build(filename)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                   "sha256": file_hash(filename)}
+
+    # a cache that can't be written (read-only folder, etc.) isn't worth failing over
+    try:
+        write_cache(cache_path(filename), table, fingerprint, rows_in_file)
+    except OSError:
+        pass
+
+    return table, rows_in_file
+
+
+def clear_cache(filename):
+    """
+    Does:
+        Deletes the cache of a CSV file, if there is one
+
+    Parameters:
+        •filename (str)
+
+    Returns:
+        None
+    """
+    try:
+        os.remove(cache_path(filename))
+    except FileNotFoundError:
+        pass
@@ -1,4 +1,10 @@
 import csv
+from decimal import Decimal, InvalidOperation
+
+import cache
+import columnar
+from gametable import GameTable, NUM_COLUMNS
+from instrument import profiled
 
 
 FILENAME = "vgsales.csv"
@@ -14,6 +20,145 @@ COLUMN_JP = 8
 COLUMN_OTHER = 9
 COLUMN_GLOBAL = 10
 
+# sales are stored as whole numbers of single sales instead of floats of
+# millions, so 1.5 (million) is stored as 1500000
+SALES_UNITS = 1000000
+SALES_DECIMALS = 6
+
+# what the digits have to be multiplied by, for however many decimal places
+# a sales figure was written with
+_DECIMAL_SCALE = [10 ** (SALES_DECIMALS - places) for places in range(SALES_DECIMALS + 1)]
+
+# a column of sales can be converted the quick way (see parse_sales_column)
+# if none of its figures are longer than this, since that rules out more than
+# 6 decimal places and keeps them all well under 2**51 single sales, where
+# float(text) * 1000000 is always within 0.5 of the exact answer
+_QUICK_MAX_LENGTH = 7
+
+# how many rows are converted together when reading into a GameTable
+CONVERT_BATCH = 4096
+
+
+def parse_sales(text):
+    """
+    Does:
+      Converts one sales figure (in millions, like '0.07') into single
+      sales, exactly. int(float(text) * 1000000) can come out one short
+      (0.07 * 1000000 is 69999.99...), so short figures are rounded instead
+      of cut off, and longer ones have the decimal point taken out and their
+      digits scaled up by however many places there were. Anything past 6
+      decimal places is cut off
+
+    Parameters:
+      •text
+            •str of the sales figure
+
+    Returns:
+      int number of single sales
+    """
+    # short figures can go through a float exactly (see _QUICK_MAX_LENGTH)
+    if len(text) <= _QUICK_MAX_LENGTH and "e" not in text and "E" not in text:
+        return round(float(text) * SALES_UNITS)
+
+    point = text.find(".")
+    if point < 0:
+        try:
+            return int(text) * SALES_UNITS
+        except ValueError:
+            return _parse_sales_slowly(text)
+
+    places = len(text) - point - 1
+    if places > SALES_DECIMALS:
+        text = text[:point + 1 + SALES_DECIMALS]
+        places = SALES_DECIMALS
+
+    try:
+        return int(text[:point] + text[point + 1:]) * _DECIMAL_SCALE[places]
+    except ValueError:
+        return _parse_sales_slowly(text)
+
+
+def _parse_sales_slowly(text):
+    # for anything that isn't plain digits with an optional point ('1e-2',
+    # ' 0.5', etc.), still exact but a lot slower
+    try:
+        return int(Decimal(text.strip()) * SALES_UNITS)
+    except InvalidOperation:
+        raise ValueError("invalid sales figure: {!r}".format(text)) from None
+
+
+def parse_sales_column(values):
+    """
+    Does:
+      Converts a whole column of sales figures at once, giving exactly the
+      same numbers as parse_sales
+
+      The column is checked once up front, and if every figure is short
+      (like '41.49') with no exponent, each one is converted with
+      round(float(text) * 1000000), which is exact in that range and runs
+      entirely in C. Otherwise each figure goes through parse_sales
+
+    Parameters:
+      •values
+            •sequence of str sales figures
+
+    Returns:
+      list of ints of single sales
+    """
+    if max(map(len, values), default=0) <= _QUICK_MAX_LENGTH:
+        joined = "".join(values)
+        quick = "e" not in joined and "E" not in joined
+    else:
+        quick = False
+
+    if quick:
+        return list(map(round, map(float(SALES_UNITS).__mul__, map(float, values))))
+    return [parse_sales(text) for text in values]
+
+
+def convert_columns(rows):
+    """
+    Does:
+      Batch version of convert_row: converts a list of rows of strings
+      column by column, picking the columns by their position. Any 'N/A'
+      numbers are set to 0
+
+    Parameters:
+      •rows
+            •list of lists of strings, one per game
+
+    Returns:
+      tuple of a list of the 11 converted columns (lists) and a list of
+      whether each row had any 'N/A' values (or None if none did)
+    """
+    if not rows:
+        return [[] for col in range(NUM_COLUMNS)], None
+
+    columns = [list(column) for column in zip(*rows)]
+    if len(columns) < NUM_COLUMNS:
+        raise ValueError("expected {} columns, found a row with {}".format(NUM_COLUMNS, len(columns)))
+
+    # the rows only need checking one by one if any column has an 'N/A' in it
+    missing = None
+    if any('N/A' in column for column in columns):
+        missing = ['N/A' in row for row in rows]
+
+    for col in (COLUMN_RANK, COLUMN_YEAR):
+        column = columns[col]
+        if missing is not None and 'N/A' in column:
+            column = ['0' if value == 'N/A' else value for value in column]
+        columns[col] = list(map(int, column))
+
+    for col in (COLUMN_NA, COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL):
+        column = columns[col]
+        if missing is not None and 'N/A' in column:
+            column = ['0' if value == 'N/A' else value for value in column]
+        columns[col] = parse_sales_column(column)
+
+    return columns, missing
+
+
+@profiled
 def read_file(filename):
     """
     Does:
@@ -46,6 +191,119 @@ def read_file(filename):
     # returns the new list of data
     return data
 
+
+def convert_row(row):
+    """
+    Does:
+      Converts a single row of strings from the file into the typed format
+      (rank and year as ints, sales as ints of single units). Any 'N/A'
+      numbers are set to 0 so the row can still be stored
+
+    Parameters:
+      •row
+            •list of strings for one game
+
+    Returns:
+      tuple of the converted row and whether it had any 'N/A' values
+    """
+    missing = 'N/A' in row
+
+    converted = list(row)
+    for col in (COLUMN_RANK, COLUMN_YEAR):
+        converted[col] = 0 if row[col] == 'N/A' else int(row[col])
+    for col in (COLUMN_NA, COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL):
+        converted[col] = 0 if row[col] == 'N/A' else parse_sales(row[col])
+
+    return converted, missing
+
+
+def table_from_rows(list_of_lists):
+    """
+    Does:
+      Builds a GameTable out of a 2D list, either straight from read_file
+      (strings) or after convert_str_to_float (numbers)
+
+    Parameters:
+      •list_of_lists
+            •list of lists of the dataset
+
+    Returns:
+      GameTable with the same games
+    """
+    table = GameTable()
+
+    for game in list_of_lists:
+        # rows that still hold strings need converting first
+        if isinstance(game[COLUMN_RANK], str):
+            converted, missing = convert_row(game)
+            table.append(converted, missing)
+        else:
+            table.append(game)
+
+    return table
+
+
+def read_table(filename, row_filter=None):
+    """
+    Does:
+      Reads every line of the file, except the header, straight into a
+      GameTable (one typed array per column) instead of a 2D list
+
+    Parameters:
+      •filename for a CSV file
+      •row_filter
+            •optional rowfilter.RowFilter; rows it doesn't match are skipped
+            before they're converted
+
+    Returns:
+      GameTable of every game in the file (including ones with 'N/A' values,
+      which are marked so remove_missing_data can take them out)
+    """
+    return read_filtered_table(filename, row_filter)[0]
+
+
+@profiled
+def read_filtered_table(filename, row_filter=None):
+    """
+    Does:
+      Reads the file into a GameTable, checking each raw row against the
+      filter first so the rows that aren't wanted are never converted or
+      stored (the cost then depends on how many rows are kept)
+
+    Parameters:
+      •filename for a CSV file
+      •row_filter
+            •rowfilter.RowFilter, or None to keep every row
+
+    Returns:
+      tuple of the GameTable and the number of rows that were in the file
+    """
+    table = GameTable()
+    rows_read = 0
+
+    with open(filename) as csvfile:
+        reader = csv.reader(csvfile, delimiter=",")
+
+        # skip first line so that the header isn't used in the data set
+        next(reader)
+
+        # the rows are converted a batch at a time as they're read, so the
+        # strings never pile up
+        batch = []
+        for row in reader:
+            rows_read += 1
+            if row_filter is not None and not row_filter.matches_raw(row):
+                continue
+            batch.append(row)
+            if len(batch) == CONVERT_BATCH:
+                table.append_columns(*convert_columns(batch))
+                batch = []
+        table.append_columns(*convert_columns(batch))
+
+    return table, rows_read
+
+
+@profiled
 def remove_missing_data(list_of_lists):
     """
     Does:
@@ -53,12 +311,19 @@ def remove_missing_data(list_of_lists):
 
     Parameters:
       •list_of_lists
-            •(list of lists of the dataset)
+            •(list of lists of the dataset, or a GameTable)
 
     Returns:
-      List of lists without 'N/A' entries
+      List of lists without 'N/A' entries (or a GameTable, if given one)
     """
 
+    # a table already knows which rows had missing values
+    if isinstance(list_of_lists, GameTable):
+        if list_of_lists.missing is None:
+            return list_of_lists
+        return list_of_lists.take([row_id for row_id, missing in enumerate(list_of_lists.missing)
+                                   if not missing])
+
     # sets up an empty list
     fixed_list_of_lists = []
 
@@ -77,6 +342,7 @@ def remove_missing_data(list_of_lists):
     return fixed_list_of_lists
 
 
+@profiled
 def convert_str_to_float(list_of_lists, col_rank, col_year, col_na, col_eu, col_jp, col_other, col_global):
     """
     Does:
@@ -84,7 +350,8 @@ def convert_str_to_float(list_of_lists, col_rank, col_year, col_na, col_eu, col_
 
     Parameters:
       •list_of_lists
-            •list of lists of all the data to be changed
+            •list of lists of all the data to be changed (or a GameTable,
+            whose columns are already typed and is returned as is)
       •col_rank
             •int pertaining to the rank column
       •col_year
@@ -104,51 +371,58 @@ def convert_str_to_float(list_of_lists, col_rank, col_year, col_na, col_eu, col_
       List of lists with specified columns converted to integers
     """
 
-    # sets up new list to be added to
-    fixed_list = []
+    # the table's columns were converted when it was read
+    if isinstance(list_of_lists, GameTable):
+        return list_of_lists
 
-    # iterates through lists making a new list for the cleaner list to go into
-    for game in list_of_lists:
-        small_list = []
+    if not list_of_lists:
+        return []
 
-        # iterates through indexes and sets the numbers to numbers and their true values
-        for index in game:
+    # turns the rows into columns so each one can be converted in one go
+    columns = [list(column) for column in zip(*list_of_lists)]
 
-            # if statement that converts rank and year to integers and adds them to the new list
-            if (index == game[col_rank] or index == game[col_year]):
-                int_number = int(index)
-                small_list.append(int_number)
+    # converts rank and year to integers, picking the columns by their
+    # position (so a name or publisher that looks like a number is left alone)
+    for col in (col_rank, col_year):
+        columns[col] = list(map(int, columns[col]))
 
-            # if statement that converts na, eu, jp, and other sales to integers and add them to a new list
-            elif (index == game[col_na] or index == game[col_eu] or index == game[col_jp] or index == game[col_other] or index == game[col_global]):
-                float_number = float(index)
-                float_number_real = float_number * 1000000
-                int_number_real = int(float_number_real)
-                small_list.append(int_number_real)
+    # converts na, eu, jp, other and global sales to integers of single sales
+    for col in (col_na, col_eu, col_jp, col_other, col_global):
+        columns[col] = parse_sales_column(columns[col])
 
-            # if its not one of those indexes, just add a string
-            else:
-                small_list.append(index)
+    # and back into a list of lists
+    return [list(game) for game in zip(*columns)]
 
-        # add new list to the list of lists
-        fixed_list.append(small_list)
 
-    # returns the list of lists
-    return fixed_list
-
-
-def remove_games_before_year(list_of_lists):
+@profiled
+def remove_games_before_year(list_of_lists, index=None, year=2013):
     """
     Does:
       Filters the dataset to include only games released in or after 2013
+      (or another year)
 
     Parameters:
       •lists of lists
-            •(list of lists of the dataset)
+            •(list of lists of the dataset, or a GameTable)
+      •index
+            •optional tableindex.TableIndex of the GameTable, so the games
+            can be found with its year index instead of checking every row
+      •year
+            •int, the first year to keep (2013 by default)
 
     Returns:
-      list of lists for games released after 2013
+      list of lists for games released after 2013 (or a GameTable, if given one)
     """
+
+    # the year index already has the games in year order
+    if index is not None:
+        return index.select_table(years=(year, None))
+
+    # for a table only the year column has to be looked at
+    if isinstance(list_of_lists, GameTable):
+        years = list_of_lists.columns[COLUMN_YEAR]
+        return list_of_lists.take([row_id for row_id, game_year in enumerate(years) if game_year >= year])
+
     # sets up an empty list
     fixed_list_of_lists = []
 
@@ -156,19 +430,303 @@ def remove_games_before_year(list_of_lists):
     for game in list_of_lists:
 
       # if the year in the list is after 2013, it is added to the list
-      if game[COLUMN_YEAR] >= 2013:
+      if game[COLUMN_YEAR] >= year:
           fixed_list_of_lists.append(game)
 
     # returns new list
     return fixed_list_of_lists
 
 
-def main():
-    # reading the CSV file into a 2d list
-    data = read_file(FILENAME)
+# the streaming versions of the steps above
+#   •each one is a generator that hands rows on one at a time as they're asked
+#    for, so chaining them never holds more than one row in memory
+
+
+def iter_file(filename):
+    """
+    Does:
+      Streaming version of read_file: yields each row of the file, except
+      the header, one at a time instead of building a 2D list
+
+    Parameters:
+      •filename for a CSV file
+
+    Returns:
+      generator of lists of strings
+    """
+    with open(filename) as csvfile:
+        reader = csv.reader(csvfile, delimiter=",")
+
+        # skip first line so that the header isn't used in the data set
+        next(reader)
+
+        for row in reader:
+            yield row
+
+
+def iter_filter_rows(rows, row_filter):
+    """
+    Does:
+      Streaming stage that passes on only the raw rows a RowFilter matches,
+      so the rest are never converted
+
+    Parameters:
+      •rows
+            •any iterable of rows of strings (like iter_file)
+      •row_filter
+            •rowfilter.RowFilter
+
+    Returns:
+      generator of rows
+    """
+    for row in rows:
+        if row_filter.matches_raw(row):
+            yield row
+
+
+def iter_remove_missing_data(rows):
+    """
+    Does:
+      Streaming version of remove_missing_data: passes on only the rows that
+      don't contain 'N/A'
+
+    Parameters:
+      •rows
+            •any iterable of rows (like iter_file)
+
+    Returns:
+      generator of rows
+    """
+    for row in rows:
+        if 'N/A' not in row:
+            yield row
+
+
+def iter_convert_str_to_float(rows):
+    """
+    Does:
+      Streaming version of convert_str_to_float: converts rank, year and the
+      sales of each row as it goes past
+
+    Parameters:
+      •rows
+            •any iterable of rows of strings without 'N/A' values
+
+    Returns:
+      generator of converted rows
+    """
+    for row in rows:
+        yield convert_row(row)[0]
+
+
+def iter_remove_games_before_year(rows, year=2013):
+    """
+    Does:
+      Streaming version of remove_games_before_year
+
+    Parameters:
+      •rows
+            •any iterable of converted rows
+      •year
+            •int, the first year to keep (2013 by default)
+
+    Returns:
+      generator of the rows released in or after the year
+    """
+    for row in rows:
+        if row[COLUMN_YEAR] >= year:
+            yield row
+
+
+def stream_cleaned_data(filename, row_filter=None):
+    """
+    Does:
+      Chains the streaming steps together so the file is read, cleaned and
+      converted one row at a time. The result can be fed straight into
+      aggregate.group_by (or group_by_genre) without ever building the
+      dataset in memory, so files bigger than memory can still be analysed
+
+    Parameters:
+      •filename for a CSV file
+      •row_filter
+            •optional rowfilter.RowFilter to use instead of the usual "2013
+            and after", checked before each row is converted
+
+    Returns:
+      generator of cleaned, converted rows released in or after 2013 (or
+      matching the filter)
+    """
+    rows = iter_file(filename)
+
+    if row_filter is not None:
+        rows = iter_filter_rows(rows, row_filter)
+        rows = iter_remove_missing_data(rows)
+        return iter_convert_str_to_float(rows)
+
+    rows = iter_remove_missing_data(rows)
+    rows = iter_convert_str_to_float(rows)
+    return iter_remove_games_before_year(rows)
+
+
+def _build_non_empty_table(filename, workers=1):
+    """
+    Does:
+      Reads the file into a table and takes out the games with missing data
+      (what gets saved in the cache)
+
+    Parameters:
+      •filename for a CSV file
+      •workers
+            •int, how many processes to parse the file with (1 reads it
+            normally, None uses one per CPU)
+
+    Returns:
+      tuple of the GameTable without 'N/A' entries and the number of games
+      that were in the file
+    """
+    if workers == 1:
+        data = read_table(filename)
+    else:
+        # only loaded when needed, since it imports this module too
+        from ingest import read_table_parallel
+        data = read_table_parallel(filename, workers)
+    return remove_missing_data(data), len(data)
+
+
+@profiled
+def load_non_empty_table(filename, use_cache=True, workers=1):
+    """
+    Does:
+      Gets the dataset with the missing data removed and the numbers
+      converted, reading it from the binary cache when the CSV hasn't changed
+      since last time (so the text doesn't have to be parsed again)
+
+    Parameters:
+      •filename for a CSV file (or a columnar .vgt file, see columnar.py)
+      •use_cache
+            •bool, False to always parse the CSV
+      •workers
+            •int, how many processes to parse the file with if it does have
+            to be parsed (1 by default, None for one per CPU)
+
+    Returns:
+      tuple of the GameTable without 'N/A' entries and the number of games
+      that were in the file
+    """
+    # a columnar file already holds the cleaned table, so there's nothing to cache
+    if columnar.is_columnar(filename):
+        return columnar.read_table(filename)
+
+    return cache.load_table(filename, lambda name: _build_non_empty_table(name, workers), use_cache)
+
+
+@profiled
+def load_cleaned_data(filename=FILENAME, use_cache=True, workers=1):
+    """
+    Does:
+      Runs the whole cleaning pipeline once (from the cache when it can),
+      giving back every version of the dataset the scripts print about
+
+    Parameters:
+      •filename for a CSV file (vgsales.csv by default)
+      •use_cache
+            •bool, False to always parse the CSV
+      •workers
+            •int, how many processes to parse the file with (None for one per CPU)
+
+    Returns:
+      tuple of
+        •the GameTable without 'N/A' entries
+        •the GameTable of games released in or after 2013
+        •the number of games that were in the file
+    """
+    non_empty_data, rows_in_file = load_non_empty_table(filename, use_cache, workers)
+    converted_type_data = convert_str_to_float(non_empty_data, COLUMN_RANK, COLUMN_YEAR, COLUMN_NA, COLUMN_EU,
+                                               COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL)
+    cleaned_data = remove_games_before_year(converted_type_data)
+    return non_empty_data, cleaned_data, rows_in_file
+
+
+@profiled
+def load_filtered_data(filename, row_filter, use_cache=True, workers=1):
+    """
+    Does:
+      Gets only the games that match a filter, with missing data removed.
+      If the binary cache is up to date the filter is run over its columns;
+      otherwise the filter is applied while the CSV is being read, so rows
+      that don't match are never converted
+
+    Parameters:
+      •filename for a CSV file
+      •row_filter
+            •rowfilter.RowFilter
+      •use_cache
+            •bool, False to always parse the CSV
+      •workers
+            •int, how many processes to parse the file with (None for one per CPU)
+
+    Returns:
+      tuple of the GameTable of matching games and the number of games that
+      were in the file
+    """
+    if columnar.is_columnar(filename):
+        table, rows_in_file = columnar.read_table(filename)
+        return row_filter.apply(table), rows_in_file
+
+    if use_cache:
+        cached = cache.lookup(filename)
+        if cached is not None:
+            table, rows_in_file = cached
+            return row_filter.apply(table), rows_in_file
+
+    if workers == 1:
+        table, rows_in_file = read_filtered_table(filename, row_filter)
+    else:
+        from ingest import read_filtered_table_parallel
+        table, rows_in_file = read_filtered_table_parallel(filename, row_filter, workers)
 
-    # removing any games that have any missing pieces of data associated with them
-    non_empty_data = remove_missing_data(data)
+    return remove_missing_data(table), rows_in_file
+
+
+@profiled
+def load_columns(filename, columns=None, first_year=None, last_year=None, use_cache=True):
+    """
+    Does:
+      Gets only some of the columns of the games with missing data removed,
+      for analyses that don't need the rest (e.g. the genre charts only need
+      the genres and global sales). From a columnar .vgt file only those
+      columns are read, and row groups outside the years are skipped; a CSV
+      is loaded whole (from the cache when it can) and then filtered
+
+    Parameters:
+      •filename for a CSV file or a columnar .vgt file
+      •columns
+            •iterable of column indexes, or None for all of them. Columns
+            that weren't read are None in the table (see columnar.read_table)
+      •first_year, last_year
+            •int or None, the range of years to keep
+      •use_cache
+            •bool, False to always parse a CSV
+
+    Returns:
+      tuple of the GameTable and the number of games that were in the file
+    """
+    if columnar.is_columnar(filename):
+        return columnar.read_table(filename, columns, first_year, last_year)
+
+    table, rows_in_file = load_non_empty_table(filename, use_cache)
+    if first_year is not None or last_year is not None:
+        low = first_year if first_year is not None else float("-inf")
+        high = last_year if last_year is not None else float("inf")
+        years = table.columns[COLUMN_YEAR]
+        table = table.take([row_id for row_id, year in enumerate(years) if low <= year <= high])
+    return table, rows_in_file
+
+
+def main():
+    # reading the CSV file into a table of typed columns (or straight from
+    # the cache) with any games that have missing pieces of data removed
+    non_empty_data, rows_in_file = load_non_empty_table(FILENAME)
 
     # converting any numeric values into proper integer format instead of strings
     converted_type_data = convert_str_to_float(non_empty_data, COLUMN_RANK, COLUMN_YEAR, COLUMN_NA, COLUMN_EU,
@@ -176,6 +734,8 @@ def main():
 
     # removing any games before the year range we are working with
     cleaned_data = remove_games_before_year(converted_type_data)
-    print(cleaned_data)
+    print(cleaned_data.to_rows())
+
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,417 @@
+"""
+A columnar file format for the cleaned games, so loading them doesn't mean
+parsing text every time
+
+    python columnar.py vgsales.csv                  # writes vgsales.vgt
+    python columnar.py vgsales.csv --keep-order -o games.vgt
+    python columnar.py vgsales.vgt --info --columns genre,global --years 2013:
+
+The games are split into row groups, and inside each group every column is a
+block of typed values (the same bytes the GameTable keeps), along with its
+smallest and biggest value. Reading only has to touch the blocks of the
+columns that are asked for (the names alone are most of the file), and a
+year range skips every row group whose years are all outside it. Games are
+written in year order by default so that this skips as much as possible
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+from array import array
+
+from cache import VOCABULARY_SEPARATOR, padding
+from gametable import (GameTable, COLUMN_TYPES, NUM_COLUMNS,
+                       COLUMN_RANK, COLUMN_NAME, COLUMN_PLATFORM, COLUMN_YEAR, COLUMN_GENRE,
+                       COLUMN_PUBLISHER, COLUMN_NA, COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL)
+from instrument import profiled
+
+EXTENSION = ".vgt"
+
+# the first bytes of every file, so random files aren't mistaken for one
+MAGIC = b"VGSTABLE"
+
+# has to be changed whenever the layout changes
+FORMAT_VERSION = 1
+
+# how many games go in each row group: smaller groups can be skipped more
+# precisely, bigger ones have less overhead
+ROW_GROUP_SIZE = 2048
+
+# the names the columns can be asked for by (on the command line)
+COLUMN_NAMES = {"rank": COLUMN_RANK, "name": COLUMN_NAME, "platform": COLUMN_PLATFORM,
+                "year": COLUMN_YEAR, "genre": COLUMN_GENRE, "publisher": COLUMN_PUBLISHER,
+                "na": COLUMN_NA, "eu": COLUMN_EU, "jp": COLUMN_JP, "other": COLUMN_OTHER,
+                "global": COLUMN_GLOBAL}
+
+
+def is_columnar(filename):
+    """
+    Does:
+        Checks whether a file name is one of these files (by its extension)
+
+    Parameters:
+        •filename (str)
+
+    Returns:
+        bool
+    """
+    return filename.lower().endswith(EXTENSION)
+
+
+def write_table(filename, table, rows_in_file=None, row_group_size=ROW_GROUP_SIZE, sort_by_year=True):
+    """
+    Does:
+        Writes a GameTable to a columnar file: a JSON header (where every
+        block is, and each row group's min/max of every column) followed by
+        the vocabularies and then the row groups' column blocks
+
+    Parameters:
+        •filename (str)
+        •table (GameTable)
+            •normally the cleaned games (missing marks are kept if it has any)
+        •rows_in_file (int or None)
+            •how many games the CSV had before anything was removed (the
+            table's length if None)
+        •row_group_size (int)
+        •sort_by_year (bool)
+            •write the games in year order (keeping their order within each
+            year) so year ranges can skip row groups. Anything that goes by
+            the order games first show up in (like the order of the genres)
+            will then follow the years instead of the ranks
+
+    Returns:
+        None
+    """
+    if row_group_size < 1:
+        raise ValueError("row_group_size has to be at least 1")
+
+    if sort_by_year:
+        years = table.columns[COLUMN_YEAR]
+        table = table.take(sorted(range(len(table)), key=years.__getitem__))
+
+    blocks = []
+    offset = 0
+
+    def add_block(data):
+        nonlocal offset
+        place = {"offset": offset, "length": len(data)}
+        blocks.append(data)
+        offset += len(data) + padding(len(data))
+        return place
+
+    # the vocabularies first, each as one block of separated strings
+    vocabularies = {}
+    for col, vocab in table.vocabularies.items():
+        place = add_block(VOCABULARY_SEPARATOR.join(vocab).encode("utf-8"))
+        place["count"] = len(vocab)
+        vocabularies[str(col)] = place
+
+    # and then each row group's columns one after another
+    row_groups = []
+    for start in range(0, len(table), row_group_size):
+        stop = min(start + row_group_size, len(table))
+        columns = {}
+        for col in range(NUM_COLUMNS):
+            values = table.columns[col][start:stop]
+            place = add_block(bytes(values))
+            place["min"] = min(values)
+            place["max"] = max(values)
+            columns[str(col)] = place
+
+        group = {"rows": stop - start, "columns": columns, "missing": None}
+        if table.missing is not None and any(table.missing[start:stop]):
+            group["missing"] = add_block(bytes(table.missing[start:stop]))
+        row_groups.append(group)
+
+    header = {
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "rows": len(table),
+        "rows_in_file": len(table) if rows_in_file is None else rows_in_file,
+        "sorted_by_year": sort_by_year,
+        "typecodes": [COLUMN_TYPES[col] for col in range(NUM_COLUMNS)],
+        "vocabularies": vocabularies,
+        "row_groups": row_groups,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * padding(len(header_bytes))
+
+    # written to a temporary file first so a half written file is never read
+    temporary_path = filename + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<Q", len(header_bytes)))
+        file.write(header_bytes)
+        for data in blocks:
+            file.write(data)
+            file.write(b"\0" * padding(len(data)))
+    os.replace(temporary_path, filename)
+
+
+def read_header(filename):
+    """
+    Does:
+        Reads just the header of a columnar file
+
+    Parameters:
+        •filename (str)
+
+    Returns:
+        tuple of the header dict and where the blocks start in the file
+    """
+    with open(filename, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} isn't a columnar games file".format(filename))
+        (header_length,) = struct.unpack("<Q", file.read(8))
+        header = json.loads(file.read(header_length))
+
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError("{} was written by a different version ({}, expected {})".format(
+            filename, header.get("version"), FORMAT_VERSION))
+    if header.get("byteorder") != sys.byteorder:
+        raise ValueError("{} was written on a {} endian machine".format(filename, header.get("byteorder")))
+
+    return header, len(MAGIC) + 8 + header_length
+
+
+def _wanted_columns(columns):
+    # the rank is always read, since the table's length comes from it
+    if columns is None:
+        return list(range(NUM_COLUMNS))
+    wanted = set(columns)
+    for col in wanted:
+        if not 0 <= col < NUM_COLUMNS:
+            raise ValueError("there's no column {}".format(col))
+    wanted.add(COLUMN_RANK)
+    return sorted(wanted)
+
+
+def _year_check(group, first_year, last_year):
+    """
+    Does:
+        Uses a row group's year stats to work out whether any (or all) of its
+        games are in a range of years
+
+    Returns:
+        "none", "all" or "some"
+    """
+    year = group["columns"][str(COLUMN_YEAR)]
+    low = first_year if first_year is not None else year["min"]
+    high = last_year if last_year is not None else year["max"]
+
+    if year["max"] < low or year["min"] > high:
+        return "none"
+    if year["min"] >= low and year["max"] <= high:
+        return "all"
+    return "some"
+
+
+def plan_read(header, columns=None, first_year=None, last_year=None):
+    """
+    Does:
+        Works out which row groups and blocks a read would need, without
+        reading anything
+
+    Parameters:
+        •header (dict)
+            •from read_header
+        •columns, first_year, last_year
+            •the same as read_table
+
+    Returns:
+        dict with the row groups to read (as (position, "all" or "some")
+        pairs), how many there are in total, and the bytes that would be read
+        out of the bytes of blocks in the file
+    """
+    wanted = _wanted_columns(columns)
+    year_range = first_year is not None or last_year is not None
+
+    groups = []
+    bytes_read = 0
+    bytes_total = 0
+
+    for col, place in header["vocabularies"].items():
+        bytes_total += place["length"]
+        if int(col) in wanted:
+            bytes_read += place["length"]
+
+    for position, group in enumerate(header["row_groups"]):
+        coverage = _year_check(group, first_year, last_year) if year_range else "all"
+        needed = set(wanted)
+        if coverage == "some":
+            # the years have to be looked at to know which games to keep
+            needed.add(COLUMN_YEAR)
+        if coverage != "none":
+            groups.append((position, coverage))
+
+        for col, place in group["columns"].items():
+            bytes_total += place["length"]
+            if coverage != "none" and int(col) in needed:
+                bytes_read += place["length"]
+
+    return {"row_groups": groups, "row_groups_total": len(header["row_groups"]),
+            "bytes_read": bytes_read, "bytes_total": bytes_total}
+
+
+def _read_block(file, data_start, place):
+    file.seek(data_start + place["offset"])
+    return file.read(place["length"])
+
+
+@profiled
+def read_table(filename, columns=None, first_year=None, last_year=None):
+    """
+    Does:
+        Reads games from a columnar file, only reading the blocks of the
+        columns that are asked for and skipping every row group that has no
+        games in the range of years
+
+    Parameters:
+        •filename (str)
+        •columns (iterable of ints or None)
+            •the columns to read (e.g. (COLUMN_GENRE, COLUMN_GLOBAL) for the
+            genre charts), or None for all of them. The rank is always read
+            •columns that weren't read are None in the table, so it can only
+            be used with things that go by column (group_by, top_k, ...), not
+            iterated as rows
+        •first_year, last_year (int or None)
+            •only keep the games released in this range (either end can be
+            None)
+
+    Returns:
+        tuple of the GameTable and the number of games that were in the
+        original file
+    """
+    header, data_start = read_header(filename)
+    plan = plan_read(header, columns, first_year, last_year)
+    wanted = _wanted_columns(columns)
+    typecodes = header["typecodes"]
+
+    with open(filename, "rb") as file:
+        vocabularies = {}
+        for col, place in header["vocabularies"].items():
+            col = int(col)
+            if col in wanted:
+                text = _read_block(file, data_start, place).decode("utf-8")
+                vocabularies[col] = text.split(VOCABULARY_SEPARATOR) if place["count"] else []
+            else:
+                vocabularies[col] = []
+
+        table = GameTable(vocabularies)
+        for col in range(NUM_COLUMNS):
+            table.columns[col] = array(typecodes[col]) if col in wanted else None
+
+        missing = bytearray()
+        any_missing = False
+
+        for position, coverage in plan["row_groups"]:
+            group = header["row_groups"][position]
+            places = group["columns"]
+
+            keep = None
+            if coverage == "some":
+                years = array(typecodes[COLUMN_YEAR], _read_block(file, data_start, places[str(COLUMN_YEAR)]))
+                low = first_year if first_year is not None else -sys.maxsize
+                high = last_year if last_year is not None else sys.maxsize
+                keep = [row for row, year in enumerate(years) if low <= year <= high]
+
+            for col in wanted:
+                if col == COLUMN_YEAR and keep is not None:
+                    values = years
+                else:
+                    values = array(typecodes[col], _read_block(file, data_start, places[str(col)]))
+                if keep is not None:
+                    values = array(typecodes[col], [values[row] for row in keep])
+                table.columns[col].extend(values)
+
+            if group["missing"] is not None:
+                marks = _read_block(file, data_start, group["missing"])
+                if keep is not None:
+                    marks = bytes(marks[row] for row in keep)
+                any_missing = any_missing or any(marks)
+                missing.extend(marks)
+            else:
+                missing.extend(bytes(group["rows"] if keep is None else len(keep)))
+
+    if any_missing:
+        table.missing = missing
+
+    return table, header["rows_in_file"]
+
+
+def parse_years(text):
+    """
+    Does:
+        Turns a year range from the command line into its two ends, like
+        "2013:" (2013 onwards), ":2005", "2010:2015" or just "2014"
+
+    Parameters:
+        •text (str)
+
+    Returns:
+        tuple of the first and last year (each int or None)
+    """
+    if ":" not in text:
+        return int(text), int(text)
+    first, last = text.split(":", 1)
+    return (int(first) if first else None), (int(last) if last else None)
+
+
+def parse_columns(text):
+    """
+    Does:
+        Turns a comma separated list of column names (see COLUMN_NAMES) into
+        column indexes
+
+    Parameters:
+        •text (str)
+
+    Returns:
+        list of ints
+    """
+    columns = []
+    for name in text.split(","):
+        name = name.strip().lower()
+        if name not in COLUMN_NAMES:
+            raise ValueError("unknown column {!r} (expected some of {})".format(name, ", ".join(COLUMN_NAMES)))
+        columns.append(COLUMN_NAMES[name])
+    return columns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the games to the columnar format, or look at a file")
+    parser.add_argument("file", help="a CSV file to convert, or a " + EXTENSION + " file to look at with --info")
+    parser.add_argument("-o", "--output", help="where to write the converted file (default: next to the CSV)")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE,
+                        help="games per row group (default: %(default)s)")
+    parser.add_argument("--keep-order", action="store_true",
+                        help="keep the games in the CSV's order instead of sorting them by year")
+    parser.add_argument("--info", action="store_true",
+                        help="print what reading some columns and years from a " + EXTENSION + " file would take")
+    parser.add_argument("--columns", help="comma separated columns for --info, e.g. genre,global")
+    parser.add_argument("--years", help="years for --info, e.g. 2013: or 2010:2015")
+    args = parser.parse_args(argv)
+
+    if args.info:
+        header, data_start = read_header(args.file)
+        columns = parse_columns(args.columns) if args.columns else None
+        first_year, last_year = parse_years(args.years) if args.years else (None, None)
+        plan = plan_read(header, columns, first_year, last_year)
+        print("{} games in {} row groups".format(header["rows"], plan["row_groups_total"]))
+        print("reads {} of the row groups and {:,} of {:,} bytes ({:.1%})".format(
+            len(plan["row_groups"]), plan["bytes_read"], plan["bytes_total"],
+            plan["bytes_read"] / plan["bytes_total"] if plan["bytes_total"] else 0))
+        return
+
+    # only loaded when converting, since it imports this module too
+    from clean import load_non_empty_table
+
+    output = args.output or os.path.splitext(args.file)[0] + EXTENSION
+    table, rows_in_file = load_non_empty_table(args.file)
+    write_table(output, table, rows_in_file, args.row_group_size, not args.keep_order)
+    print("Wrote {} games to {}".format(len(table), output))
+
+
+if __name__ == "__main__":
+    main()
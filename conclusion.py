@@ -1,8 +1,9 @@
-from clean import read_file, remove_missing_data, convert_str_to_float, remove_games_before_year
+from clean import load_cleaned_data
 from analysis import find_genres, get_genre_sizes
 from analysis2 import (calc_region_totals, count_total_games, print_regional_values,
                        get_all_genre_averages_by_region)
-from heatmap import calculate_relative_portions
+from heatmap import relative_portions_matrix, matrix_to_dict
+from aggregate import group_by_genre
 
 FILENAME = "vgsales.csv"
 NA = 'NA_Sales'
@@ -20,22 +21,42 @@ COLUMN_JP = 8
 COLUMN_OTHER = 9
 COLUMN_GLOBAL = 10
 
-data = read_file(FILENAME)
-non_empty_data = remove_missing_data(data)
-converted_type_data = convert_str_to_float(non_empty_data, COLUMN_RANK, COLUMN_YEAR, COLUMN_NA,
-                                           COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL)
-cleaned_data = remove_games_before_year(converted_type_data)
 
-def main():
-    genre_list = find_genres(cleaned_data)
-    game_numbers_in_each_genre = get_genre_sizes(cleaned_data, genre_list)
+def print_conclusion(non_empty_data, cleaned_data, rows_in_file, genre_stats=None):
+    """
+    Does:
+        Prints the conclusion: how many games were cleaned out, how many are
+        in each genre, and the absolute, relative and average sales of each
+        genre in each region
+
+    Parameters:
+      •non_empty_data (GameTable or list)
+          •the games that weren't missing any values
+      •cleaned_data (GameTable or list)
+          •the games released in or after 2013
+      •rows_in_file (int)
+          •how many games were in the file to begin with
+      •genre_stats (dict, optional)
+          •the result of aggregate.group_by_genre(cleaned_data), if it has
+          already been worked out
+
+    Returns:
+        None; it just prints
+    """
+    # every genre's counts and sales, from one pass over the data
+    if genre_stats is None:
+        genre_stats = group_by_genre(cleaned_data)
+
+    genre_list = find_genres(cleaned_data, genre_stats)
+    game_numbers_in_each_genre = get_genre_sizes(cleaned_data, genre_list, genre_stats)
     regions_to_cols = {"NA": COLUMN_NA, "EU": COLUMN_EU, "JP": COLUMN_JP, "Other": COLUMN_OTHER}
-    regional_averages = get_all_genre_averages_by_region(cleaned_data, regions_to_cols, genre_list, COLUMN_GENRE)
-    regional_totals = calc_region_totals(cleaned_data, ["NA", "EU", "JP", "Other"])
+    regional_averages = get_all_genre_averages_by_region(cleaned_data, regions_to_cols, genre_list, COLUMN_GENRE,
+                                                         genre_stats)
+    regional_totals = calc_region_totals(cleaned_data, ["NA", "EU", "JP", "Other"], genre_stats)
 
     # printing numbers of games in the data set at the start, once a few flawed items were removed,
     # and once our studied range was cut down to size
-    print('There were', count_total_games(data), 'games in the original data set')
+    print('There were', rows_in_file, 'games in the original data set')
     print("Of which", count_total_games(non_empty_data), "were not missing any values \n")
     print('But after the games released before 2013 were removed, there were just', count_total_games(cleaned_data),
           'games left.')
@@ -58,14 +79,9 @@ def main():
 
 
 
-    # creating a set of the relative sales (the heatmap did this in its own function,
-    # but it didn't save that version so it must be called again)
-    relative_sales_by_region = calculate_relative_portions(regional_totals, "total_sales")
-
-    # going through and rounding all their values for readability
-    for region, genre_nums in relative_sales_by_region.items():
-        for genre, numbers in genre_nums.items():
-            relative_sales_by_region[region][genre] = round(numbers, 3)
+    # the relative sales, worked out and rounded for readability as one array
+    shares, regions, genres = relative_portions_matrix(regional_totals, "total_sales")
+    relative_sales_by_region = matrix_to_dict(shares.round(3), regions, genres)
 
     print("Relative sales by genre by region")
     print("-" * 60)
@@ -76,4 +92,12 @@ def main():
     print("Average sales of a single game in a genre in each region")
     print("-" * 60)
     print_regional_values(regional_averages, genre_list)
-main()
\ No newline at end of file
+
+
+def main():
+    non_empty_data, cleaned_data, rows_in_file = load_cleaned_data(FILENAME)
+    print_conclusion(non_empty_data, cleaned_data, rows_in_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import json
+
+from gametable import COLUMN_YEAR, COLUMN_GENRE, COLUMN_PLATFORM, COLUMN_PUBLISHER, SALES_COLUMNS
+from aggregate import running_totals, totals_to_stats
+
+# the dimensions the cube is split along, in the order they're kept in each
+# cell's key, and the column each one comes from
+DIMENSIONS = ("year", "genre", "platform", "publisher")
+DIMENSION_COLUMNS = {"year": COLUMN_YEAR, "genre": COLUMN_GENRE,
+                     "platform": COLUMN_PLATFORM, "publisher": COLUMN_PUBLISHER}
+
+
+def _merge(cells, key, cell):
+    # adds one cell's numbers into another dict of cells
+    count, sums, mins, maxes = cell
+    running = cells.get(key)
+    if running is None:
+        cells[key] = [count, list(sums), list(mins), list(maxes)]
+        return
+
+    running[0] += count
+    for i in range(len(sums)):
+        running[1][i] += sums[i]
+        if mins[i] < running[2][i]:
+            running[2][i] = mins[i]
+        if maxes[i] > running[3][i]:
+            running[3][i] = maxes[i]
+
+
+def _check_dimensions(dimensions):
+    for dimension in dimensions:
+        if dimension not in DIMENSION_COLUMNS:
+            raise ValueError("unknown dimension {!r} (expected one of {})".format(dimension, DIMENSIONS))
+
+
+class SalesCube:
+    """
+    Does:
+        Keeps the count, sum, min and max of every sales column for each
+        combination of year, genre, platform and publisher that has games,
+        worked out in one pass. Any of the genre/region questions can then be
+        answered by adding up cells instead of going through every game again,
+        e.g.
+
+            cube = SalesCube.build(non_empty_data)
+            genre_stats = cube.genre_stats()          # 2013 onwards
+            calc_region_totals(None, ["NA", "EU", "JP", "Other"], genre_stats)
+            cube.roll_up("platform", year=(2014, 2016), genre="Role-Playing")
+
+        Since there are far fewer cells than games (and the cube can be saved
+        and loaded), this is a lot cheaper than the scans once it's built
+
+    Attributes:
+        •cells (dict)
+            •(year, genre, platform, publisher) : [count, sums, mins, maxes],
+            where each of sums, mins and maxes is a list in the order of
+            SALES_COLUMNS
+            •in the order each combination first shows up in the data
+    """
+
+    def __init__(self, cells=None):
+        self.cells = cells if cells is not None else {}
+        # the rolled up copies of the cells, see _view
+        self._views = {}
+
+    @classmethod
+    def build(cls, data):
+        """
+        Does:
+            Builds the cube from the games
+
+        Parameters:
+            •data
+                •2D list of converted rows, a GameTable, or any iterable of
+                rows (normally the non-empty data, so every year is in it)
+
+        Returns:
+            SalesCube
+        """
+        key = tuple(DIMENSION_COLUMNS[dimension] for dimension in DIMENSIONS)
+        return cls(running_totals(data, key, SALES_COLUMNS))
+
+    def __len__(self):
+        return len(self.cells)
+
+    def _view(self, dimensions):
+        """
+        Does:
+            Gets the cells added up along every dimension that isn't needed,
+            so a question about genres and years only has to go through the
+            (much fewer) year/genre cells. Each view is only worked out once
+
+        Parameters:
+            •dimensions (tuple of str)
+                •the dimensions to keep, in the same order as DIMENSIONS
+
+        Returns:
+            dict of the kept dimensions' values : [count, sums, mins, maxes]
+        """
+        if dimensions == DIMENSIONS:
+            return self.cells
+
+        view = self._views.get(dimensions)
+        if view is None:
+            positions = [DIMENSIONS.index(dimension) for dimension in dimensions]
+            view = {}
+            for key, cell in self.cells.items():
+                _merge(view, tuple(key[position] for position in positions), cell)
+            self._views[dimensions] = view
+        return view
+
+    def _matching_cells(self, dimensions, conditions):
+        """
+        Does:
+            Goes through the cells of a view that match slicing conditions
+
+        Parameters:
+            •dimensions (tuple of str)
+                •the view's dimensions (which have to include every
+                dimension in the conditions)
+            •conditions (dict)
+                •dimension : what to keep. A year can be one year or a
+                (first, last) range where either end can be None; the others
+                can be one value or a collection of values
+
+        Returns:
+            generator of (key, cell) pairs
+        """
+        checks = []
+        for dimension, wanted in conditions.items():
+            position = dimensions.index(dimension)
+            if dimension == "year" and isinstance(wanted, tuple):
+                first, last = wanted
+                checks.append((position, lambda year, first=first, last=last:
+                               (first is None or year >= first) and (last is None or year <= last)))
+            elif isinstance(wanted, (str, int)):
+                checks.append((position, lambda value, wanted=wanted: value == wanted))
+            else:
+                checks.append((position, lambda value, wanted=set(wanted): value in wanted))
+
+        for key, cell in self._view(dimensions).items():
+            if all(test(key[position]) for position, test in checks):
+                yield key, cell
+
+    def slice(self, **conditions):
+        """
+        Does:
+            Makes a smaller cube with only the cells that match the conditions
+            (see roll_up for how they're given)
+
+        Returns:
+            SalesCube
+        """
+        _check_dimensions(conditions)
+        return SalesCube(dict(self._matching_cells(DIMENSIONS, conditions)))
+
+    def roll_up(self, dimensions=None, **conditions):
+        """
+        Does:
+            Adds the cells up along every dimension that isn't kept, after
+            leaving out the cells that don't match the conditions
+
+        Parameters:
+            •dimensions
+                •None to add everything into one group, one dimension name
+                (like "genre"), or a tuple of them
+            •conditions
+                •year=2015 or year=(2013, None) for a range, and
+                genre/platform/publisher as one value or a collection
+
+        Returns:
+            dict in the same format as aggregate.group_by: group key :
+            {"count", "sum", "mean", "min", "max"} (each of the last four a
+            dict of sales column : number), in the order the groups first show
+            up in the data
+        """
+        if dimensions is None:
+            kept = ()
+        elif isinstance(dimensions, str):
+            kept = (dimensions,)
+        else:
+            kept = tuple(dimensions)
+        _check_dimensions(kept)
+        _check_dimensions(conditions)
+
+        # only the dimensions that are kept or sliced on are needed
+        needed = tuple(dimension for dimension in DIMENSIONS if dimension in kept or dimension in conditions)
+        positions = [needed.index(dimension) for dimension in kept]
+
+        if dimensions is None:
+            key_of = lambda key: None
+        elif isinstance(dimensions, str):
+            key_of = lambda key: key[positions[0]]
+        else:
+            key_of = lambda key: tuple(key[position] for position in positions)
+
+        groups = {}
+        for key, cell in self._matching_cells(needed, conditions):
+            _merge(groups, key_of(key), cell)
+
+        return totals_to_stats(groups, SALES_COLUMNS)
+
+    def genre_stats(self, first_year=2013, last_year=None, **conditions):
+        """
+        Does:
+            Gives the same thing as aggregate.group_by_genre for the games in
+            a range of years, which is what calc_region_totals, find_genres,
+            get_genre_sizes, get_genre_total_sales,
+            get_all_genre_averages_by_region and
+            calculate_sales_by_genre_region take as their genre_stats
+
+        Parameters:
+            •first_year, last_year (int or None)
+                •the years to include (2013 onwards by default, like
+                remove_games_before_year)
+            •conditions
+                •any other slicing, like platform="PS4"
+
+        Returns:
+            dict of genre : {"count", "sum", "mean", "min", "max"}
+        """
+        return self.roll_up("genre", year=(first_year, last_year), **conditions)
+
+    def to_dict(self):
+        """
+        Does:
+            Turns the cube into plain lists that can be saved as JSON
+
+        Returns:
+            dict
+        """
+        return {"dimensions": list(DIMENSIONS), "sales_columns": list(SALES_COLUMNS),
+                "cells": [[list(key), count, sums, mins, maxes]
+                          for key, (count, sums, mins, maxes) in self.cells.items()]}
+
+    @classmethod
+    def from_dict(cls, saved):
+        """
+        Does:
+            Rebuilds the cube from what to_dict gave
+
+        Parameters:
+            •saved (dict)
+
+        Returns:
+            SalesCube
+        """
+        if saved.get("dimensions") != list(DIMENSIONS) or saved.get("sales_columns") != list(SALES_COLUMNS):
+            raise ValueError("the saved cube has different dimensions or sales columns")
+        return cls({tuple(key): [count, sums, mins, maxes] for key, count, sums, mins, maxes in saved["cells"]})
+
+    def save(self, filename):
+        """
+        Does:
+            Writes the cube to a JSON file
+
+        Parameters:
+            •filename (str)
+
+        Returns:
+            None
+        """
+        with open(filename, "w") as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Does:
+            Reads a cube saved with save
+
+        Parameters:
+            •filename (str)
+
+        Returns:
+            SalesCube
+        """
+        with open(filename) as file:
+            return cls.from_dict(json.load(file))
@@ -0,0 +1,347 @@
+from array import array
+
+# the column positions are the same ones the rest of the project uses for the
+# 2d lists, so a row pulled out of the table lines up with the old format
+COLUMN_RANK = 0
+COLUMN_NAME = 1
+COLUMN_PLATFORM = 2
+COLUMN_YEAR = 3
+COLUMN_GENRE = 4
+COLUMN_PUBLISHER = 5
+COLUMN_NA = 6
+COLUMN_EU = 7
+COLUMN_JP = 8
+COLUMN_OTHER = 9
+COLUMN_GLOBAL = 10
+
+NUM_COLUMNS = 11
+
+# which typecode each column is stored with
+#   •'i' is a 32 bit int (rank, year, and the category codes)
+#   •'q' is a 64 bit int (sales, which are stored in single units)
+COLUMN_TYPES = {COLUMN_RANK: "i", COLUMN_NAME: "i", COLUMN_PLATFORM: "i",
+                COLUMN_YEAR: "i", COLUMN_GENRE: "i", COLUMN_PUBLISHER: "i",
+                COLUMN_NA: "q", COLUMN_EU: "q", COLUMN_JP: "q",
+                COLUMN_OTHER: "q", COLUMN_GLOBAL: "q"}
+
+# the columns that are stored as codes into a vocabulary instead of strings
+#   •even the names repeat a lot (the same game on several platforms), so
+#    they're stored this way too
+CATEGORY_COLUMNS = (COLUMN_NAME, COLUMN_PLATFORM, COLUMN_GENRE, COLUMN_PUBLISHER)
+
+# the sales columns, in the order they appear in the file
+SALES_COLUMNS = (COLUMN_NA, COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL)
+
+
+class GameTable:
+    """
+    Does:
+        Stores the games dataset column by column instead of as a list of
+        lists. Every numeric column is one typed array, and name, platform,
+        genre and publisher are stored as small integer codes that point into
+        a shared list of the distinct values (the "vocabulary"), so each
+        string is only kept once and comparing or grouping them compares ints
+
+        Iterating over the table or indexing it still gives back rows in the
+        same format as the converted 2d list, so older code keeps working,
+        but the analysis functions can loop straight over the columns
+
+    Attributes:
+        •columns (list)
+            •one typed array per column, in the usual column order (the
+            category columns hold codes)
+        •vocabularies (dict)
+            •column index : list of the distinct strings in that column
+        •missing (bytearray or None)
+            •1 for every row that had an 'N/A' somewhere in the file, or
+            None if no row did
+    """
+
+    def __init__(self, vocabularies=None, _codes=None):
+        self.columns = [array(COLUMN_TYPES[col]) for col in range(NUM_COLUMNS)]
+
+        # the vocabularies can be handed down from another table so that
+        # filtered copies keep the same codes as the table they came from
+        if vocabularies is None:
+            vocabularies = {col: [] for col in CATEGORY_COLUMNS}
+        self.vocabularies = vocabularies
+
+        # reverse lookups (string -> code) for when new rows are added
+        #   •a table made with take() shares these too, since the name
+        #    vocabulary can be big enough that rebuilding it would cost more
+        #    than the filtering itself
+        if _codes is None:
+            _codes = {col: {value: code for code, value in enumerate(vocab)}
+                      for col, vocab in vocabularies.items()}
+        self._codes = _codes
+
+        self.missing = None
+
+    def encode(self, col, value):
+        """
+        Does:
+            Gets the code of a category value, adding it to the vocabulary
+            if it hasn't been seen before
+
+        Parameters:
+            •col (int)
+                •index of a category column
+            •value (str)
+                •the string to encode
+
+        Returns:
+            int code of the value
+        """
+        codes = self._codes[col]
+        code = codes.get(value)
+        if code is None:
+            code = len(self.vocabularies[col])
+            self.vocabularies[col].append(value)
+            codes[value] = code
+        return code
+
+    def lookup_code(self, col, value):
+        """
+        Does:
+            Gets the code of a category value without adding anything
+
+        Parameters:
+            •col (int)
+                •index of a category column
+            •value (str)
+
+        Returns:
+            int code, or None if the value isn't in the vocabulary
+        """
+        return self._codes[col].get(value)
+
+    def _writable_columns(self):
+        # a table loaded from the cache has its columns straight from the
+        # memory mapped file (read-only memoryviews), so they're copied into
+        # arrays the first time anything is added
+        columns = self.columns
+        for col in range(NUM_COLUMNS):
+            if isinstance(columns[col], memoryview):
+                copy = array(COLUMN_TYPES[col])
+                copy.frombytes(columns[col].cast("B"))
+                columns[col] = copy
+        return columns
+
+    def append(self, row, missing=False):
+        """
+        Does:
+            Adds one already converted game (rank, year and sales as ints)
+            to the end of the table
+
+        Parameters:
+            •row (list)
+                •a game in the converted 2d list format
+            •missing (bool)
+                •whether the game had 'N/A' values in the original file
+
+        Returns:
+            None
+        """
+        columns = self._writable_columns()
+        for col in range(NUM_COLUMNS):
+            if col in self._codes:
+                columns[col].append(self.encode(col, row[col]))
+            else:
+                columns[col].append(row[col])
+
+        # the mask is only created once there's actually something to mark
+        if missing and self.missing is None:
+            self.missing = bytearray(len(self) - 1)
+        if self.missing is not None:
+            self.missing.append(1 if missing else 0)
+
+    def append_columns(self, columns, missing=None):
+        """
+        Does:
+            Adds several already converted games at once, given column by
+            column (which is a lot quicker than appending them one at a time)
+
+        Parameters:
+            •columns (list)
+                •one list per column, all the same length, with strings in
+                the category columns
+            •missing (list of bool or None)
+                •whether each game had 'N/A' values, or None if none did
+
+        Returns:
+            None
+        """
+        rows_before = len(self)
+        self._writable_columns()
+
+        for col in range(NUM_COLUMNS):
+            if col in self._codes:
+                codes = self._codes[col]
+                encode = self.encode
+                # the usual case is a value that's been seen before
+                self.columns[col].extend(array("i", [codes[value] if value in codes else encode(col, value)
+                                                     for value in columns[col]]))
+            else:
+                self.columns[col].extend(array(COLUMN_TYPES[col], columns[col]))
+
+        if missing is not None and any(missing):
+            if self.missing is None:
+                self.missing = bytearray(rows_before)
+            self.missing.extend(bytes(missing))
+        elif self.missing is not None:
+            self.missing.extend(bytearray(len(self) - rows_before))
+
+    def __len__(self):
+        return len(self.columns[COLUMN_RANK])
+
+    def value(self, row_id, col):
+        """
+        Does:
+            Gets a single cell, decoding category codes back into strings
+
+        Parameters:
+            •row_id (int)
+                •position of the game in the table
+            •col (int)
+                •column index
+
+        Returns:
+            the value in that cell
+        """
+        cell = self.columns[col][row_id]
+        if col in self.vocabularies:
+            return self.vocabularies[col][cell]
+        return cell
+
+    def __getitem__(self, row_id):
+        return [self.value(row_id, col) for col in range(NUM_COLUMNS)]
+
+    def __iter__(self):
+        # decoding each category column once up front is a lot cheaper than
+        # looking up every cell separately
+        decoded = []
+        for col in range(NUM_COLUMNS):
+            if col in self.vocabularies:
+                vocab = self.vocabularies[col]
+                decoded.append([vocab[code] for code in self.columns[col]])
+            else:
+                decoded.append(self.columns[col])
+
+        for row in zip(*decoded):
+            yield list(row)
+
+    def to_rows(self):
+        """
+        Does:
+            Turns the table back into the converted 2d list format
+
+        Returns:
+            list of lists, one per game
+        """
+        return list(self)
+
+    def decoded(self, col):
+        """
+        Does:
+            Gets a whole column as plain values, decoding it if it's one of
+            the category columns
+
+        Parameters:
+            •col (int)
+                •column index
+
+        Returns:
+            list (or array) of the column's values
+        """
+        if col in self.vocabularies:
+            vocab = self.vocabularies[col]
+            return [vocab[code] for code in self.columns[col]]
+        return self.columns[col]
+
+    def take(self, row_ids):
+        """
+        Does:
+            Makes a new table out of only the given rows, sharing this
+            table's vocabularies so the codes mean the same thing in both
+
+        Parameters:
+            •row_ids (iterable of ints)
+                •positions of the rows to keep, in the order to keep them
+
+        Returns:
+            new GameTable
+        """
+        if not isinstance(row_ids, (list, array, range)):
+            row_ids = list(row_ids)
+
+        result = GameTable(self.vocabularies, self._codes)
+        for col in range(NUM_COLUMNS):
+            source = self.columns[col]
+            # a column that was never read (see columnar.read_table) stays that way
+            if source is None:
+                result.columns[col] = None
+                continue
+            result.columns[col] = array(COLUMN_TYPES[col], [source[i] for i in row_ids])
+
+        if self.missing is not None:
+            kept_mask = bytearray(self.missing[i] for i in row_ids)
+            # no point keeping a mask with nothing marked in it
+            if any(kept_mask):
+                result.missing = kept_mask
+
+        return result
+
+    def extend(self, other):
+        """
+        Does:
+            Adds every row of another table to the end of this one. The other
+            table's category codes are translated into this table's codes
+            (adding any values this table hasn't seen to its vocabularies)
+
+        Parameters:
+            •other (GameTable)
+
+        Returns:
+            None
+        """
+        rows_before = len(self)
+        self._writable_columns()
+
+        for col in range(NUM_COLUMNS):
+            if col in self._codes:
+                # working out what each of the other table's codes becomes here
+                translation = [self.encode(col, value) for value in other.vocabularies[col]]
+                self.columns[col].extend(array("i", [translation[code] for code in other.columns[col]]))
+            else:
+                self.columns[col].extend(other.columns[col])
+
+        # the missing marks have to line up with the rows they belong to
+        if other.missing is not None:
+            if self.missing is None:
+                self.missing = bytearray(rows_before)
+            self.missing.extend(other.missing)
+        elif self.missing is not None:
+            self.missing.extend(bytearray(len(other)))
+
+    def nbytes(self):
+        """
+        Does:
+            Roughly measures how much memory the table's columns take up
+
+        Returns:
+            int number of bytes
+        """
+        total = 0
+        for column in self.columns:
+            total += column.itemsize * len(column)
+
+        # each distinct string once (a list slot plus the string itself)
+        for vocab in self.vocabularies.values():
+            total += sum(8 + len(value) + 49 for value in vocab)
+        if self.missing is not None:
+            total += len(self.missing)
+
+        return total
+
+    def __repr__(self):
+        return "GameTable({} games)".format(len(self))
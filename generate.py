@@ -0,0 +1,267 @@
+"""
+Writes made up games in the same format as vgsales.csv, for testing the
+cleaning and analysis at sizes much bigger than the real file
+
+    python generate.py 1000000 synthetic.csv
+    python generate.py 100000000 big.csv --seed 7 --year-na-rate 0.05
+
+The same seed and settings always give the same file. Rows are written as
+they're made, so the size of the file isn't limited by memory
+"""
+import argparse
+import csv
+import math
+import random
+
+HEADER = ["Rank", "Name", "Platform", "Year", "Genre", "Publisher",
+          "NA_Sales", "EU_Sales", "JP_Sales", "Other_Sales", "Global_Sales"]
+
+# the platforms, roughly as common as they are in vgsales.csv
+#   •(name, first year, most common year, last year, how many games,
+#    share of sales in (NA, EU, JP, Other))
+PLATFORMS = [
+    ("DS", 2004, 2008, 2013, 2163, (0.48, 0.24, 0.21, 0.07)),
+    ("PS2", 2000, 2005, 2011, 2161, (0.46, 0.27, 0.11, 0.16)),
+    ("PS3", 2006, 2011, 2016, 1329, (0.42, 0.36, 0.07, 0.15)),
+    ("Wii", 2006, 2009, 2014, 1325, (0.55, 0.30, 0.07, 0.08)),
+    ("X360", 2005, 2010, 2016, 1265, (0.61, 0.29, 0.01, 0.09)),
+    ("PSP", 2004, 2009, 2015, 1213, (0.37, 0.27, 0.26, 0.10)),
+    ("PS", 1994, 1998, 2003, 1196, (0.46, 0.29, 0.19, 0.06)),
+    ("PC", 1992, 2009, 2016, 960, (0.36, 0.54, 0.00, 0.10)),
+    ("XB", 2000, 2004, 2008, 824, (0.73, 0.23, 0.00, 0.04)),
+    ("GBA", 2000, 2003, 2007, 822, (0.60, 0.24, 0.14, 0.02)),
+    ("GC", 2001, 2003, 2007, 556, (0.67, 0.19, 0.11, 0.03)),
+    ("3DS", 2011, 2013, 2016, 509, (0.32, 0.24, 0.39, 0.05)),
+    ("PSV", 2011, 2014, 2016, 413, (0.26, 0.26, 0.34, 0.14)),
+    ("PS4", 2013, 2015, 2016, 336, (0.34, 0.45, 0.05, 0.16)),
+    ("N64", 1996, 1999, 2002, 319, (0.63, 0.19, 0.16, 0.02)),
+    ("SNES", 1990, 1994, 1999, 239, (0.31, 0.10, 0.58, 0.01)),
+    ("XOne", 2013, 2015, 2016, 213, (0.64, 0.29, 0.00, 0.07)),
+    ("SAT", 1994, 1996, 1999, 173, (0.02, 0.02, 0.96, 0.00)),
+    ("WiiU", 2012, 2013, 2016, 143, (0.47, 0.30, 0.16, 0.07)),
+    ("2600", 1980, 1982, 1989, 133, (0.92, 0.06, 0.00, 0.02)),
+    ("NES", 1983, 1987, 1994, 98, (0.50, 0.10, 0.39, 0.01)),
+    ("GB", 1988, 1997, 2001, 98, (0.45, 0.19, 0.31, 0.05)),
+    ("DC", 1998, 2000, 2002, 52, (0.34, 0.12, 0.52, 0.02)),
+    ("GEN", 1990, 1993, 1994, 27, (0.69, 0.21, 0.08, 0.02)),
+]
+
+# the genres and how many games each has in vgsales.csv
+GENRES = [("Action", 3316), ("Sports", 2346), ("Misc", 1739), ("Role-Playing", 1488),
+          ("Shooter", 1310), ("Adventure", 1286), ("Racing", 1249), ("Platform", 886),
+          ("Simulation", 867), ("Fighting", 848), ("Strategy", 681), ("Puzzle", 582)]
+
+# the biggest publishers and how many games each has in vgsales.csv
+PUBLISHERS = [("Electronic Arts", 1351), ("Activision", 975), ("Namco Bandai Games", 932),
+              ("Ubisoft", 921), ("Konami Digital Entertainment", 832), ("THQ", 715),
+              ("Nintendo", 703), ("Sony Computer Entertainment", 683), ("Sega", 639),
+              ("Take-Two Interactive", 413), ("Capcom", 381), ("Atari", 363), ("Tecmo Koei", 338),
+              ("Square Enix", 233), ("Warner Bros. Interactive Entertainment", 232),
+              ("Disney Interactive Studios", 218), ("Unknown", 203), ("Eidos Interactive", 198),
+              ("Midway Games", 198), ("505 Games", 192), ("Microsoft Game Studios", 189),
+              ("Acclaim Entertainment", 184), ("D3Publisher", 184), ("Vivendi Games", 164),
+              ("Codemasters", 152)]
+
+# the rest of the publishers are made up, each with fewer games than the last
+#   •about a fifth of the games in vgsales.csv are from the ~550 smaller ones
+SMALL_PUBLISHERS = 550
+SMALL_PUBLISHER_GAMES = 3800
+
+# global sales (in millions) follow a log-normal curve like the real ones:
+# half of the games sell under 170,000 and a few sell tens of millions
+SALES_MEDIAN = 0.17
+SALES_SIGMA = 1.5
+
+# how much each game's regional split can differ from its platform's usual
+# split (smaller means more spread out)
+REGION_CONCENTRATION = 2.0
+
+# how many platforms a game comes out on, and how often (in vgsales.csv
+# most games are on one platform)
+PLATFORM_COUNTS = [(1, 8718), (2, 1502), (3, 710), (4, 283), (5, 142), (6, 88)]
+
+# words the game names are made from
+ADJECTIVES = ["Super", "Dark", "Crimson", "Final", "Eternal", "Mega", "Lost", "Wild", "Iron",
+              "Shadow", "Cosmic", "Royal", "Neon", "Ancient", "Turbo", "Silent", "Frozen",
+              "Golden", "Savage", "Hidden", "Brave", "Mystic", "Rapid", "Grand"]
+NOUNS = ["Legends", "Quest", "Racers", "Kingdom", "Warriors", "Islands", "Tactics", "Saga",
+         "Heroes", "Galaxy", "Arena", "Chronicles", "Knights", "Dungeon", "Empire", "Rally",
+         "Party", "Frontier", "Odyssey", "League", "Hunters", "Academy", "Strike", "Dynasty"]
+
+# how many rows are written at a time
+BATCH_SIZE = 10000
+
+
+def _cumulative(weights):
+    # running totals, for random.choices(cum_weights=...)
+    totals = []
+    total = 0
+    for weight in weights:
+        total += weight
+        totals.append(total)
+    return totals
+
+
+class Generator:
+    """
+    Does:
+        Makes up games one at a time. Each game picks a genre and publisher,
+        a platform and a year that platform was around in, and global sales
+        from a heavily skewed curve that get split between the regions the
+        way that platform's games usually were. Some games come out on more
+        than one platform in the same year, like in the real data
+
+    Attributes:
+        •year_na_rate, publisher_na_rate, sales_na_rate (float)
+            •the chance of each of those fields being written as 'N/A'
+    """
+
+    def __init__(self, seed=0, year_na_rate=0.016, publisher_na_rate=0.0035, sales_na_rate=0.0):
+        self.random = random.Random(seed)
+        self.year_na_rate = year_na_rate
+        self.publisher_na_rate = publisher_na_rate
+        self.sales_na_rate = sales_na_rate
+
+        self._platform_weights = _cumulative(platform[4] for platform in PLATFORMS)
+        self._genres = [genre for genre, count in GENRES]
+        self._genre_weights = _cumulative(count for genre, count in GENRES)
+
+        small = ["Publisher {}".format(i + 1) for i in range(SMALL_PUBLISHERS)]
+        small_weights = [1 / (i + 1) for i in range(SMALL_PUBLISHERS)]
+        scale = SMALL_PUBLISHER_GAMES / sum(small_weights)
+        self._publishers = [publisher for publisher, count in PUBLISHERS] + small
+        self._publisher_weights = _cumulative([count for publisher, count in PUBLISHERS] +
+                                              [weight * scale for weight in small_weights])
+
+        self._platform_counts = [count for count, games in PLATFORM_COUNTS]
+        self._platform_count_weights = _cumulative(games for count, games in PLATFORM_COUNTS)
+
+        # the platforms that were around in each year, for the extra platforms
+        # a game comes out on
+        self._platforms_by_year = {}
+
+        self._titles = 0
+
+    def _name(self):
+        # every title gets its own name; once the word pairs run out they
+        # come back around as sequels
+        pairs = len(ADJECTIVES) * len(NOUNS)
+        title = self._titles
+        self._titles += 1
+
+        name = "{} {}".format(ADJECTIVES[title % len(ADJECTIVES)], NOUNS[(title // len(ADJECTIVES)) % len(NOUNS)])
+        if title >= pairs:
+            name += " {}".format(title // pairs + 1)
+        return name
+
+    def _platforms_in(self, year):
+        if year not in self._platforms_by_year:
+            platforms = [platform for platform in PLATFORMS if platform[1] <= year <= platform[3]]
+            self._platforms_by_year[year] = (platforms, _cumulative(platform[4] for platform in platforms))
+        return self._platforms_by_year[year]
+
+    def _sales(self, shares):
+        # a log-normal global figure split by a random mix around the
+        # platform's usual shares (gamma draws make a dirichlet mix)
+        rng = self.random
+        total = rng.lognormvariate(math.log(SALES_MEDIAN), SALES_SIGMA)
+        parts = [rng.gammavariate(share * REGION_CONCENTRATION, 1) if share > 0 else 0.0 for share in shares]
+        parts_total = sum(parts) or 1.0
+
+        regions = [round(total * part / parts_total, 2) for part in parts]
+        sales = ["{:.2f}".format(value) for value in regions]
+        sales.append("{:.2f}".format(sum(regions)))
+
+        if self.sales_na_rate:
+            sales = ['N/A' if rng.random() < self.sales_na_rate else value for value in sales]
+        return sales
+
+    def titles(self):
+        """
+        Does:
+            Makes up games forever, one title (on one or more platforms) at
+            a time
+
+        Returns:
+            generator of rows (lists of strings without the rank)
+        """
+        rng = self.random
+        while True:
+            name = self._name()
+            genre = rng.choices(self._genres, cum_weights=self._genre_weights)[0]
+            publisher = rng.choices(self._publishers, cum_weights=self._publisher_weights)[0]
+
+            platform = rng.choices(PLATFORMS, cum_weights=self._platform_weights)[0]
+            year = int(rng.triangular(platform[1], platform[3] + 1, platform[2]))
+            year = min(year, platform[3])
+
+            # any other platforms it comes out on that year
+            platforms = [platform]
+            count = rng.choices(self._platform_counts, cum_weights=self._platform_count_weights)[0]
+            if count > 1:
+                available, weights = self._platforms_in(year)
+                for i in range(count * 2):
+                    if len(platforms) == count or len(platforms) == len(available):
+                        break
+                    other = rng.choices(available, cum_weights=weights)[0]
+                    if other not in platforms:
+                        platforms.append(other)
+
+            for platform in platforms:
+                row_year = 'N/A' if rng.random() < self.year_na_rate else str(year)
+                row_publisher = 'N/A' if rng.random() < self.publisher_na_rate else publisher
+                yield [name, platform[0], row_year, genre, row_publisher] + self._sales(platform[5])
+
+
+def write_csv(filename, rows, seed=0, year_na_rate=0.016, publisher_na_rate=0.0035, sales_na_rate=0.0):
+    """
+    Does:
+        Writes a CSV of made up games with the same header as vgsales.csv.
+        The ranks just count up (the real file is sorted by sales, which
+        would need every row in memory first)
+
+    Parameters:
+        •filename (str)
+        •rows (int)
+            •how many games to write
+        •seed (int)
+        •year_na_rate, publisher_na_rate, sales_na_rate (float)
+            •the chance of each of those fields being 'N/A'
+
+    Returns:
+        None
+    """
+    generator = Generator(seed, year_na_rate, publisher_na_rate, sales_na_rate)
+    games = generator.titles()
+
+    with open(filename, "w", newline="") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(HEADER)
+
+        written = 0
+        while written < rows:
+            batch = []
+            for rank in range(written + 1, min(written + BATCH_SIZE, rows) + 1):
+                batch.append([str(rank)] + next(games))
+            writer.writerows(batch)
+            written += len(batch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a CSV of made up games in the vgsales.csv format")
+    parser.add_argument("rows", type=int, help="how many games to write")
+    parser.add_argument("output", help="the CSV file to write")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    parser.add_argument("--year-na-rate", type=float, default=0.016,
+                        help="chance of a year being N/A (default: %(default)s)")
+    parser.add_argument("--publisher-na-rate", type=float, default=0.0035,
+                        help="chance of a publisher being N/A (default: %(default)s)")
+    parser.add_argument("--sales-na-rate", type=float, default=0.0,
+                        help="chance of each sales figure being N/A (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    write_csv(args.output, args.rows, args.seed, args.year_na_rate, args.publisher_na_rate, args.sales_na_rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
-from clean import read_file, remove_missing_data, convert_str_to_float, remove_games_before_year
+from clean import load_cleaned_data
 from analysis import calc_region_totals, find_genres
-import plotly.express as px
+from aggregate import group_by_genre
+from instrument import profiled
+from memo import memoized
 
 FILENAME = "vgsales.csv"
 NA = 'NA_Sales'
@@ -18,13 +20,141 @@ COLUMN_JP = 8
 COLUMN_OTHER = 9
 COLUMN_GLOBAL = 10
 
-def calculate_relative_portions(data, total_col):
+def sales_matrix(data, total_col=None, row_labels=None, col_labels=None):
     """
     Does:
-        Takes a series of sales numbers by genre in each region, and finds
-        the proportion of the total region's sale that that number
-        represents. Those values are then returned in a new dict, each still
-        associated with their own regions and genres like before
+        Turns a 2D dictionary of sales (like calc_region_totals gives) into
+        a 2D array, along with the labels of its rows and columns
+
+    Parameters:
+      •data (dict)
+          •outer keys are the rows (e.g. regions), inner keys the columns
+          (e.g. genres)
+      •total_col (str, optional)
+          •an inner key to leave out, like "total_sales"
+      •row_labels, col_labels (lists, optional)
+          •the rows and columns to use, in order; by default every key, in
+          the order they first show up
+          •anything missing from the data is 0
+
+    Returns:
+        tuple of the 2D numpy array, the row labels and the column labels
+    """
+    # numpy comes with plotly and matplotlib, and is only loaded when needed
+    import numpy as np
+
+    if row_labels is None:
+        row_labels = list(data)
+    if col_labels is None:
+        col_labels = list(dict.fromkeys(col for row in data.values() for col in row if col != total_col))
+
+    matrix = np.array([[data.get(row, {}).get(col, 0) for col in col_labels] for row in row_labels],
+                      dtype=float).reshape(len(row_labels), len(col_labels))
+    return matrix, row_labels, col_labels
+
+
+def group_matrix(groups, value_col):
+    """
+    Does:
+        Turns group-by results keyed by pairs (like
+        group_by(data, (COLUMN_PUBLISHER, COLUMN_PLATFORM), ...) or
+        SalesCube.roll_up(("publisher", "platform"))) into a 2D array of one
+        column's sums, with the first part of each key as the rows and the
+        second as the columns
+
+    Parameters:
+      •groups (dict)
+          •(row, column) : group statistics
+      •value_col (int)
+          •the sales column to use the sums of
+
+    Returns:
+        tuple of the 2D numpy array, the row labels and the column labels
+    """
+    import numpy as np
+
+    row_index = {}
+    col_index = {}
+    rows, cols, values = [], [], []
+    for (row, col), stats in groups.items():
+        rows.append(row_index.setdefault(row, len(row_index)))
+        cols.append(col_index.setdefault(col, len(col_index)))
+        values.append(stats["sum"][value_col])
+
+    # every value goes into its place in one go
+    matrix = np.zeros((len(row_index), len(col_index)))
+    matrix[rows, cols] = values
+    return matrix, list(row_index), list(col_index)
+
+
+def region_matrix(groups, region_cols):
+    """
+    Does:
+        Turns group-by results (like group_by(data, COLUMN_PUBLISHER,
+        SALES_COLUMNS)) into a 2D array with a row for each group and a
+        column for each region's sales
+
+    Parameters:
+      •groups (dict)
+          •group key : group statistics
+      •region_cols (list of ints)
+          •the sales columns to use, in order
+
+    Returns:
+        tuple of the 2D numpy array and the row labels (the columns are
+        region_cols)
+    """
+    import numpy as np
+
+    matrix = np.array([[stats["sum"][col] for col in region_cols] for stats in groups.values()],
+                      dtype=float).reshape(len(groups), len(region_cols))
+    return matrix, list(groups)
+
+
+def share_matrix(matrix, normalize="row", totals=None):
+    """
+    Does:
+        Works out what portion of its row's (or column's) total every value
+        in a 2D array is, all at once. Rows or columns that add up to 0 get
+        portions of 0
+
+    Parameters:
+      •matrix (2D array)
+      •normalize (str)
+          •"row" to divide by each row's total, or "column" for each
+          column's
+      •totals (1D array, optional)
+          •the totals to divide by instead of adding the values up (one per
+          row or column)
+
+    Returns:
+        2D numpy array of the portions
+    """
+    import numpy as np
+
+    if normalize not in ("row", "column"):
+        raise ValueError("normalize has to be 'row' or 'column', not {!r}".format(normalize))
+
+    matrix = np.asarray(matrix, dtype=float)
+    axis = 1 if normalize == "row" else 0
+
+    if totals is None:
+        totals = matrix.sum(axis=axis, keepdims=True)
+    else:
+        totals = np.asarray(totals, dtype=float)
+        totals = totals.reshape(-1, 1) if axis == 1 else totals.reshape(1, -1)
+
+    shares = np.zeros_like(matrix)
+    np.divide(matrix, totals, out=shares, where=totals != 0)
+    return shares
+
+
+@memoized
+def relative_portions_matrix(data, total_col, row_labels=None, col_labels=None):
+    """
+    Does:
+        Finds the portion of each region's total sales that each genre makes
+        up, as a 2D array (see calculate_relative_portions)
 
     Parameters:
       •data (dict)
@@ -33,79 +163,121 @@ def calculate_relative_portions(data, total_col):
               •Inner keys represent genres and total sales for the region
       •total_col (str)
           •Key representing the total sales count in each region's dictionary
+      •row_labels, col_labels (lists, optional)
+          •the regions and genres to use, in order
 
     Returns:
-        String with total sales of targeted genre in targeted country
+        tuple of the 2D numpy array of portions, the region labels and the
+        genre labels
     """
+    matrix, row_labels, col_labels = sales_matrix(data, total_col, row_labels, col_labels)
+    totals = [data[row][total_col] for row in row_labels]
+    return share_matrix(matrix, "row", totals), row_labels, col_labels
 
-    # creating an empty dict to add values into
-    result_dict = {}
 
-    # going through each of the regions in the data set
-    for region_name, region_data in data.items():
+def matrix_to_dict(matrix, row_labels, col_labels):
+    """
+    Does:
+        Turns a 2D array back into a 2D dictionary (the format
+        print_regional_values takes)
 
-        # creating another dict for the relative sales in a specific region
-        portions_dict = {}
+    Parameters:
+      •matrix (2D array)
+      •row_labels, col_labels (lists)
 
-        # goes through the per-genre sales in that region
-        for genre, sales in region_data.items():
+    Returns:
+        dict of row label : {column label : value}
+    """
+    return {row: dict(zip(col_labels, values)) for row, values in zip(row_labels, matrix.tolist())}
 
-            # i don't want to include the genre with the total sales for the
-            # region, so this conditional pulls that one out
-            if genre != total_col:
 
-                # each genre's sales number is divided by the region's total
-                # sales and the value added to the region's dict
-                portions_dict[genre] = sales / region_data[total_col]
+@profiled
+@memoized
+def calculate_relative_portions(data, total_col):
+    """
+    Does:
+        Takes a series of sales numbers by genre in each region, and finds
+        the proportion of the total region's sale that that number
+        represents. Those values are then returned in a new dict, each still
+        associated with their own regions and genres like before
 
-        # that region-specific dictionary of values is added to its associated
-        # region in the outer dictionary
-        result_dict[region_name] = portions_dict
-    # loop ends
+    Parameters:
+      •data (dict)
+          •A 2D dictionary where:
+              •Outer keys represent region names
+              •Inner keys represent genres and total sales for the region
+      •total_col (str)
+          •Key representing the total sales count in each region's dictionary
+
+    Returns:
+        2D dict of region : {genre : portion of the region's sales}
+    """
+    # all of the dividing happens at once on the array
+    return matrix_to_dict(*relative_portions_matrix(data, total_col))
 
-    # returns the dict
-    return result_dict
 
-def reformat_heatmap_data(data):
+def create_share_heatmap(shares, x_labels, y_labels, x_title, y_title, color_label,
+                         filename=None, show=True, show_values=True):
     """
     Does:
-        Changes the regional genre sales portions into a list format so
-        it can be used in the heatmap without causing errors
+        Draws a heatmap straight from a 2D array of portions (like
+        share_matrix gives), e.g. publisher x platform
 
     Parameters:
-      •data (dict)
-          •A 2D dictionary with region names as keys and their sales
-          data as inner dictionaries
+      •shares (2D array)
+          •one row per y label and one column per x label
+      •x_labels, y_labels (lists of str)
+      •x_title, y_title, color_label (str)
+      •filename (str, optional)
+          •where to save the heatmap: a .html file works on its own, any
+          image type (.png, .svg, ...) needs the kaleido package
+      •show (bool)
+          •False to not open the heatmap in a browser (for rendering on a
+          server, see render.py)
+      •show_values (bool)
+          •write each portion in its cell (best turned off for big heatmaps)
 
     Returns:
-        A 2D list of values that plotly can use for a heatmap without issues
+        None
     """
+    # plotly is only imported once a heatmap actually gets made, since it
+    # takes a while to load
+    import numpy as np
+    import plotly.express as px
+
+    # creating the heatmap and storing it in variable "figure"
+    figure = px.imshow(np.round(shares, 5), text_auto = show_values,
+        labels = dict(x = x_title, y = y_title, color = color_label),
+                       x = x_labels, y = y_labels, height = 800)
 
-    formatted_list = []
+    # moving the x axis title to the top since it looks better
+    figure.update_xaxes(side = "top")
 
-    # goes through each of the positions and just makes it a list
-    # it loses the labels in the process though, so i'll have to account for
-    # that later.
-    for region in data.values():
-        regional_list = []
-        for genre_sales in region.values():
-            regional_list.append(round(genre_sales,5))
-        formatted_list.append(regional_list)
+    # saving the heatmap
+    if filename is not None:
+        if filename.lower().endswith((".html", ".htm")):
+            figure.write_html(filename)
+        else:
+            figure.write_image(filename)
 
-    return formatted_list
+    # showing the heatmap
+    if show:
+        figure.show()
 
 
+@profiled
 def create_relative_amounts_heatmap(base_sales_data, total_col,
-                                    x_title, y_title, color_label, x_labels, y_labels):
+                                    x_title, y_title, color_label, x_labels, y_labels,
+                                    filename=None, show=True):
     """
     Does:
         Creates a heatmap showing the portion of the sales in each region
         made up by each of the genres
 
     Parameters:
-      •base_sales_data (list)
-          •A 2D list with each row being a region and each column being
-          each genre's absolute sales numbers
+      •base_sales_data (dict)
+          •A 2D dictionary with each region's sales of each genre (and its
+          total), like calc_region_totals gives
       •total_col (str)
           •The key of the row with the total sums
       •x_title (str)
@@ -121,43 +293,61 @@ def create_relative_amounts_heatmap(base_sales_data, total_col,
           • List of string names of each of the y values (regions)
               •would have to be given from the user - we don't have any way
               to derive it from the files currently
+      •filename (str, optional)
+          •where to save the heatmap: a .html file works on its own, any
+          image type (.png, .svg, ...) needs the kaleido package
+      •show (bool)
+          •False to not open the heatmap in a browser (for rendering on a
+          server, see render.py)
 
     Returns:
         None
             •makes the visual and displays the heatmap
     """
 
-    # taking the absolute data and getting a form with relative proportions
-    relative_sales = calculate_relative_portions(base_sales_data,
-                                                 total_col)
+    # taking the absolute data and getting the relative proportions, laid
+    # out in the same order as the labels
+    relative_sales, y_labels, x_labels = relative_portions_matrix(base_sales_data, total_col,
+                                                                  y_labels, x_labels)
 
-    relative_sales = reformat_heatmap_data(relative_sales)
+    create_share_heatmap(relative_sales, x_labels, y_labels, x_title, y_title, color_label,
+                         filename, show)
 
-    # creating the heatmap and storing it in variable "figure"
-    figure = px.imshow(relative_sales, text_auto = True,
-        labels = dict(x = x_title, y = y_title, color = color_label),
-                       x = x_labels, y = y_labels, height = 800)
-
-    # moving the x axis title to the top since it looks better
-    figure.update_xaxes(side = "top")
+def show_genre_heatmap(cleaned_data, genre_stats=None):
+    """
+    Does:
+        Makes the heatmap of each genre's portion of every region's sales
+        for a cleaned dataset
 
-    # showing the heatmap
-    figure.show()
+    Parameters:
+      •cleaned_data (GameTable or list)
+          •the games released in or after 2013
+      •genre_stats (dict, optional)
+          •the result of aggregate.group_by_genre(cleaned_data), if it has
+          already been worked out
 
-def main():
-    data = read_file(FILENAME)
-    non_empty_data = remove_missing_data(data)
-    converted_type_data = convert_str_to_float(non_empty_data, COLUMN_RANK, COLUMN_YEAR, COLUMN_NA,
-                                               COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL)
-    cleaned_data = remove_games_before_year(converted_type_data)
+    Returns:
+        None
+    """
+    # Going through the cleaned data once for every genre's sales
+    if genre_stats is None:
+        genre_stats = group_by_genre(cleaned_data)
 
     # Generated list of genres in cleaned data
-    genre_list = find_genres(cleaned_data)
+    genre_list = find_genres(cleaned_data, genre_stats)
     # Generated list of genres and their sales in cleaned data
-    regional_totals = calc_region_totals(cleaned_data, ["NA", "EU", "JP", "Other"])
+    regional_totals = calc_region_totals(cleaned_data, ["NA", "EU", "JP", "Other"], genre_stats)
 
     # creating the heatmap
     create_relative_amounts_heatmap(regional_totals, "total_sales",
                                     "Genre", "Region", "Fraction of Region's Sales",
                                     genre_list, ["NA", "EU", "JP", "Other"])
-main()
\ No newline at end of file
+
+
+def main():
+    non_empty_data, cleaned_data, rows_in_file = load_cleaned_data(FILENAME)
+    show_genre_heatmap(cleaned_data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+
+from gametable import (COLUMN_NAME, COLUMN_PLATFORM, COLUMN_YEAR, COLUMN_GENRE,
+                       SALES_COLUMNS)
+from clean import iter_file, iter_remove_missing_data, iter_convert_str_to_float
+from analysis import calc_region_totals, find_genres
+from analysis2 import print_regional_values
+
+
+class GenreAggregates:
+    """
+    Does:
+        Keeps the genre/region aggregates (how many games are in each genre
+        and their sales in every region) as running totals that can be
+        updated with new batches of rows, instead of re-running the whole
+        pipeline over the full history every week
+
+        Every game is remembered by its (name, platform), along with its year
+        and what it added to the totals, so when a corrected row for the same
+        game comes in (even one that changes its year), its old numbers are
+        taken back out before the new ones are added. Updating therefore
+        takes time in proportion to the batch
+
+        The file has a few rows that share a (name, platform): a duplicate,
+        and a couple of remakes released under the same name in another year.
+        The batch functions count every one of them, so every row in a batch
+        is counted too, and a later batch that has the game replaces all of
+        the rows it had before (so a correction to a remake has to include
+        the original's row as well)
+
+    Attributes:
+        •first_year (int or None)
+            •games released before this are left out (like
+            remove_games_before_year), None keeps every year
+        •counts (dict)
+            •genre : number of games
+        •sums (dict)
+            •genre : list of the sales sums, in the order of SALES_COLUMNS
+        •games (dict)
+            •(name, platform) : list of (year, genre, tuple of sales), one
+            for each of the game's rows that's currently counted
+    """
+
+    def __init__(self, first_year=2013):
+        self.first_year = first_year
+        self.counts = {}
+        self.sums = {}
+        self.games = {}
+
+    def _remove(self, key):
+        # taking a game's old rows back out of the totals
+        for year, genre, sales in self.games.pop(key):
+            self.counts[genre] -= 1
+            genre_sums = self.sums[genre]
+            for i, value in enumerate(sales):
+                genre_sums[i] -= value
+
+    def _add(self, key, year, genre, sales):
+        if genre not in self.counts:
+            self.counts[genre] = 0
+            self.sums[genre] = [0] * len(SALES_COLUMNS)
+        self.counts[genre] += 1
+        genre_sums = self.sums[genre]
+        for i, value in enumerate(sales):
+            genre_sums[i] += value
+        self.games.setdefault(key, []).append((year, genre, sales))
+
+    def add_batch(self, rows):
+        """
+        Does:
+            Updates the totals with a batch of new or corrected games
+
+        Parameters:
+            •rows
+                •any iterable of converted rows (a 2D list, a GameTable, or
+                one of the streaming generators from clean.py)
+
+        Returns:
+            int number of rows in the batch
+        """
+        batch_size = 0
+        # the games this batch has already had a row for, so a second row of
+        # the same game is counted as well instead of replacing the first
+        seen = set()
+        for row in rows:
+            batch_size += 1
+            key = (row[COLUMN_NAME], row[COLUMN_PLATFORM])
+
+            # a game that's already counted from an earlier batch is being
+            # corrected (whatever year it had before)
+            if key not in seen:
+                seen.add(key)
+                if key in self.games:
+                    self._remove(key)
+
+            # a correction can also move a game out of the studied years
+            if self.first_year is not None and row[COLUMN_YEAR] < self.first_year:
+                continue
+
+            self._add(key, row[COLUMN_YEAR], row[COLUMN_GENRE], tuple(row[col] for col in SALES_COLUMNS))
+
+        return batch_size
+
+    def add_csv(self, filename):
+        """
+        Does:
+            Streams a CSV file of new rows (same columns as vgsales.csv) into
+            the totals, dropping rows with missing data
+
+        Parameters:
+            •filename (str)
+
+        Returns:
+            int number of rows added
+        """
+        rows = iter_convert_str_to_float(iter_remove_missing_data(iter_file(filename)))
+        return self.add_batch(rows)
+
+    def merge(self, other):
+        """
+        Does:
+            Merges another set of aggregates into this one (for example, one
+            built from a separate file). Games that are in both are taken
+            from the other one, like a correction
+
+        Parameters:
+            •other (GenreAggregates)
+
+        Returns:
+            None
+        """
+        for key, entries in other.games.items():
+            if key in self.games:
+                self._remove(key)
+            for year, genre, sales in entries:
+                if self.first_year is None or year >= self.first_year:
+                    self._add(key, year, genre, sales)
+
+    def genre_stats(self):
+        """
+        Does:
+            Gives the totals in the same format as aggregate.group_by_genre
+            (without min and max, which can't be kept up to date when games
+            are corrected), so they can be handed to calc_region_totals,
+            find_genres, get_genre_sizes, get_genre_total_sales and
+            get_all_genre_averages_by_region as their genre_stats
+
+        Returns:
+            dict of genre : {"count", "sum", "mean"}
+        """
+        stats = {}
+        for genre, count in self.counts.items():
+            # genres that every game has been corrected out of are skipped
+            if count == 0:
+                continue
+            sums = dict(zip(SALES_COLUMNS, self.sums[genre]))
+            stats[genre] = {"count": count, "sum": sums,
+                            "mean": {col: total / count for col, total in sums.items()}}
+        return stats
+
+    def to_dict(self):
+        """
+        Does:
+            Turns the aggregates into plain lists and dicts that can be saved
+            as JSON
+
+        Returns:
+            dict
+        """
+        return {"first_year": self.first_year,
+                "games": [[list(key) + [year], genre, list(sales)] for key, entries in self.games.items()
+                          for year, genre, sales in entries]}
+
+    @classmethod
+    def from_dict(cls, saved):
+        """
+        Does:
+            Rebuilds the aggregates from what to_dict gave
+
+        Parameters:
+            •saved (dict)
+
+        Returns:
+            GenreAggregates
+        """
+        aggregates = cls(saved["first_year"])
+        # each game is saved as [name, platform, year], genre, sales
+        for (name, platform, year), genre, sales in saved["games"]:
+            aggregates._add((name, platform), year, genre, tuple(sales))
+        return aggregates
+
+    def save(self, filename):
+        """
+        Does:
+            Writes the aggregates to a JSON file so next week's batch can be
+            added to them
+
+        Parameters:
+            •filename (str)
+
+        Returns:
+            None
+        """
+        with open(filename, "w") as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Does:
+            Reads aggregates saved with save
+
+        Parameters:
+            •filename (str)
+
+        Returns:
+            GenreAggregates
+        """
+        with open(filename) as file:
+            return cls.from_dict(json.load(file))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add a batch of sales rows to saved genre aggregates")
+    parser.add_argument("state", help="JSON file the aggregates are kept in (created if missing)")
+    parser.add_argument("batches", nargs="*", help="CSV files of new or corrected rows")
+    args = parser.parse_args()
+
+    if os.path.exists(args.state):
+        aggregates = GenreAggregates.load(args.state)
+    else:
+        aggregates = GenreAggregates()
+
+    for batch in args.batches:
+        print("Added", aggregates.add_csv(batch), "rows from", batch)
+    aggregates.save(args.state)
+
+    # printing the updated sales by genre by region
+    genre_stats = aggregates.genre_stats()
+    print("Sales by genre by region")
+    print("-" * 60)
+    print_regional_values(calc_region_totals(None, ["NA", "EU", "JP", "Other"], genre_stats),
+                          find_genres(None, genre_stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import csv
+import io
+import locale
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from clean import convert_columns
+from gametable import GameTable
+from instrument import profiled
+
+# how many pieces each worker gets, so a worker that finishes early can pick
+# up another piece instead of sitting idle
+CHUNKS_PER_WORKER = 4
+
+# files smaller than this aren't worth starting worker processes for
+MIN_PARALLEL_BYTES = 1 << 20
+
+
+def chunk_ranges(filename, chunks):
+    """
+    Does:
+        Splits a CSV file into byte ranges that each start at the beginning
+        of a line and end right after one, skipping the header
+
+        (This assumes no quoted field has a line break inside it, which is
+        true of the vgsales exports)
+
+    Parameters:
+        •filename (str)
+        •chunks (int)
+            •how many ranges to try to split it into
+
+    Returns:
+        list of (start, end) byte positions
+    """
+    size = os.path.getsize(filename)
+
+    with open(filename, "rb") as file:
+        # the data starts after the header line
+        file.readline()
+        start = file.tell()
+
+        # evenly spaced guesses at where to split, each pushed forward to the
+        # end of whatever line it lands in
+        boundaries = [start]
+        step = max(1, (size - start) // chunks)
+        for guess in range(start + step, size, step):
+            if guess <= boundaries[-1]:
+                continue
+            file.seek(guess)
+            file.readline()
+            boundary = file.tell()
+            if boundaries[-1] < boundary < size:
+                boundaries.append(boundary)
+        boundaries.append(size)
+
+    return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)
+            if boundaries[i] < boundaries[i + 1]]
+
+
+def parse_range(filename, start, end, row_filter=None):
+    """
+    Does:
+        Reads and converts the rows in one byte range of the file (this is
+        what each worker process runs)
+
+    Parameters:
+        •filename (str)
+        •start, end (int)
+            •byte positions from chunk_ranges
+        •row_filter (RowFilter or None)
+            •rows it doesn't match are skipped before being converted
+
+    Returns:
+        tuple of the GameTable of the (kept) rows in that range and how many
+        rows the range had
+    """
+    with open(filename, "rb") as file:
+        file.seek(start)
+        # decoded the same way open() does in clean.read_table
+        text = file.read(end - start).decode(locale.getpreferredencoding(False))
+
+    # newline="" so rows only split where the file has \r or \n, like the
+    # serial reader (splitlines also splits on \x0c, \x85, ...)
+    rows = csv.reader(io.StringIO(text, newline=""), delimiter=",")
+    if row_filter is None:
+        rows = list(rows)
+        rows_read = len(rows)
+    else:
+        rows_read = 0
+        kept = []
+        for row in rows:
+            rows_read += 1
+            if row_filter.matches_raw(row):
+                kept.append(row)
+        rows = kept
+
+    table = GameTable()
+    table.append_columns(*convert_columns(rows))
+    return table, rows_read
+
+
+def _parse_range_args(args):
+    return parse_range(*args)
+
+
+def read_table_parallel(filename, workers=None, row_filter=None):
+    """
+    Does:
+        Parallel version of clean.read_table. The file is split into line
+        aligned byte ranges, each range is parsed and converted in a separate
+        process, and the pieces are joined back together in order, so the
+        result is exactly the same as reading it in one go
+
+    Parameters:
+        •filename (str)
+        •workers (int or None)
+            •how many processes to use (None for one per CPU)
+        •row_filter (RowFilter or None)
+            •rows it doesn't match are skipped before being converted
+
+    Returns:
+        GameTable of every game in the file, with 'N/A' rows marked
+    """
+    return read_filtered_table_parallel(filename, row_filter, workers)[0]
+
+
+@profiled
+def read_filtered_table_parallel(filename, row_filter=None, workers=None):
+    """
+    Does:
+        Same as read_table_parallel, but also counts the rows in the file
+
+    Parameters:
+        •filename (str)
+        •row_filter (RowFilter or None)
+        •workers (int or None)
+
+    Returns:
+        tuple of the GameTable and the number of rows in the file
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # splitting the file up isn't worth it for one worker or a small file
+    if workers <= 1 or os.path.getsize(filename) < MIN_PARALLEL_BYTES:
+        from clean import read_filtered_table
+        return read_filtered_table(filename, row_filter)
+
+    ranges = chunk_ranges(filename, workers * CHUNKS_PER_WORKER)
+
+    table = GameTable()
+    rows_read = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map hands the results back in the same order as the ranges, so the
+        # rows (and the order the categories are first seen in) stay the same
+        jobs = [(filename, start, end, row_filter) for start, end in ranges]
+        for piece, piece_rows in executor.map(_parse_range_args, jobs):
+            table.extend(piece)
+            rows_read += piece_rows
+
+    return table, rows_read
@@ -0,0 +1,296 @@
+"""
+Records how long each stage of the pipeline takes (wall and CPU time), how
+many rows go in and come out, and optionally its peak memory
+
+Turned on with an environment variable (the summary is printed to stderr when
+the program ends)
+
+    VGSALES_PROFILE=1 python conclusion.py          # summary table
+    VGSALES_PROFILE=json python conclusion.py       # the same as JSON
+    VGSALES_PROFILE_MEMORY=1 VGSALES_PROFILE=1 ...  # peak memory as well
+
+or with `python -m vgsales report --profile`. When it's off, every stage just
+checks one flag before running normally
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ENV_VAR = "VGSALES_PROFILE"
+MEMORY_ENV_VAR = "VGSALES_PROFILE_MEMORY"
+
+# the ways the summary can be printed
+FORMATS = ("table", "json")
+
+
+class _State:
+    # everything is kept on one object so the wrappers only have one
+    # attribute to check when profiling is off
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.format = "table"
+        # one dict per stage that ran, in the order they started
+        self.records = []
+        # the stages that are running right now, innermost last, each as
+        # [peak memory seen so far while it ran]
+        self.stack = []
+
+
+_state = _State()
+
+
+def enable(output_format="table", memory=False):
+    """
+    Does:
+        Starts recording the stages
+
+    Parameters:
+        •output_format (str)
+            •"table" or "json", for report
+        •memory (bool)
+            •also record each stage's peak memory (tracemalloc makes
+            everything run a few times slower, so the times aren't
+            realistic with this on)
+
+    Returns:
+        None
+    """
+    if output_format not in FORMATS:
+        raise ValueError("unknown profile format {!r} (expected one of {})".format(output_format, FORMATS))
+
+    _state.enabled = True
+    _state.format = output_format
+    _state.memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """
+    Does:
+        Stops recording (what was recorded is kept until reset)
+
+    Returns:
+        None
+    """
+    _state.enabled = False
+    if _state.memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _state.memory = False
+
+
+def is_enabled():
+    return _state.enabled
+
+
+def reset():
+    """
+    Does:
+        Throws away everything recorded so far
+
+    Returns:
+        None
+    """
+    _state.records = []
+    _state.stack = []
+
+
+def _count_rows(value):
+    # how many rows something holds, if it can tell
+    #   •the load functions return (data, ...) tuples, so it's the first item
+    #    that counts for those
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, (str, bytes)) or not hasattr(value, "__len__"):
+        return None
+    return len(value)
+
+
+class measure:
+    """
+    Does:
+        Records one stage around a block of code
+
+            with measure("render heatmap"):
+                ...
+
+        The rows out can be set from inside the block with set_rows_out
+
+    Parameters:
+        •name (str)
+            •what the stage is called in the summary
+        •rows_in (int or None)
+    """
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+
+    def set_rows_out(self, rows_out):
+        self.rows_out = rows_out
+
+    def __enter__(self):
+        if not _state.enabled:
+            return self
+
+        # the record is added now (and filled in at the end) so the records
+        # stay in the order the stages started, with outer stages first
+        self._record = {"stage": self.name}
+        _state.records.append(self._record)
+
+        if _state.memory:
+            # the stage that's already running needs to remember its peak
+            # before it gets reset for this one
+            current, peak = tracemalloc.get_traced_memory()
+            if _state.stack:
+                _state.stack[-1][0] = max(_state.stack[-1][0], peak)
+            tracemalloc.reset_peak()
+            self._memory_start = current
+            _state.stack.append([current])
+
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        record = getattr(self, "_record", None)
+        if record is None:
+            return False
+        self._record = None
+
+        record.update({"wall": time.perf_counter() - self._wall_start,
+                       "cpu": time.process_time() - self._cpu_start,
+                       "rows_in": self.rows_in, "rows_out": self.rows_out})
+
+        if _state.memory and tracemalloc.is_tracing():
+            peak = max(_state.stack.pop()[0], tracemalloc.get_traced_memory()[1])
+            record["peak_memory"] = peak - self._memory_start
+            # the stage this one ran inside saw the same peak
+            if _state.stack:
+                _state.stack[-1][0] = max(_state.stack[-1][0], peak)
+
+        return False
+
+
+def profiled(function=None, name=None):
+    """
+    Does:
+        Decorator that records every call of a function as a stage. The rows
+        in are the length of its first argument and the rows out the length
+        of what it returns (when they have one)
+
+            @profiled
+            def read_file(filename): ...
+
+    Parameters:
+        •function (function)
+        •name (str or None)
+            •what the stage is called, the module and function name if None
+
+    Returns:
+        the wrapped function
+    """
+    if function is None:
+        return lambda function: profiled(function, name)
+
+    stage_name = name or "{}.{}".format(function.__module__, function.__qualname__)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _state.enabled:
+            return function(*args, **kwargs)
+
+        with measure(stage_name, _count_rows(args[0]) if args else None) as stage:
+            result = function(*args, **kwargs)
+            stage.set_rows_out(_count_rows(result))
+        return result
+
+    return wrapper
+
+
+def summary():
+    """
+    Does:
+        Adds up the records of each stage (in the order the stages first ran)
+
+    Returns:
+        list of dicts with the stage name, number of calls, total wall and
+        CPU time, rows in and out (of the last call) and the highest peak
+        memory (if it was measured)
+    """
+    stages = {}
+    for record in _state.records:
+        # a stage that's still running has nothing to add yet
+        if "wall" not in record:
+            continue
+        stage = stages.get(record["stage"])
+        if stage is None:
+            stage = stages[record["stage"]] = {"stage": record["stage"], "calls": 0,
+                                               "wall": 0.0, "cpu": 0.0}
+        stage["calls"] += 1
+        stage["wall"] += record["wall"]
+        stage["cpu"] += record["cpu"]
+        stage["rows_in"] = record["rows_in"]
+        stage["rows_out"] = record["rows_out"]
+        if "peak_memory" in record:
+            stage["peak_memory"] = max(stage.get("peak_memory", 0), record["peak_memory"])
+
+    return list(stages.values())
+
+
+def _format_rows(rows):
+    return "-" if rows is None else str(rows)
+
+
+def report(output_format=None):
+    """
+    Does:
+        Turns the summary into text
+
+    Parameters:
+        •output_format (str or None)
+            •"table" or "json", whatever profiling was enabled with if None
+
+    Returns:
+        str
+    """
+    output_format = output_format or _state.format
+    stages = summary()
+
+    if output_format == "json":
+        return json.dumps({"stages": stages, "records": _state.records}, indent=2)
+
+    lines = ["{:<50}{:>6}{:>11}{:>11}{:>11}{:>11}{:>11}".format(
+        "stage", "calls", "wall (s)", "cpu (s)", "rows in", "rows out", "peak MB")]
+    for stage in stages:
+        peak = stage.get("peak_memory")
+        lines.append("{:<50}{:>6}{:>11.4f}{:>11.4f}{:>11}{:>11}{:>11}".format(
+            stage["stage"], stage["calls"], stage["wall"], stage["cpu"],
+            _format_rows(stage["rows_in"]), _format_rows(stage["rows_out"]),
+            "-" if peak is None else "{:.2f}".format(peak / 1e6)))
+    return "\n".join(lines)
+
+
+def _report_at_exit():
+    if _state.records:
+        print(report(), file=sys.stderr)
+
+
+def _enable_from_environment():
+    # any value other than the json format (or "0") gives the table
+    value = os.environ.get(ENV_VAR, "").strip().lower()
+    if value in ("", "0"):
+        return
+
+    memory = os.environ.get(MEMORY_ENV_VAR, "").strip() not in ("", "0")
+    enable("json" if value == "json" else "table", memory)
+    atexit.register(_report_at_exit)
+
+
+_enable_from_environment()
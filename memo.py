@@ -0,0 +1,311 @@
+"""
+Remembers the results of the expensive analysis steps, so asking the same
+question of the same data twice in one run (the heatmap and the conclusion
+both working out the relative portions, the averages going back to the same
+group-by for every genre, the same request hitting server.py again, ...)
+only works it out once
+
+    @memoized
+    def group_by(data, key, value_cols): ...
+
+Each call is looked up by the function, a fingerprint of the dataset it was
+given and the rest of its arguments. A GameTable's fingerprint is a hash of
+its columns (worked out once per table, and again only if it grows), and
+dicts and lists are compared by their contents, so a copy of the same data
+finds the same result. Data that can't be fingerprinted cheaply (a generator
+from the streaming pipeline, a big 2D list, a database) just runs normally
+
+Each function keeps its most recently used results (MAX_SIZE by default) and
+counts its hits and misses
+
+    VGSALES_MEMO=0 python conclusion.py      # turns it off
+    python -m vgsales report --memo-stats    # prints the hits and misses
+
+The results are shared between the calls that find them, so they mustn't be
+changed by whoever gets them
+"""
+import functools
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+from gametable import GameTable
+
+ENV_VAR = "VGSALES_MEMO"
+
+# how many results each function keeps by default
+MAX_SIZE = 128
+
+# lists (and tuples) longer than this are treated as datasets rather than
+# arguments, and aren't fingerprinted (it would take as long as the work)
+MAX_FREEZE_LENGTH = 1000
+
+
+class _Unfreezable(Exception):
+    # an argument that can't be turned into part of a key
+    pass
+
+
+class _State:
+    def __init__(self):
+        self.enabled = True
+        # every memoized function's cache, by its name
+        self.caches = {}
+        self.lock = threading.Lock()
+
+
+_state = _State()
+
+# table : (length when it was hashed, fingerprint)
+_table_fingerprints = weakref.WeakKeyDictionary()
+
+# id of a vocabulary list : (the list, its length when it was hashed, digest)
+#   •filtered tables share their vocabularies with the table they came from,
+#    so the (big) name vocabulary only has to be hashed once. The list is
+#    kept so its id can't be reused by a different one
+_vocabulary_digests = OrderedDict()
+_VOCABULARIES_KEPT = 16
+
+
+class _Cache:
+    # one function's results, least recently used first
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+
+def _vocabulary_digest(vocab):
+    with _state.lock:
+        known = _vocabulary_digests.get(id(vocab))
+        if known is not None and known[0] is vocab and known[1] == len(vocab):
+            return known[2]
+
+    digest = hashlib.blake2b("\x00".join(vocab).encode("utf-8"), digest_size=16).digest()
+
+    with _state.lock:
+        _vocabulary_digests[id(vocab)] = (vocab, len(vocab), digest)
+        while len(_vocabulary_digests) > _VOCABULARIES_KEPT:
+            _vocabulary_digests.popitem(last=False)
+    return digest
+
+
+def table_fingerprint(table):
+    """
+    Does:
+        Works out a hash of everything in a GameTable (its columns,
+        vocabularies and missing marks). It's remembered for the table, and
+        only worked out again if rows have been added since
+
+    Parameters:
+        •table (GameTable)
+
+    Returns:
+        str hex digest
+    """
+    known = _table_fingerprints.get(table)
+    if known is not None and known[0] == len(table):
+        return known[1]
+
+    digest = hashlib.blake2b(digest_size=16)
+    for column in table.columns:
+        # columns that were never read (see columnar.read_table) count too
+        if column is None:
+            digest.update(b"\xff")
+        else:
+            # (a column straight from the cache's memory map is a memoryview)
+            typecode = column.typecode if hasattr(column, "typecode") else column.format
+            digest.update(typecode.encode())
+            digest.update(len(column).to_bytes(8, "little"))
+            digest.update(column)
+    for col in sorted(table.vocabularies):
+        digest.update(str(col).encode())
+        digest.update(_vocabulary_digest(table.vocabularies[col]))
+    digest.update(bytes(table.missing) if table.missing is not None else b"-")
+
+    fingerprint = digest.hexdigest()
+    _table_fingerprints[table] = (len(table), fingerprint)
+    return fingerprint
+
+
+def forget_table(table):
+    """
+    Does:
+        Makes a table get fingerprinted again the next time it's used, for
+        when its rows have been changed in place (which the length check in
+        table_fingerprint can't see)
+
+    Parameters:
+        •table (GameTable)
+
+    Returns:
+        None
+    """
+    _table_fingerprints.pop(table, None)
+
+
+def freeze(value):
+    """
+    Does:
+        Turns an argument into something hashable that's equal for equal
+        contents (dicts keep their order, since it changes the results)
+
+    Parameters:
+        •value
+
+    Returns:
+        hashable version of the value (raises _Unfreezable if it can't be
+        done cheaply)
+    """
+    if value is None or isinstance(value, (str, int, float, bool, bytes)):
+        return value
+    if isinstance(value, GameTable):
+        return ("table", table_fingerprint(value))
+    if isinstance(value, dict):
+        if len(value) > MAX_FREEZE_LENGTH:
+            raise _Unfreezable
+        return ("dict",) + tuple((freeze(key), freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        if len(value) > MAX_FREEZE_LENGTH:
+            raise _Unfreezable
+        return (type(value).__name__,) + tuple(freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return ("set", frozenset(freeze(item) for item in value))
+    # functions (like a group key) are only the same if they're the same object
+    if callable(value):
+        return ("function", value)
+    raise _Unfreezable
+
+
+def memoized(function=None, max_size=MAX_SIZE, name=None):
+    """
+    Does:
+        Decorator that remembers a function's results by the fingerprint of
+        its arguments (see freeze), keeping the max_size most recently used
+
+    Parameters:
+        •function (function)
+        •max_size (int)
+        •name (str or None)
+            •what the function is called in the stats, the module and
+            function name if None
+
+    Returns:
+        the wrapped function
+    """
+    if function is None:
+        return lambda function: memoized(function, max_size, name)
+
+    cache_name = name or "{}.{}".format(function.__module__, function.__qualname__)
+    cache = _state.caches[cache_name] = _Cache(max_size)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _state.enabled:
+            return function(*args, **kwargs)
+
+        try:
+            key = (freeze(args), freeze(sorted(kwargs.items())))
+        except _Unfreezable:
+            with _state.lock:
+                cache.skipped += 1
+            return function(*args, **kwargs)
+
+        with _state.lock:
+            if key in cache.results:
+                cache.results.move_to_end(key)
+                cache.hits += 1
+                return cache.results[key]
+            cache.misses += 1
+
+        # worked out outside the lock, so other threads aren't held up (two
+        # threads asking the same thing at once might both work it out)
+        result = function(*args, **kwargs)
+
+        with _state.lock:
+            cache.results[key] = result
+            cache.results.move_to_end(key)
+            while len(cache.results) > cache.max_size:
+                cache.results.popitem(last=False)
+        return result
+
+    return wrapper
+
+
+def enable():
+    _state.enabled = True
+
+
+def disable():
+    """
+    Does:
+        Stops remembering results (for timing the real work, like the
+        benchmark does); what's already remembered is kept until reset
+
+    Returns:
+        None
+    """
+    _state.enabled = False
+
+
+def is_enabled():
+    return _state.enabled
+
+
+def reset():
+    """
+    Does:
+        Forgets every remembered result and zeroes the counts
+
+    Returns:
+        None
+    """
+    with _state.lock:
+        for cache in _state.caches.values():
+            cache.results.clear()
+            cache.hits = cache.misses = cache.skipped = 0
+
+
+def stats():
+    """
+    Does:
+        Gets the counts of every memoized function that's been called
+
+    Returns:
+        list of dicts with the function name, hits, misses, skipped calls
+        (arguments that couldn't be fingerprinted), and how many results are
+        kept out of the most it can keep
+    """
+    with _state.lock:
+        return [{"function": cache_name, "hits": cache.hits, "misses": cache.misses,
+                 "skipped": cache.skipped, "size": len(cache.results), "max_size": cache.max_size}
+                for cache_name, cache in _state.caches.items()
+                if cache.hits or cache.misses or cache.skipped]
+
+
+def report():
+    """
+    Does:
+        Turns the stats into a table
+
+    Returns:
+        str
+    """
+    lines = ["{:<50}{:>8}{:>8}{:>9}{:>11}".format("function", "hits", "misses", "skipped", "kept")]
+    for row in stats():
+        lines.append("{:<50}{:>8}{:>8}{:>9}{:>11}".format(
+            row["function"], row["hits"], row["misses"], row["skipped"],
+            "{}/{}".format(row["size"], row["max_size"])))
+    return "\n".join(lines)
+
+
+def _configure_from_environment():
+    if os.environ.get(ENV_VAR, "").strip() == "0":
+        disable()
+
+
+_configure_from_environment()
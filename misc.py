@@ -1,8 +1,9 @@
-from clean import (read_file, remove_missing_data, convert_str_to_float,
-                   remove_games_before_year)
-from analysis import (calc_region_totals, find_genres, get_genre_sizes,
-                      get_genre_total_sales)
-import matplotlib.pyplot as plt
+import sys
+
+from clean import load_columns
+from analysis import find_genres, get_genre_sizes, get_genre_total_sales
+from aggregate import group_by
+from instrument import profiled
 FILENAME = "vgsales.csv"
 NA = 'NA_Sales'
 EU = 'EU_Sales'
@@ -19,7 +20,15 @@ COLUMN_JP = 8
 COLUMN_OTHER = 9
 COLUMN_GLOBAL = 10
 
-def plot_sales_vs_num_of_games(num_of_games, sales, colors):
+# the only columns the genre charts need
+CHART_COLUMNS = (COLUMN_GENRE, COLUMN_GLOBAL)
+
+# the colors the genres are drawn in (in the order the genres are found)
+GENRE_COLORS = ["red", "rebeccapurple", "dimgray", "black", "dodgerblue", "brown",
+                "gold", "grey", "lime", "forestgreen", "purple", "blue"]
+
+@profiled
+def plot_sales_vs_num_of_games(num_of_games, sales, colors, filename="Sales vs Number of Games.png", show=True):
     """
     Does:
         Creates a plot that shows the relationship between number of global sales
@@ -37,6 +46,11 @@ def plot_sales_vs_num_of_games(num_of_games, sales, colors):
       •colors (list of str)
           •A list of color strings for plotting points, with colors cycling if
           there are more points than colors
+      •filename (str)
+          •where to save the plot
+      •show (bool)
+          •False to only save the plot without opening a window (for
+          rendering on a server, see render.py)
 
     Returns:
         None:
@@ -47,6 +61,14 @@ def plot_sales_vs_num_of_games(num_of_games, sales, colors):
                     •Y-axis: Total global sales.
             •Saves the plot as "Sales vs Number of Games.png".
     """
+    # matplotlib is only imported once something actually gets drawn, since
+    # it takes a while to load
+    import matplotlib.pyplot as plt
+
+    # drawing on a figure of its own, so it doesn't get mixed up with
+    # whatever else was drawn before
+    figure, axes = plt.subplots()
+
     # creating a number to increment for selecting colors at each step in the loop
     i = 0
 
@@ -55,25 +77,30 @@ def plot_sales_vs_num_of_games(num_of_games, sales, colors):
     # each is also labeled with their genre and given a color from the input list
     # (repeating if there are more points than colors, though ideally that shouldn't be necessary)
     for genre in num_of_games.keys():
-      plt.plot(num_of_games[genre], sales[genre],
-               marker = "o", label = genre, color = colors[i % len(colors)])
+      axes.plot(num_of_games[genre], sales[genre],
+                marker = "o", label = genre, color = colors[i % len(colors)])
       i += 1
 
 
     # labels
-    plt.title("Number of Games in Genre vs Total Sales of the Genre")
-    plt.xlabel("Number of Games in the Genre")
-    plt.ylabel("Number of Global Sales")
+    axes.set_title("Number of Games in Genre vs Total Sales of the Genre")
+    axes.set_xlabel("Number of Games in the Genre")
+    axes.set_ylabel("Number of Global Sales")
     # making legend of the labels
-    plt.legend()
+    axes.legend()
 
     # saving the figure
-    plt.savefig("Sales vs Number of Games.png")
-    # showing the graph
-    plt.show()
+    figure.savefig(filename)
+    # showing the graph (or letting go of it if it isn't being shown)
+    if show:
+        plt.show()
+    else:
+        plt.close(figure)
 
 
-def plot_ratio_bars_of_sales_vs_num_of_games(num_of_games, sales, colors):
+@profiled
+def plot_ratio_bars_of_sales_vs_num_of_games(num_of_games, sales, colors,
+                                             filename="Sales vs Number of Games bar.png", show=True):
   """
     Does:
         Creates a bar plot showing the ratios depicted by the previous scatter
@@ -89,12 +116,19 @@ def plot_ratio_bars_of_sales_vs_num_of_games(num_of_games, sales, colors):
       •colors (list of str)
           •A list of color strings for plotting points, with colors cycling if
           there are more points than colors
+      •filename (str)
+          •where to save the plot
+      •show (bool)
+          •False to only save the plot without opening a window
 
     Returns:
         None:
             •Generates and displays a bar plot
             •Saves the plot as "Sales vs Number of Games bar.png".
   """
+  import matplotlib.pyplot as plt
+
+  figure, axes = plt.subplots()
 
   i = 0
 
@@ -102,45 +136,65 @@ def plot_ratio_bars_of_sales_vs_num_of_games(num_of_games, sales, colors):
   for genre in num_of_games.keys():
       # plotting each bar with the number of sales divided by the number of
       # games in that genre
-      plt.bar(genre, sales[genre] / num_of_games[genre],
-              color = colors[i % len(colors)])
+      axes.bar(genre, sales[genre] / num_of_games[genre],
+               color = colors[i % len(colors)])
       i += 1
 
   # labels
-  plt.title("Popularity of an \"Average\" Game In Each Genre")
-  plt.xlabel("Genre")
-  plt.ylabel("Ratio of Sales to Number of Games")
+  axes.set_title("Popularity of an \"Average\" Game In Each Genre")
+  axes.set_xlabel("Genre")
+  axes.set_ylabel("Ratio of Sales to Number of Games")
 
   # rotating the x labels so they don't overlap
-  plt.xticks(rotation=75)
+  axes.tick_params(axis="x", labelrotation=75)
 
-  # saving the figure
-  plt.savefig("Sales vs Number of Games bar.png")
+  # saving the figure (fitted around the rotated labels, which would
+  # otherwise be cut off at the bottom)
+  figure.savefig(filename, bbox_inches="tight")
   # showing the graph
-  plt.show()
+  if show:
+      plt.show()
+  else:
+      plt.close(figure)
 
 
-def main():
-    data = read_file(FILENAME)
-    non_empty_data = remove_missing_data(data)
-    converted_type_data = convert_str_to_float(non_empty_data, COLUMN_RANK, COLUMN_YEAR, COLUMN_NA,
-                                               COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL)
-    cleaned_data = remove_games_before_year(converted_type_data)
+def plot_genre_charts(cleaned_data, genre_stats=None):
+    """
+    Does:
+        Draws both of the genre charts (sales vs number of games, and the
+        ratio bars) for a cleaned dataset
+
+    Parameters:
+      •cleaned_data (GameTable or list)
+          •the games released in or after 2013
+      •genre_stats (dict, optional)
+          •the result of aggregate.group_by_genre(cleaned_data), if it has
+          already been worked out
 
-    regional_totals = calc_region_totals(cleaned_data, ["NA", "EU", "JP", "Other"])
+    Returns:
+        None
+    """
+    # one pass over the data gives every genre's counts and sales (only the
+    # global sales are needed, so the table can be missing the other columns)
+    if genre_stats is None:
+        genre_stats = group_by(cleaned_data, COLUMN_GENRE, [COLUMN_GLOBAL])
 
-    genre_list = find_genres(cleaned_data)
+    genre_list = find_genres(cleaned_data, genre_stats)
 
-    game_numbers_in_each_genre = get_genre_sizes(cleaned_data, genre_list)
+    game_numbers_in_each_genre = get_genre_sizes(cleaned_data, genre_list, genre_stats)
 
-    total_sales_by_genre = get_genre_total_sales(cleaned_data, genre_list)
+    total_sales_by_genre = get_genre_total_sales(cleaned_data, genre_list, genre_stats)
 
-    color_list = ["red", "rebeccapurple", "dimgray", "black", "dodgerblue", "brown",
-                  "gold", "grey", "lime", "forestgreen", "purple", "blue"]
+    plot_sales_vs_num_of_games(game_numbers_in_each_genre, total_sales_by_genre, GENRE_COLORS)
+    plot_ratio_bars_of_sales_vs_num_of_games(game_numbers_in_each_genre, total_sales_by_genre, GENRE_COLORS)
 
 
-    plot_sales_vs_num_of_games(game_numbers_in_each_genre, total_sales_by_genre, color_list)
-    plot_ratio_bars_of_sales_vs_num_of_games(game_numbers_in_each_genre, total_sales_by_genre, color_list)
+def main(filename=FILENAME):
+    # only the genres and global sales of the games from 2013 on, which from
+    # a columnar file is all that gets read
+    cleaned_data, rows_in_file = load_columns(filename, CHART_COLUMNS, first_year=2013)
+    plot_genre_charts(cleaned_data)
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
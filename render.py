@@ -0,0 +1,133 @@
+"""
+Renders every chart to files without a display, for running on a server
+
+    python render.py                         # into ./charts
+    python render.py --output-dir nightly --workers 4 --heatmap-format png
+
+Everything the charts need is worked out once up front from the genre stats,
+and then each chart is drawn in its own worker process on matplotlib's Agg
+backend (the heatmap is written as HTML, or as an image if kaleido is
+installed)
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from clean import FILENAME
+from analysis import calc_region_totals, find_genres, get_genre_sizes, get_genre_total_sales
+from bubblechart import calculate_sales_by_genre_region, plot_bubble_chart
+from heatmap import create_relative_amounts_heatmap
+from misc import GENRE_COLORS, plot_sales_vs_num_of_games, plot_ratio_bars_of_sales_vs_num_of_games
+from vgsales import load
+
+REGIONS = ["NA", "EU", "JP", "Other"]
+
+DEFAULT_OUTPUT_DIR = "charts"
+
+
+def chart_jobs(genre_stats, output_dir=DEFAULT_OUTPUT_DIR, heatmap_format="html"):
+    """
+    Does:
+        Works out what each chart needs from the genre stats, so the workers
+        only have to draw
+
+    Parameters:
+        •genre_stats (dict)
+            •the result of aggregate.group_by_genre (or SalesCube.genre_stats)
+            for the games to chart
+        •output_dir (str)
+            •the folder to write the charts to
+        •heatmap_format (str)
+            •"html", or an image type like "png" (which needs kaleido)
+
+    Returns:
+        list of (function, args, keyword args) for each chart
+    """
+    genres = find_genres(None, genre_stats)
+    sizes = get_genre_sizes(None, genres, genre_stats)
+    sales = get_genre_total_sales(None, genres, genre_stats)
+    region_totals = calc_region_totals(None, REGIONS, genre_stats)
+    genre_sales = calculate_sales_by_genre_region(None, genre_stats)
+
+    def path(name):
+        return os.path.join(output_dir, name)
+
+    return [
+        (plot_sales_vs_num_of_games, (sizes, sales, GENRE_COLORS),
+         {"filename": path("Sales vs Number of Games.png"), "show": False}),
+        (plot_ratio_bars_of_sales_vs_num_of_games, (sizes, sales, GENRE_COLORS),
+         {"filename": path("Sales vs Number of Games bar.png"), "show": False}),
+        (plot_bubble_chart, (genre_sales,),
+         {"filename": path("bubblechart.png"), "show": False}),
+        (create_relative_amounts_heatmap,
+         (region_totals, "total_sales", "Genre", "Region", "Fraction of Region's Sales", genres, REGIONS),
+         {"filename": path("heatmap." + heatmap_format), "show": False}),
+    ]
+
+
+def _use_agg():
+    # has to happen before pyplot is imported in the process, which is why
+    # the chart functions only import it when they draw
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render(job):
+    function, args, kwargs = job
+    _use_agg()
+    function(*args, **kwargs)
+    return kwargs["filename"]
+
+
+def render_all(genre_stats, output_dir=DEFAULT_OUTPUT_DIR, workers=None, heatmap_format="html"):
+    """
+    Does:
+        Draws every chart into a folder, spreading them across worker
+        processes, without opening any windows
+
+    Parameters:
+        •genre_stats (dict)
+            •the result of aggregate.group_by_genre (or SalesCube.genre_stats)
+        •output_dir (str)
+        •workers (int or None)
+            •how many processes to use (None for one per CPU, 1 to draw them
+            all in this process)
+        •heatmap_format (str)
+            •"html", or an image type like "png" (which needs kaleido)
+
+    Returns:
+        list of the paths of the files that were written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = chart_jobs(genre_stats, output_dir, heatmap_format)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+
+    if workers <= 1:
+        return [_render(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_use_agg) as executor:
+        return list(executor.map(_render, jobs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every chart to files without a display")
+    parser.add_argument("--file", default=FILENAME, help="CSV file to read (default: %(default)s)")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help="folder to write the charts to (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="processes to draw the charts with, 0 for one per CPU (default: %(default)s)")
+    parser.add_argument("--heatmap-format", default="html",
+                        help="html, or an image type like png (needs kaleido) (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    loaded = load(args.file)
+
+    for path in render_all(loaded["genre_stats"], args.output_dir, args.workers or None, args.heatmap_format):
+        print("Wrote", path)
+
+
+if __name__ == "__main__":
+    main()
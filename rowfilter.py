@@ -0,0 +1,151 @@
+from gametable import (GameTable, COLUMN_PLATFORM, COLUMN_YEAR, COLUMN_GENRE, COLUMN_PUBLISHER,
+                       COLUMN_GLOBAL)
+from clean import parse_sales
+
+
+class RowFilter:
+    """
+    Does:
+        Describes which games to keep: a range of years, sets of platforms,
+        genres and publishers, and a minimum number of global sales. Any of
+        them can be left out (None), and a game has to pass all the ones that
+        are given
+
+        The filter can check the raw rows of strings straight from the CSV,
+        so the reading functions in clean.py and ingest.py use it to throw
+        rows away before converting or storing them
+
+    Attributes:
+        •first_year, last_year (int or None)
+            •the years to keep, both included
+        •platforms, genres, publishers (set of str or None)
+        •min_global_sales (int or None)
+            •in single sales (the same units as the converted data, so 1
+            million is 1000000)
+    """
+
+    def __init__(self, years=None, platforms=None, genres=None, publishers=None,
+                 min_global_sales=None):
+        self.first_year, self.last_year = years if years is not None else (None, None)
+        self.platforms = _as_set(platforms)
+        self.genres = _as_set(genres)
+        self.publishers = _as_set(publishers)
+        self.min_global_sales = min_global_sales
+
+        # the category checks that are actually being used, as
+        # (column, allowed values) pairs
+        self._category_checks = [(col, values) for col, values in
+                                 ((COLUMN_GENRE, self.genres), (COLUMN_PLATFORM, self.platforms),
+                                  (COLUMN_PUBLISHER, self.publishers))
+                                 if values is not None]
+
+    def _year_ok(self, year):
+        return (self.first_year is None or year >= self.first_year) and \
+               (self.last_year is None or year <= self.last_year)
+
+    def matches_raw(self, row):
+        """
+        Does:
+            Checks a row of strings from the CSV. The cheap string checks go
+            first, and only the fields that are needed get converted
+
+        Parameters:
+            •row (list of str)
+
+        Returns:
+            bool, whether the game should be kept
+        """
+        for col, values in self._category_checks:
+            if row[col] not in values:
+                return False
+
+        if self.first_year is not None or self.last_year is not None:
+            year = row[COLUMN_YEAR]
+            if year == 'N/A' or not self._year_ok(int(year)):
+                return False
+
+        if self.min_global_sales is not None:
+            sales = row[COLUMN_GLOBAL]
+            if sales == 'N/A' or parse_sales(sales) < self.min_global_sales:
+                return False
+
+        return True
+
+    def matches(self, row):
+        """
+        Does:
+            Checks an already converted row
+
+        Parameters:
+            •row (list)
+
+        Returns:
+            bool, whether the game should be kept
+        """
+        for col, values in self._category_checks:
+            if row[col] not in values:
+                return False
+        if not self._year_ok(row[COLUMN_YEAR]):
+            return False
+        if self.min_global_sales is not None and row[COLUMN_GLOBAL] < self.min_global_sales:
+            return False
+        return True
+
+    def table_rows(self, table):
+        """
+        Does:
+            Finds the rows of a GameTable that pass the filter, checking the
+            columns directly (category values are turned into codes first)
+
+        Parameters:
+            •table (GameTable)
+
+        Returns:
+            list of row ids
+        """
+        row_ids = range(len(table))
+
+        for col, values in self._category_checks:
+            codes = {code for code, value in enumerate(table.vocabularies[col]) if value in values}
+            column = table.columns[col]
+            row_ids = [row_id for row_id in row_ids if column[row_id] in codes]
+
+        if self.first_year is not None or self.last_year is not None:
+            years = table.columns[COLUMN_YEAR]
+            row_ids = [row_id for row_id in row_ids if self._year_ok(years[row_id])]
+
+        if self.min_global_sales is not None:
+            sales = table.columns[COLUMN_GLOBAL]
+            row_ids = [row_id for row_id in row_ids if sales[row_id] >= self.min_global_sales]
+
+        return list(row_ids)
+
+    def apply(self, data):
+        """
+        Does:
+            Filters data that has already been loaded
+
+        Parameters:
+            •data
+                •a GameTable, a sqlstore.SalesDatabase or a 2D list of
+            converted rows
+
+        Returns:
+            the same kind of data with only the matching games (for a
+            database, a view that only has them)
+        """
+        database_where = getattr(data, "where", None)
+        if database_where is not None:
+            return database_where(self)
+        if isinstance(data, GameTable):
+            return data.take(self.table_rows(data))
+        return [row for row in data if self.matches(row)]
+
+
+def _as_set(values):
+    # single strings become a set of one, collections become sets
+    if values is None:
+        return None
+    if isinstance(values, str):
+        return {values}
+    return set(values)
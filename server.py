@@ -0,0 +1,441 @@
+"""
+A small local HTTP service that loads the games once and answers the
+analyses as JSON, so dashboards don't pay for loading and cleaning the data
+on every call
+
+    python server.py --port 8000
+    curl "localhost:8000/region-totals"
+    curl "localhost:8000/genre-averages?first_year=2014&platform=PS4,XOne"
+    curl "localhost:8000/top?k=10&metric=jp&group=genre"
+    curl "localhost:8000/shares?normalize=column"
+    curl "localhost:8000/genre-windows?windows=2009:2012,2013:2016&platform=PS3"
+
+Every endpoint but genre-windows takes first_year (2013 by default, like
+the cleaned data, or 0 for every year), last_year, and comma separated
+lists of platform, genre and publisher to filter on. Sales are in single sales (1 million is 1000000)
+
+genre-windows is the exception: it gives the sales by genre by region for
+several year ranges at once (windows, or every range of width years)
+instead of first_year and last_year, filtered on platform and genre only,
+from running totals by year
+
+Answers are cached, and the work is done on a thread pool so the server
+keeps answering while something is being worked out. Identical requests
+that come in while the answer is still being worked out wait for that one
+answer instead of each working it out again
+"""
+import argparse
+import asyncio
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from clean import FILENAME, load_non_empty_table
+from analysis import calc_region_totals, find_genres, get_genre_sizes, get_genre_total_sales
+from analysis2 import get_all_genre_averages_by_region
+from cube import SalesCube
+from gametable import COLUMN_GENRE, COLUMN_NA, COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL
+from rowfilter import RowFilter
+from topk import top_k
+from columnar import COLUMN_NAMES
+from yearindex import YearIndex, parse_windows, sliding_windows, window_label
+
+REGIONS = ["NA", "EU", "JP", "Other"]
+REGIONS_TO_COLS = {"NA": COLUMN_NA, "EU": COLUMN_EU, "JP": COLUMN_JP, "Other": COLUMN_OTHER}
+
+# the columns top can rank by and group on
+METRICS = {"na": COLUMN_NA, "eu": COLUMN_EU, "jp": COLUMN_JP, "other": COLUMN_OTHER, "global": COLUMN_GLOBAL}
+GROUPS = ("genre", "platform", "year", "publisher")
+
+# how many answers are kept (the least recently used ones go first)
+CACHE_SIZE = 256
+
+# the most top will give per group
+MAX_K = 1000
+
+# the most year ranges one genre-windows request can ask for
+MAX_WINDOWS = 500
+
+# how long a kept-alive connection can sit waiting for its next request
+IDLE_TIMEOUT = 30
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error"}
+
+
+class QueryError(ValueError):
+    # a problem with the request itself (answered with a 400)
+    pass
+
+
+def _int_param(query, name, default=None):
+    values = query.get(name)
+    if not values or values[-1] == "":
+        return default
+    try:
+        return int(values[-1])
+    except ValueError:
+        raise QueryError("{} has to be a whole number, not {!r}".format(name, values[-1]))
+
+
+def _list_param(query, name):
+    # repeated (genre=Action&genre=Sports) or comma separated
+    values = [value for text in query.get(name, []) for value in text.split(",") if value]
+    return values or None
+
+
+def _choice_param(query, name, choices, default=None):
+    values = query.get(name)
+    if not values:
+        return default
+    if values[-1] not in choices:
+        raise QueryError("{} has to be one of {}, not {!r}".format(name, ", ".join(choices), values[-1]))
+    return values[-1]
+
+
+class Dataset:
+    """
+    Does:
+        Holds the loaded games, and the sales cube and year index built
+        from them, and works out the genre stats or filtered games a request
+        asks for
+
+    Attributes:
+        •table (GameTable)
+            •every game without missing data
+        •rows_in_file (int)
+        •cube (SalesCube)
+        •years (YearIndex)
+            •running totals by year of every genre and platform, for the
+            genre-windows endpoint
+    """
+
+    def __init__(self, table, rows_in_file):
+        self.table = table
+        self.rows_in_file = rows_in_file
+        self.cube = SalesCube.build(table)
+        self.years = YearIndex.from_cube(self.cube, ("genre", "platform"))
+
+    @classmethod
+    def load(cls, filename=FILENAME):
+        return cls(*load_non_empty_table(filename))
+
+    @staticmethod
+    def _filters(query):
+        first_year = _int_param(query, "first_year", 2013)
+        # 0 (or anything before the first game) means every year
+        if first_year is not None and first_year <= 0:
+            first_year = None
+        return {"first_year": first_year, "last_year": _int_param(query, "last_year"),
+                "platform": _list_param(query, "platform"), "genre": _list_param(query, "genre"),
+                "publisher": _list_param(query, "publisher")}
+
+    def genre_stats(self, query):
+        """
+        Does:
+            Gets the genre stats of the games a request filters down to, by
+            rolling up the cube
+
+        Parameters:
+            •query (dict)
+                •the parsed query string
+
+        Returns:
+            group_by result keyed by genre
+        """
+        filters = self._filters(query)
+        conditions = {dimension: set(filters[dimension]) for dimension in ("platform", "genre", "publisher")
+                      if filters[dimension] is not None}
+        return self.cube.genre_stats(filters["first_year"], filters["last_year"], **conditions)
+
+    def games(self, query):
+        """
+        Does:
+            Gets the games a request filters down to
+
+        Returns:
+            GameTable
+        """
+        filters = self._filters(query)
+        years = None
+        if filters["first_year"] is not None or filters["last_year"] is not None:
+            years = (filters["first_year"], filters["last_year"])
+        row_filter = RowFilter(years=years, platforms=filters["platform"], genres=filters["genre"],
+                               publishers=filters["publisher"])
+        return row_filter.apply(self.table)
+
+
+# the endpoints, each taking the dataset and the parsed query string and
+# giving back something that can be turned into JSON
+
+
+def region_totals(dataset, query):
+    return calc_region_totals(None, REGIONS, dataset.genre_stats(query))
+
+
+def genre_sizes(dataset, query):
+    genre_stats = dataset.genre_stats(query)
+    return get_genre_sizes(None, find_genres(None, genre_stats), genre_stats)
+
+
+def genre_sales(dataset, query):
+    genre_stats = dataset.genre_stats(query)
+    return get_genre_total_sales(None, find_genres(None, genre_stats), genre_stats)
+
+
+def genre_averages(dataset, query):
+    genre_stats = dataset.genre_stats(query)
+    return get_all_genre_averages_by_region(None, REGIONS_TO_COLS, find_genres(None, genre_stats),
+                                            COLUMN_GENRE, genre_stats)
+
+
+def _game_json(game):
+    return {name: game[col] for name, col in COLUMN_NAMES.items()}
+
+
+def top(dataset, query):
+    k = _int_param(query, "k", 5)
+    if not 0 < k <= MAX_K:
+        raise QueryError("k has to be between 1 and {}".format(MAX_K))
+    metric = METRICS[_choice_param(query, "metric", list(METRICS), "global")]
+    group = _choice_param(query, "group", GROUPS)
+
+    ranked = top_k(dataset.games(query), k, metric, COLUMN_NAMES[group] if group else None)
+    if group is None:
+        return [_game_json(game) for game in ranked]
+    return {str(key): [_game_json(game) for game in games] for key, games in ranked.items()}
+
+
+def shares(dataset, query):
+    # only loaded when it's asked for, since numpy takes a while to import
+    from heatmap import sales_matrix, share_matrix
+
+    normalize = _choice_param(query, "normalize", ["row", "column"], "row")
+    matrix, regions, genres = sales_matrix(region_totals(dataset, query), "total_sales")
+    return {"regions": regions, "genres": genres, "normalize": normalize,
+            "shares": share_matrix(matrix, normalize).tolist()}
+
+
+def genre_windows(dataset, query):
+    # the sales by genre by region for several ranges of years at once, e.g.
+    # windows=2009:2012,2013:2016, or every range of width years (step
+    # apart), each worked out from the year index
+    # the windows take the place of first_year and last_year
+    for name in ("first_year", "last_year"):
+        if name in query:
+            raise QueryError("genre-windows takes windows or width instead of {}".format(name))
+    if _list_param(query, "publisher") is not None:
+        raise QueryError("genre-windows can only be filtered on platform and genre")
+
+    width = _int_param(query, "width")
+    windows = _list_param(query, "windows")
+    if windows is not None:
+        try:
+            windows = parse_windows(",".join(windows))
+        except ValueError:
+            raise QueryError("windows has to be year ranges like 2009:2012,2013:2016")
+    elif width is not None:
+        step = _int_param(query, "step", 1)
+        if width < 1 or step < 1:
+            raise QueryError("width and step have to be at least 1")
+        years = dataset.years
+        windows = []
+        if years.first_year is not None:
+            windows = sliding_windows(years.first_year, years.last_year, width, step)
+    else:
+        raise QueryError("genre-windows needs windows (like 2009:2012,2013:2016) or width")
+    if len(windows) > MAX_WINDOWS:
+        raise QueryError("at most {} windows can be asked for at once".format(MAX_WINDOWS))
+
+    conditions = {dimension: set(values) for dimension, values in
+                  (("platform", _list_param(query, "platform")), ("genre", _list_param(query, "genre")))
+                  if values is not None}
+    return {window_label(window): calc_region_totals(None, REGIONS, dataset.years.genre_stats(*window, **conditions))
+            for window in windows}
+
+
+ENDPOINTS = {"/region-totals": region_totals, "/genre-sizes": genre_sizes, "/genre-sales": genre_sales,
+             "/genre-averages": genre_averages, "/top": top, "/shares": shares, "/genre-windows": genre_windows}
+
+
+class QueryService:
+    """
+    Does:
+        Answers requests for the endpoints, keeping the most recent answers
+        and making sure each one is only worked out once at a time
+
+    Attributes:
+        •dataset (Dataset)
+        •executor (ThreadPoolExecutor)
+            •where the answers are worked out, off the event loop
+        •cache (OrderedDict)
+            •request : (status, JSON bytes), least recently used first
+        •hits, misses (int)
+            •how many requests were answered from the cache or not
+        •shared (int)
+            •how many of the misses waited for the same request that was
+            already being worked out
+    """
+
+    def __init__(self, dataset, cache_size=CACHE_SIZE, threads=None):
+        self.dataset = dataset
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        # request : future of the answer, for answers still being worked out
+        self._working = {}
+
+    def _compute(self, path, query):
+        # runs on the thread pool
+        try:
+            body = ENDPOINTS[path](self.dataset, query)
+            status = 200
+        except QueryError as error:
+            body = {"error": str(error)}
+            status = 400
+        return status, json.dumps(body).encode("utf-8")
+
+    def stats(self):
+        return {"games": len(self.dataset.table), "rows_in_file": self.dataset.rows_in_file,
+                "cached": len(self.cache), "hits": self.hits, "misses": self.misses,
+                "shared": self.shared, "working": len(self._working)}
+
+    async def answer(self, path, query):
+        """
+        Does:
+            Gets the answer to a request: from the cache, by waiting for the
+            same request that's already being worked out, or by working it out
+            on the thread pool
+
+        Parameters:
+            •path (str)
+            •query (dict)
+                •the parsed query string
+
+        Returns:
+            tuple of the HTTP status and the JSON bytes
+        """
+        if path == "/stats":
+            return 200, json.dumps(self.stats()).encode("utf-8")
+        if path not in ENDPOINTS:
+            return 404, json.dumps({"error": "no endpoint " + path,
+                                    "endpoints": sorted(ENDPOINTS) + ["/stats"]}).encode("utf-8")
+
+        key = (path, tuple(sorted((name, tuple(values)) for name, values in query.items())))
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        working = self._working.get(key)
+        if working is None:
+            loop = asyncio.get_running_loop()
+            working = loop.run_in_executor(self.executor, self._compute, path, query)
+            self._working[key] = working
+            try:
+                # shielded so a connection going away can't cancel the work
+                # the other requests are waiting on
+                answer = await asyncio.shield(working)
+            finally:
+                del self._working[key]
+
+            self.cache[key] = answer
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            return answer
+
+        # someone else is already working it out
+        self.shared += 1
+        return await asyncio.shield(working)
+
+    async def handle_connection(self, reader, writer):
+        """
+        Does:
+            Reads HTTP requests from a connection and writes back the answers,
+            keeping the connection open between requests unless the client
+            asks not to
+        """
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                    # blank lines before a request are allowed (and skipped)
+                    while request_line in (b"\r\n", b"\n"):
+                        request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+
+                parts = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                if len(parts) != 3:
+                    status, body = 400, json.dumps({"error": "bad request line"}).encode("utf-8")
+                    keep_alive = False
+                else:
+                    method, target, version = parts
+                    keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                    if method != "GET":
+                        status, body = 405, json.dumps({"error": "only GET is supported"}).encode("utf-8")
+                    else:
+                        url = urlsplit(target)
+                        try:
+                            status, body = await self.answer(url.path.rstrip("/") or "/", parse_qs(url.query))
+                        except Exception as error:
+                            status, body = 500, json.dumps({"error": repr(error)}).encode("utf-8")
+
+                writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                             "Connection: {}\r\n\r\n".format(status, STATUS_TEXT[status], len(body),
+                                                            "keep-alive" if keep_alive else "close")
+                             .encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(service, host="127.0.0.1", port=8000):
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    addresses = ", ".join("{}:{}".format(*sock.getsockname()[:2]) for sock in server.sockets)
+    print("Serving on", addresses, flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the analyses as JSON over HTTP")
+    parser.add_argument("--file", default=FILENAME, help="CSV (or .vgt) file to load (default: %(default)s)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="threads to work out answers with (default: Python's thread pool default)")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE,
+                        help="how many answers to keep (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    service = QueryService(Dataset.load(args.file), args.cache_size, args.threads)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Merges monthly snapshots of the sales chart into one cleaned dataset, with
+every game in it once and the figures from the latest snapshot it's in
+
+    python snapshots.py 2024-01.csv 2024-02.csv 2024-03.csv -o merged.vgt
+    python snapshots.py snapshots/*.csv --order name -o merged.vgt
+    python -m vgsales report --file merged.vgt
+
+Games are matched on (name, platform, year) through a hash index of where
+each one is in the merged table, so every row costs one lookup no matter how
+many snapshots there are, and memory only grows with the number of different
+games (the snapshots are read a batch at a time)
+"""
+import argparse
+import csv
+import os
+from array import array
+
+from clean import convert_columns, CONVERT_BATCH
+from gametable import GameTable, NUM_COLUMNS, COLUMN_NAME, COLUMN_PLATFORM, COLUMN_YEAR
+from instrument import profiled
+import memo
+
+# the ways the snapshots can be put in order (the last one's figures win)
+ORDERS = ("given", "name", "mtime")
+
+
+class SnapshotMerger:
+    """
+    Does:
+        Builds the merged table one snapshot at a time. A game that's already
+        in the table has its row overwritten with the newer figures (rank,
+        genre, publisher and sales), and a new game is added to the end, so
+        the games stay in the order they first showed up
+
+        Rows with 'N/A' anywhere are left out, like remove_missing_data, so
+        a game whose newer row is missing something keeps its older figures
+
+    Attributes:
+        •table (GameTable)
+            •the merged games
+        •index (dict)
+            •(name, platform, year) : row id in the table
+        •source (array of int)
+            •for every row, which snapshot (counting from 0) its figures are
+            from
+        •snapshots (list of str)
+            •the files that have been added, in order
+        •rows_read, rows_dropped, rows_replaced (int)
+            •how many rows were read from every snapshot, left out for
+            missing data, and used to overwrite a game that was already in
+            the table
+        •dropped_games (set)
+            •(name, platform, year) of every row left out for missing data
+            (the year stays as text when it's the thing that's missing)
+    """
+
+    def __init__(self):
+        self.table = GameTable()
+        self.index = {}
+        self.source = array("i")
+        self.snapshots = []
+        self.rows_read = 0
+        self.rows_dropped = 0
+        self.rows_replaced = 0
+        self.dropped_games = set()
+
+    def _add_batch(self, rows, snapshot):
+        """
+        Does:
+            Converts a batch of raw rows and puts each one into the table:
+            new games are collected and added together, and games that are
+            already in the table are overwritten where they are
+
+        Parameters:
+            •rows (list of lists of str)
+                •rows without missing data
+            •snapshot (int)
+                •which snapshot they're from
+
+        Returns:
+            None
+        """
+        columns, missing = convert_columns(rows)
+        table = self.table
+        index = self.index
+        rows_before = len(table)
+
+        # positions (in the batch) of the games that are new, in order
+        new_rows = []
+        # (row id, position in the batch) of the games to overwrite
+        replacements = []
+
+        for position, key in enumerate(zip(columns[COLUMN_NAME], columns[COLUMN_PLATFORM], columns[COLUMN_YEAR])):
+            row_id = index.get(key)
+            if row_id is None:
+                index[key] = rows_before + len(new_rows)
+                new_rows.append(position)
+            elif row_id >= rows_before:
+                # the same game twice in one batch: the later row wins
+                new_rows[row_id - rows_before] = position
+                self.rows_replaced += 1
+            else:
+                replacements.append((row_id, position))
+                self.rows_replaced += 1
+
+        table.append_columns([[column[position] for position in new_rows] for column in columns])
+        self.source.extend([snapshot] * len(new_rows))
+
+        # overwriting the older figures (the category values have to be
+        # turned into this table's codes first)
+        for col in range(NUM_COLUMNS):
+            target = table.columns[col]
+            values = columns[col]
+            if col in table.vocabularies:
+                for row_id, position in replacements:
+                    target[row_id] = table.encode(col, values[position])
+            else:
+                for row_id, position in replacements:
+                    target[row_id] = values[position]
+        for row_id, position in replacements:
+            self.source[row_id] = snapshot
+
+        # the table's length might not have changed, so anything remembered
+        # about it has to be worked out again
+        if replacements:
+            memo.forget_table(table)
+
+    def add_snapshot(self, filename):
+        """
+        Does:
+            Reads one snapshot (same columns as vgsales.csv) into the merged
+            table, a batch at a time. Its figures replace those of any
+            snapshot added before it
+
+        Parameters:
+            •filename (str)
+
+        Returns:
+            int number of rows in the file
+        """
+        snapshot = len(self.snapshots)
+        self.snapshots.append(filename)
+        rows_read = 0
+
+        with open(filename) as csvfile:
+            reader = csv.reader(csvfile, delimiter=",")
+
+            # skip first line so that the header isn't used in the data set
+            next(reader, None)
+
+            batch = []
+            for row in reader:
+                rows_read += 1
+                if 'N/A' in row:
+                    self.rows_dropped += 1
+                    year = row[COLUMN_YEAR]
+                    self.dropped_games.add((row[COLUMN_NAME], row[COLUMN_PLATFORM],
+                                            year if year == 'N/A' else int(year)))
+                    continue
+                batch.append(row)
+                if len(batch) == CONVERT_BATCH:
+                    self._add_batch(batch, snapshot)
+                    batch = []
+            if batch:
+                self._add_batch(batch, snapshot)
+
+        self.rows_read += rows_read
+        return rows_read
+
+    def games_seen(self):
+        """
+        Does:
+            Counts the different games in every snapshot, including the
+            ones that were only ever left out for missing data (what a single
+            file's "games in the original data set" would be)
+
+        Returns:
+            int
+        """
+        index = self.index
+        return len(self.table) + sum(1 for key in self.dropped_games if key not in index)
+
+
+def order_snapshots(filenames, order="given"):
+    """
+    Does:
+        Puts the snapshot files in the order they should be merged in (oldest
+        first, so the newest figures win)
+
+    Parameters:
+        •filenames (list of str)
+        •order (str)
+            •"given" keeps them as they are, "name" sorts by file name (for
+            names with the date in them, like 2024-03.csv) and "mtime" by
+            when they were last changed
+
+    Returns:
+        list of str
+    """
+    if order not in ORDERS:
+        raise ValueError("unknown order {!r} (expected one of {})".format(order, ORDERS))
+    if order == "name":
+        return sorted(filenames, key=os.path.basename)
+    if order == "mtime":
+        return sorted(filenames, key=os.path.getmtime)
+    return list(filenames)
+
+
+@profiled
+def merge_snapshots(filenames, order="given"):
+    """
+    Does:
+        Merges several snapshots into one cleaned dataset (see SnapshotMerger)
+
+    Parameters:
+        •filenames (list of str)
+        •order (str)
+            •see order_snapshots
+
+    Returns:
+        tuple of the merged GameTable (without missing data) and the
+        SnapshotMerger, which has the index and counts
+    """
+    merger = SnapshotMerger()
+    for filename in order_snapshots(filenames, order):
+        merger.add_snapshot(filename)
+    return merger.table, merger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge sales chart snapshots, keeping each game's latest figures")
+    parser.add_argument("snapshots", nargs="+", help="CSV files with the same columns as vgsales.csv")
+    parser.add_argument("--order", choices=ORDERS, default="given",
+                        help="how to put the snapshots in order, oldest first (default: %(default)s)")
+    parser.add_argument("-o", "--output",
+                        help="columnar .vgt file to write the merged games to (which any of the "
+                             "scripts can then read with --file)")
+    args = parser.parse_args()
+
+    table, merger = merge_snapshots(args.snapshots, args.order)
+    for snapshot, filename in enumerate(merger.snapshots):
+        print("{}: latest figures for {} games".format(filename, merger.source.count(snapshot)))
+    print("Read {} rows: {} different games, {} newer figures for games already seen, "
+          "{} rows left out for missing data".format(merger.rows_read, len(table), merger.rows_replaced,
+                                                     merger.rows_dropped))
+
+    if args.output:
+        # only loaded when it's written, and kept in the merged order
+        from columnar import write_table
+        write_table(args.output, table, merger.games_seen(), sort_by_year=False)
+        print("Wrote", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+Keeps the cleaned games in a SQLite database with indexes on year, genre,
+platform and publisher, for asking lots of questions of a big history without
+holding it all in memory
+
+    database = open_database("vgsales.csv")          # built once, then reused
+    cleaned = database.where(RowFilter(years=(2013, None)))
+    calc_region_totals(cleaned, ["NA", "EU", "JP", "Other"])
+    rank_top_x(cleaned, COLUMN_NAME, 5)
+
+A SalesDatabase (or a filtered view of one) can be handed to group_by and
+top_k in place of a GameTable, and they run as SQL (GROUP BY, or ORDER BY
+with a LIMIT) instead of going through the games in Python, so every
+analysis function built on them does too. It can also be iterated as rows,
+for anything that needs them
+"""
+import json
+import os
+import sqlite3
+
+import cache
+from clean import load_non_empty_table
+from gametable import (COLUMN_RANK, COLUMN_NAME, COLUMN_PLATFORM, COLUMN_YEAR, COLUMN_GENRE,
+                       COLUMN_PUBLISHER, COLUMN_NA, COLUMN_EU, COLUMN_JP, COLUMN_OTHER, COLUMN_GLOBAL,
+                       NUM_COLUMNS)
+from instrument import profiled
+
+DATABASE_EXTENSION = ".sqlite"
+
+# has to be changed whenever the schema (or what's stored in it) changes, so
+# older databases get rebuilt
+DATABASE_VERSION = 1
+
+# the name of each column in the games table (sales are whole single sales,
+# like in the GameTable)
+SQL_COLUMNS = {COLUMN_RANK: "rank", COLUMN_NAME: "name", COLUMN_PLATFORM: "platform",
+               COLUMN_YEAR: "year", COLUMN_GENRE: "genre", COLUMN_PUBLISHER: "publisher",
+               COLUMN_NA: "na_sales", COLUMN_EU: "eu_sales", COLUMN_JP: "jp_sales",
+               COLUMN_OTHER: "other_sales", COLUMN_GLOBAL: "global_sales"}
+
+# every column, in the usual order, ready to go in a SELECT
+_ALL_COLUMNS = ", ".join('"{}"'.format(SQL_COLUMNS[col]) for col in range(NUM_COLUMNS))
+
+_SCHEMA = """
+CREATE TABLE games (
+    "rank" INTEGER, "name" TEXT, "platform" TEXT, "year" INTEGER, "genre" TEXT, "publisher" TEXT,
+    "na_sales" INTEGER, "eu_sales" INTEGER, "jp_sales" INTEGER, "other_sales" INTEGER,
+    "global_sales" INTEGER
+);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# made after the games are in, which is quicker than keeping them up to date
+# while inserting
+_INDEXES = """
+CREATE INDEX games_year ON games ("year");
+CREATE INDEX games_genre ON games ("genre");
+CREATE INDEX games_platform ON games ("platform");
+CREATE INDEX games_publisher ON games ("publisher");
+"""
+
+
+def database_path(filename):
+    """
+    Does:
+        Works out where the database for a CSV file is kept (in the same
+        folder as its binary cache)
+
+    Parameters:
+        •filename (str)
+
+    Returns:
+        str path of the database
+    """
+    folder, base = os.path.split(os.path.abspath(filename))
+    return os.path.join(folder, cache.CACHE_DIR, base + DATABASE_EXTENSION)
+
+
+def _column(col):
+    if col not in SQL_COLUMNS:
+        raise ValueError("there's no column {!r}".format(col))
+    return '"{}"'.format(SQL_COLUMNS[col])
+
+
+def _filter_sql(row_filter):
+    """
+    Does:
+        Turns a rowfilter.RowFilter into SQL conditions (which the indexes
+        can be used for)
+
+    Parameters:
+        •row_filter (RowFilter)
+
+    Returns:
+        tuple of the list of conditions and the list of their parameters
+    """
+    conditions = []
+    parameters = []
+
+    if row_filter.first_year is not None:
+        conditions.append('"year" >= ?')
+        parameters.append(row_filter.first_year)
+    if row_filter.last_year is not None:
+        conditions.append('"year" <= ?')
+        parameters.append(row_filter.last_year)
+
+    for col, values in ((COLUMN_GENRE, row_filter.genres), (COLUMN_PLATFORM, row_filter.platforms),
+                        (COLUMN_PUBLISHER, row_filter.publishers)):
+        if values is not None:
+            values = sorted(values)
+            conditions.append("{} IN ({})".format(_column(col), ", ".join("?" * len(values))))
+            parameters.extend(values)
+
+    if row_filter.min_global_sales is not None:
+        conditions.append('"global_sales" >= ?')
+        parameters.append(row_filter.min_global_sales)
+
+    return conditions, parameters
+
+
+class SalesDatabase:
+    """
+    Does:
+        A SQLite database of games, or a filtered view of one (see where).
+        Every question asked of it only looks at the games that pass its
+        filters
+
+    Attributes:
+        •connection (sqlite3.Connection)
+            •shared by every view of the same database
+        •rows_in_file (int)
+            •how many games the CSV had before anything was removed
+        •filters (tuple)
+            •the RowFilters a game has to pass to be in this view
+    """
+
+    def __init__(self, connection, rows_in_file, filters=()):
+        self.connection = connection
+        self.rows_in_file = rows_in_file
+        self.filters = tuple(filters)
+
+        # the WHERE clause is worked out once for the view
+        conditions = []
+        self._parameters = []
+        for row_filter in self.filters:
+            more_conditions, more_parameters = _filter_sql(row_filter)
+            conditions.extend(more_conditions)
+            self._parameters.extend(more_parameters)
+        self._where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    @classmethod
+    def create(cls, path, table, rows_in_file=None, source=None):
+        """
+        Does:
+            Writes a GameTable into a new database (replacing any old one) and
+            indexes it
+
+        Parameters:
+            •path (str)
+                •where to write it, or ":memory:" to keep it in memory
+            •table (GameTable)
+                •normally the games without missing data
+            •rows_in_file (int or None)
+                •how many games the CSV had (the table's length if None)
+            •source (dict or None)
+                •the size and mtime of the CSV, so open_database can tell
+                when it changes
+
+        Returns:
+            SalesDatabase
+        """
+        rows_in_file = len(table) if rows_in_file is None else rows_in_file
+
+        # built in a temporary file and then swapped in, so a half built
+        # database is never opened
+        building = path if path == ":memory:" else path + ".tmp"
+        if building != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            if os.path.exists(building):
+                os.remove(building)
+
+        connection = sqlite3.connect(building)
+        with connection:
+            connection.executescript(_SCHEMA)
+            columns = [table.decoded(col) for col in range(NUM_COLUMNS)]
+            connection.executemany("INSERT INTO games VALUES ({})".format(", ".join("?" * NUM_COLUMNS)),
+                                   zip(*columns))
+            connection.executescript(_INDEXES)
+            connection.executemany("INSERT INTO meta VALUES (?, ?)",
+                                   [("version", json.dumps(DATABASE_VERSION)),
+                                    ("rows_in_file", json.dumps(rows_in_file)),
+                                    ("source", json.dumps(source))])
+
+        if building != path:
+            connection.close()
+            os.replace(building, path)
+            connection = sqlite3.connect(path)
+
+        return cls(connection, rows_in_file)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Does:
+            Opens a database made with create
+
+        Parameters:
+            •path (str)
+
+        Returns:
+            tuple of the SalesDatabase and the source it was made from (see
+            create), or None if there's no usable database there
+        """
+        if not os.path.exists(path):
+            return None
+
+        connection = sqlite3.connect(path)
+        try:
+            meta = {key: json.loads(value) for key, value in connection.execute("SELECT key, value FROM meta")}
+        except (sqlite3.DatabaseError, ValueError):
+            connection.close()
+            return None
+
+        if meta.get("version") != DATABASE_VERSION:
+            connection.close()
+            return None
+        return cls(connection, meta["rows_in_file"]), meta.get("source")
+
+    def close(self):
+        self.connection.close()
+
+    def where(self, row_filter):
+        """
+        Does:
+            Makes a view of only the games that pass a filter (as well as
+            any filters this view already has). Nothing is copied; the
+            filter just becomes part of every query
+
+        Parameters:
+            •row_filter (rowfilter.RowFilter)
+
+        Returns:
+            SalesDatabase
+        """
+        return SalesDatabase(self.connection, self.rows_in_file, self.filters + (row_filter,))
+
+    def _select(self, sql, parameters=()):
+        # runs a query on the view's games (sql has {where} where the
+        # conditions go)
+        return self.connection.execute(sql.format(where=self._where), self._parameters + list(parameters))
+
+    def __len__(self):
+        return self._select("SELECT COUNT(*) FROM games{where}").fetchone()[0]
+
+    def __iter__(self):
+        # the rows come out in the same order (and format) as the GameTable
+        for row in self._select("SELECT " + _ALL_COLUMNS + " FROM games{where} ORDER BY rowid"):
+            yield list(row)
+
+    @profiled
+    def running_totals(self, key, value_cols):
+        """
+        Does:
+            Works out the count and the sum, min and max of each value column
+            for every group with one GROUP BY. The groups are kept in the
+            order they first show up, like aggregate.running_totals
+
+        Parameters:
+            •key
+                •None, a column index, or a tuple of column indexes
+            •value_cols (list of ints)
+
+        Returns:
+            dict of group key : [count, sums, mins, maxes]
+        """
+        if key is None:
+            key_cols = []
+        elif isinstance(key, tuple):
+            key_cols = list(key)
+        else:
+            key_cols = [key]
+
+        keys = [_column(col) for col in key_cols]
+        values = [_column(col) for col in value_cols]
+        selected = keys + ["COUNT(*)"] + ["SUM({})".format(value) for value in values] + \
+            ["MIN({})".format(value) for value in values] + ["MAX({})".format(value) for value in values]
+
+        sql = "SELECT " + ", ".join(selected) + " FROM games{where}"
+        if keys:
+            sql += " GROUP BY " + ", ".join(keys) + " ORDER BY MIN(rowid)"
+
+        groups = {}
+        width = len(values)
+        for row in self._select(sql):
+            count = row[len(keys)]
+            # with no key there's always one row back, even with no games
+            if count == 0:
+                continue
+
+            if key is None:
+                group_key = None
+            elif isinstance(key, tuple):
+                group_key = tuple(row[:len(keys)])
+            else:
+                group_key = row[0]
+
+            start = len(keys) + 1
+            groups[group_key] = [count, list(row[start:start + width]),
+                                 list(row[start + width:start + 2 * width]),
+                                 list(row[start + 2 * width:start + 3 * width])]
+        return groups
+
+    @profiled
+    def top_k(self, k, metric=COLUMN_GLOBAL, group=None):
+        """
+        Does:
+            Finds the k games with the highest value of a column (per group,
+            if there's a group), letting SQLite sort and cut them off. Ties
+            keep the earlier game, like topk.top_k
+
+        Parameters:
+            •k (int)
+            •metric (int)
+                •column index to rank by
+            •group
+                •None, a column index, or a tuple of column indexes
+
+        Returns:
+            the same as topk.top_k
+        """
+        if k <= 0:
+            return [] if group is None else {}
+
+        metric = _column(metric)
+
+        if group is None:
+            rows = self._select("SELECT " + _ALL_COLUMNS + " FROM games{where} "
+                                "ORDER BY " + metric + " DESC, rowid LIMIT ?", [k])
+            return [list(row) for row in rows]
+
+        group_cols = list(group) if isinstance(group, tuple) else [group]
+        partition = ", ".join(_column(col) for col in group_cols)
+
+        # numbering the games within each group, best first, and keeping the
+        # groups in the order they first show up
+        rows = self._select(
+            "SELECT * FROM (SELECT " + _ALL_COLUMNS + ", "
+            "ROW_NUMBER() OVER (PARTITION BY " + partition + " ORDER BY " + metric + " DESC, rowid) AS place, "
+            "MIN(rowid) OVER (PARTITION BY " + partition + ") AS first_row "
+            "FROM games{where}) WHERE place <= ? ORDER BY first_row, place", [k])
+
+        ranked = {}
+        for row in rows:
+            game = list(row[:NUM_COLUMNS])
+            if isinstance(group, tuple):
+                group_key = tuple(game[col] for col in group_cols)
+            else:
+                group_key = game[group]
+            ranked.setdefault(group_key, []).append(game)
+        return ranked
+
+
+@profiled
+def open_database(filename, path=None, use_cache=True, workers=1):
+    """
+    Does:
+        Gets the SQLite database of a CSV file's cleaned games, building it
+        (from the binary cache when it can) if there isn't one yet or the CSV
+        has changed since it was built
+
+    Parameters:
+        •filename (str)
+            •the CSV file (or a columnar .vgt file)
+        •path (str or None)
+            •where the database is kept (next to the binary cache by default)
+        •use_cache (bool)
+            •False to always rebuild the database from the CSV
+        •workers (int or None)
+            •how many processes to parse the CSV with if it has to be parsed
+
+    Returns:
+        SalesDatabase of every game without missing data
+    """
+    path = path or database_path(filename)
+    stat = os.stat(filename)
+    source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    if use_cache:
+        opened = SalesDatabase.open(path)
+        if opened is not None:
+            database, built_from = opened
+            if built_from == source:
+                return database
+            database.close()
+
+    table, rows_in_file = load_non_empty_table(filename, use_cache, workers)
+    return SalesDatabase.create(path, table, rows_in_file, source)
@@ -0,0 +1,184 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+from gametable import COLUMN_PLATFORM, COLUMN_GENRE, COLUMN_PUBLISHER, COLUMN_YEAR
+
+# the columns that get a list of row ids for each of their values
+INDEXED_COLUMNS = {"genre": COLUMN_GENRE, "platform": COLUMN_PLATFORM,
+                   "publisher": COLUMN_PUBLISHER}
+
+
+class TableIndex:
+    """
+    Does:
+        Indexes a GameTable once so filtered questions only have to look at
+        the games that match, instead of checking every row:
+            •for genre, platform and publisher, a sorted array of the row ids
+            that have each value
+            •for year, every row id sorted by year, so a range of years is
+            one slice found with a binary search
+
+    Attributes:
+        •table (GameTable)
+            •the table that was indexed
+        •rows_by (dict)
+            •column index : list (by category code) of arrays of row ids
+        •year_rows (array)
+            •every row id, ordered by year (and by row id within a year)
+        •sorted_years (array)
+            •the years of year_rows, in the same order
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+        # one pass over each category column, dropping each row id into the
+        # list for its code (the ids go in ascending order on their own)
+        self.rows_by = {}
+        for col in INDEXED_COLUMNS.values():
+            lists = [array("i") for value in table.vocabularies[col]]
+            for row_id, code in enumerate(table.columns[col]):
+                lists[code].append(row_id)
+            self.rows_by[col] = lists
+
+        # sorting is stable, so rows from the same year stay in id order
+        years = table.columns[COLUMN_YEAR]
+        self.year_rows = array("i", sorted(range(len(table)), key=years.__getitem__))
+        self.sorted_years = array("i", [years[row_id] for row_id in self.year_rows])
+
+    def _codes(self, col, values):
+        """
+        Does:
+            Turns one value or a collection of values into the set of their
+            codes, ignoring any that aren't in the table at all
+        """
+        if isinstance(values, str):
+            values = [values]
+        codes = {self.table.lookup_code(col, value) for value in values}
+        codes.discard(None)
+        return codes
+
+    def _rows_for_codes(self, col, codes):
+        # a single code's rows are already a sorted array; several have to be merged
+        if len(codes) == 1:
+            return self.rows_by[col][next(iter(codes))]
+        merged = []
+        for code in codes:
+            merged.extend(self.rows_by[col][code])
+        return array("i", sorted(merged))
+
+    def rows_with(self, column, values):
+        """
+        Does:
+            Gets the rows that have a value (or any of several values) in an
+            indexed category column
+
+        Parameters:
+            •column (str)
+                •"genre", "platform" or "publisher"
+            •values (str or collection of str)
+
+        Returns:
+            array of row ids in ascending order
+        """
+        col = INDEXED_COLUMNS[column]
+        return self._rows_for_codes(col, self._codes(col, values))
+
+    def rows_in_years(self, first_year=None, last_year=None):
+        """
+        Does:
+            Gets the rows released between two years (both included) using a
+            binary search on the sorted years
+
+        Parameters:
+            •first_year, last_year (int or None)
+                •None leaves that end of the range open
+
+        Returns:
+            array of row ids in ascending order
+        """
+        start = 0 if first_year is None else bisect_left(self.sorted_years, first_year)
+        end = len(self.sorted_years) if last_year is None else bisect_right(self.sorted_years, last_year)
+        return array("i", sorted(self.year_rows[start:end]))
+
+    def _year_range_size(self, first_year, last_year):
+        # how many rows a year range would give, without building it
+        start = 0 if first_year is None else bisect_left(self.sorted_years, first_year)
+        end = len(self.sorted_years) if last_year is None else bisect_right(self.sorted_years, last_year)
+        return max(0, end - start)
+
+    def select(self, genre=None, platform=None, publisher=None, years=None):
+        """
+        Does:
+            Finds the rows that match every given condition, e.g.
+            select(genre="Action", platform="PS4", years=(2014, 2016))
+
+            The condition that matches the fewest rows is looked up in its
+            index, and only those rows are checked against the others (by
+            looking at their cells directly), so the work depends on how many
+            rows match rather than on the size of the table
+
+        Parameters:
+            •genre, platform, publisher (str, collection of str, or None)
+                •None means that column isn't filtered on
+            •years (tuple of two ints or None)
+                •first and last year to include (either can be None)
+
+        Returns:
+            array of matching row ids in ascending order
+        """
+        conditions = {}
+        for column, values in (("genre", genre), ("platform", platform), ("publisher", publisher)):
+            if values is not None:
+                col = INDEXED_COLUMNS[column]
+                conditions[column] = (col, self._codes(col, values))
+
+        # with nothing to filter on, every row matches
+        if not conditions and years is None:
+            return array("i", range(len(self.table)))
+
+        # working out which condition narrows things down the most
+        sizes = {column: sum(len(self.rows_by[col][code]) for code in codes)
+                 for column, (col, codes) in conditions.items()}
+        if years is not None:
+            sizes["years"] = self._year_range_size(*years)
+        smallest = min(sizes, key=sizes.get)
+
+        if smallest == "years":
+            candidates = self.rows_in_years(*years)
+            years = None
+        else:
+            col, codes = conditions.pop(smallest)
+            candidates = self._rows_for_codes(col, codes)
+
+        # checking the candidates against the rest of the conditions by
+        # looking at their cells directly
+        checks = [(self.table.columns[col], codes) for col, codes in conditions.values()]
+        years_column = self.table.columns[COLUMN_YEAR]
+        first_year, last_year = years if years is not None else (None, None)
+
+        matching = array("i")
+        for row_id in candidates:
+            if any(column[row_id] not in codes for column, codes in checks):
+                continue
+            if years is not None:
+                year = years_column[row_id]
+                if (first_year is not None and year < first_year) or \
+                        (last_year is not None and year > last_year):
+                    continue
+            matching.append(row_id)
+
+        return matching
+
+    def select_table(self, **conditions):
+        """
+        Does:
+            Same as select, but gives back a GameTable of the matching games
+
+        Parameters:
+            •the same keyword conditions as select
+
+        Returns:
+            GameTable
+        """
+        return self.table.take(self.select(**conditions))
@@ -0,0 +1,115 @@
+from heapq import heappush, heapreplace
+
+from gametable import GameTable, COLUMN_GLOBAL
+from aggregate import key_function, table_pairs
+from instrument import profiled
+from memo import memoized
+
+
+def _metric_function(metric):
+    # a column index or a function that takes a row
+    if callable(metric):
+        return metric
+    return lambda row: row[metric]
+
+
+def _offer(heaps, group, k, value, order, item):
+    """
+    Does:
+        Offers one game to its group's heap, which holds that group's best k
+        games so far with the worst of them on top. A game only gets in if it
+        beats the worst one, and since it came later than everything already
+        in the heap, a tie isn't enough (so ties keep the earlier game)
+
+    Parameters:
+        •heaps (dict)
+            •group : heap list of (value, -order, item)
+        •group
+            •the game's group key
+        •k (int)
+        •value
+            •the game's metric
+        •order (int)
+            •the game's position in the data
+        •item
+            •what to keep for the game (its row, or its row id in a table)
+
+    Returns:
+        None
+    """
+    heap = heaps.get(group)
+    if heap is None:
+        heap = heaps[group] = []
+
+    if len(heap) < k:
+        heappush(heap, (value, -order, item))
+    elif value > heap[0][0]:
+        heapreplace(heap, (value, -order, item))
+
+
+@profiled
+@memoized
+def top_k(data, k, metric=COLUMN_GLOBAL, group=None):
+    """
+    Does:
+        Finds the k games with the highest value of a metric (global sales by
+        default), optionally the top k within each group, going through the
+        data once and only ever keeping k games per group in a heap
+        (O(n log k) instead of sorting everything)
+
+        It doesn't depend on the data being in any order, so it works on
+        streams (like clean.stream_cleaned_data) as well. Games with the same
+        value stay in the order they came in
+
+        To rank only some of the games (e.g. RPGs since 2014), filter them
+        first with a rowfilter.RowFilter
+
+    Parameters:
+        •data
+            •2D list of converted rows, a GameTable, a sqlstore.SalesDatabase
+            (which sorts them with SQL), or any iterable of rows
+        •k (int)
+            •how many games to keep (per group)
+        •metric
+            •the column index to rank by, or a function that takes a row
+        •group
+            •None for one ranking of everything, or a column index, tuple of
+            column indexes, or function that takes a row, for a ranking per
+            group (e.g. COLUMN_GENRE for the top k of each genre)
+
+    Returns:
+        list of the top rows (highest first), or if there's a group, a dict
+        of group : list of its top rows (in the order the groups first
+        appear)
+    """
+    # a database can sort and cut off the games itself
+    database_top_k = getattr(data, "top_k", None)
+    if database_top_k is not None and not callable(metric) and not callable(group):
+        return database_top_k(k, metric, group)
+
+    heaps = {}
+
+    if k > 0:
+        if isinstance(data, GameTable) and not callable(metric) and not callable(group):
+            # a table can be ranked straight from its columns, only building
+            # the rows that make it to the end
+            pairs, decode = table_pairs(data, group, [metric])
+            for row_id, (key, (value,)) in enumerate(pairs):
+                _offer(heaps, key, k, value, row_id, row_id)
+
+            ranked = {decode(key): [data[row_id] for value, order, row_id in sorted(heap, reverse=True)]
+                      for key, heap in heaps.items()}
+        else:
+            metric_of = _metric_function(metric)
+            key_of = key_function(group)
+            for order, row in enumerate(data):
+                _offer(heaps, key_of(row), k, metric_of(row), order, row)
+
+            ranked = {key: [row for value, order, row in sorted(heap, reverse=True)]
+                      for key, heap in heaps.items()}
+    else:
+        ranked = {}
+
+    if group is None:
+        return ranked.get(None, [])
+    return ranked
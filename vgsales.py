@@ -0,0 +1,133 @@
+"""
+Runs any of the project's outputs from one place, loading and cleaning the
+data only once and sharing it between them
+
+    python -m vgsales report
+    python -m vgsales heatmap bubble misc
+    python -m vgsales report --file other_sales.csv --no-cache
+    python -m vgsales report --profile          # time every stage
+    python -m vgsales report --sqlite           # run the analyses as SQL
+"""
+import argparse
+import sys
+
+import instrument
+import memo
+from clean import FILENAME, load_cleaned_data
+from aggregate import group_by_genre
+from cube import SalesCube
+from rowfilter import RowFilter
+from sqlstore import open_database
+
+
+def run_report(loaded):
+    # the conclusion uses all of the analysis functions
+    from conclusion import print_conclusion
+    print_conclusion(loaded["non_empty_data"], loaded["cleaned_data"],
+                     loaded["rows_in_file"], loaded["genre_stats"])
+
+
+def run_heatmap(loaded):
+    from heatmap import show_genre_heatmap
+    show_genre_heatmap(loaded["cleaned_data"], loaded["genre_stats"])
+
+
+def run_bubble(loaded):
+    from bubblechart import show_bubble_chart
+    show_bubble_chart(loaded["cleaned_data"], loaded["genre_stats"])
+
+
+def run_misc(loaded):
+    from misc import plot_genre_charts
+    plot_genre_charts(loaded["cleaned_data"], loaded["genre_stats"])
+
+
+# the subcommands and the function that runs each one
+COMMANDS = {"report": run_report, "heatmap": run_heatmap,
+            "bubble": run_bubble, "misc": run_misc}
+
+
+def load(filename, use_cache=True, workers=1, sqlite=None):
+    """
+    Does:
+        Loads and cleans the data and builds the sales cube from it, whose
+        genre stats are everything the subcommands need
+
+    Parameters:
+        •filename (str)
+            •the CSV file to read
+        •use_cache (bool)
+            •False to always parse the CSV instead of using the binary cache
+        •workers (int or None)
+            •how many processes to parse the CSV with (None for one per CPU)
+        •sqlite (str or None)
+            •to keep the games in a SQLite database instead (see sqlstore.py)
+            and run the analyses as SQL: the database's path, or "" for the
+            default one next to the cache
+
+    Returns:
+        dict with the non-empty data, the cleaned data, the number of rows in
+        the file, the cube of every year and the genre stats of the cleaned
+        data (2013 onwards)
+    """
+    if sqlite is not None:
+        # the data is then views of the database, and the cube and genre
+        # stats are worked out with GROUP BYs
+        database = open_database(filename, sqlite or None, use_cache, workers)
+        cleaned_data = database.where(RowFilter(years=(2013, None)))
+        return {"non_empty_data": database, "cleaned_data": cleaned_data,
+                "rows_in_file": database.rows_in_file, "cube": SalesCube.build(database),
+                "genre_stats": group_by_genre(cleaned_data)}
+
+    non_empty_data, cleaned_data, rows_in_file = load_cleaned_data(filename, use_cache, workers)
+    cube = SalesCube.build(non_empty_data)
+    return {"non_empty_data": non_empty_data, "cleaned_data": cleaned_data,
+            "rows_in_file": rows_in_file, "cube": cube, "genre_stats": cube.genre_stats()}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m vgsales",
+                                     description="Video game sales analysis")
+    parser.add_argument("commands", nargs="+", choices=list(COMMANDS),
+                        help="what to run (they all share one load of the data)")
+    parser.add_argument("--file", default=FILENAME,
+                        help="CSV file to read (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always parse the CSV instead of using the binary cache")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes to parse the CSV with, 0 for one per CPU (default: %(default)s)")
+    parser.add_argument("--sqlite", nargs="?", const="", metavar="PATH",
+                        help="keep the games in a SQLite database and run the analyses as SQL "
+                             "(at PATH, or next to the cache by default)")
+    parser.add_argument("--profile", nargs="?", const="table", choices=instrument.FORMATS,
+                        help="print how long each stage took, as a table (default) or json")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="also measure each stage's peak memory when profiling (slower)")
+    parser.add_argument("--memo-stats", action="store_true",
+                        help="print how often remembered results were reused (see memo.py)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.profile:
+        instrument.enable(args.profile, args.profile_memory)
+
+    loaded = load(args.file, use_cache=not args.no_cache, workers=args.workers or None, sqlite=args.sqlite)
+
+    for command in args.commands:
+        with instrument.measure("vgsales." + command):
+            COMMANDS[command](loaded)
+
+    if args.profile:
+        print(instrument.report(), file=sys.stderr)
+        # so it isn't printed again at exit if VGSALES_PROFILE is set too
+        instrument.reset()
+
+    if args.memo_stats:
+        print(memo.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
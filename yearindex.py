@@ -0,0 +1,456 @@
+"""
+Running totals by year for every genre (and optionally platform), so the
+sales of any range of years are two lookups and a subtraction instead of
+filtering the games again
+
+    index = YearIndex.build(non_empty_data, ("genre", "platform"))
+    index.total("Action", COLUMN_NA, 2009, 2012)    # every platform together
+    index.genre_stats(2009, 2012, platform="PS3")   # same format as group_by_genre
+
+    python yearindex.py --windows 2009:2012,2013:2016
+    python yearindex.py --width 4 --platform PS4,XOne
+
+It's built once over the unfiltered data (every year), and each answer
+takes the same time however many games or years there are, so dashboards
+sweeping lots of windows stay quick
+"""
+import argparse
+from array import array
+
+from gametable import COLUMN_YEAR, SALES_COLUMNS
+from aggregate import running_totals
+from cube import DIMENSION_COLUMNS
+
+REGIONS = ["NA", "EU", "JP", "Other"]
+
+
+def _check_dimensions(dimensions):
+    for dimension in dimensions:
+        if dimension == "year" or dimension not in DIMENSION_COLUMNS:
+            raise ValueError("unknown dimension {!r} (expected some of genre, platform, publisher)"
+                             .format(dimension))
+
+
+def sliding_windows(first_year, last_year, width, step=1):
+    """
+    Does:
+        Makes every window of a number of years between two years, like
+        2009-2012, 2010-2013, ... for a trend
+
+    Parameters:
+        •first_year, last_year (int)
+        •width (int)
+            •years in each window
+        •step (int)
+            •years between the start of one window and the next
+
+    Returns:
+        list of (first, last) year tuples
+    """
+    if width < 1 or step < 1:
+        raise ValueError("the width and step have to be at least 1")
+    return [(start, start + width - 1) for start in range(first_year, last_year - width + 2, step)]
+
+
+class YearIndex:
+    """
+    Does:
+        Keeps, for every group (a genre, or a genre and platform, ...), the
+        running total by year of its number of games and its sales in every
+        sales column. The total between two years is then the running total
+        at the last year take away the one just before the first year
+
+    Attributes:
+        •dimensions (tuple of str)
+            •what the groups are, e.g. ("genre",) or ("genre", "platform")
+        •first_year, last_year (int or None)
+            •the years in the data (None if there were no games)
+        •prefix (dict)
+            •group : list of arrays, the first for the number of games and
+            then one per sales column (in the order of SALES_COLUMNS). Entry
+            i is the total of the years before first_year + i, so each array
+            is one longer than the number of years
+            •a group is one value for one dimension, or a tuple of values,
+            in the order the groups first show up in the data
+        •overall (list of arrays)
+            •the same for every group together (for shares)
+        •genre_prefix (dict or None)
+            •genre : list of arrays, the groups added up by genre (the same
+            as prefix when genre is the only dimension), None if genre isn't
+            one of the dimensions
+    """
+
+    def __init__(self, totals, dimensions):
+        """
+        Parameters:
+            •totals (dict)
+                •(year, *group values) : (number of games, list of sales sums
+                in the order of SALES_COLUMNS)
+            •dimensions (tuple of str)
+        """
+        self.dimensions = dimensions
+        years = [key[0] for key in totals]
+        self.first_year = min(years) if years else None
+        self.last_year = max(years) if years else None
+        length = self.last_year - self.first_year + 2 if years else 1
+
+        # each year's numbers go in at its own spot first, and are then
+        # added up along the arrays
+        def empty():
+            return [array("q", bytes(8 * length)) for measure in range(len(SALES_COLUMNS) + 1)]
+
+        self.prefix = {}
+        self.overall = empty()
+        single = len(dimensions) == 1
+        for key, (count, sums) in totals.items():
+            group = key[1] if single else key[1:]
+            arrays = self.prefix.get(group)
+            if arrays is None:
+                arrays = self.prefix[group] = empty()
+
+            position = key[0] - self.first_year + 1
+            for measure, value in enumerate([count] + list(sums)):
+                arrays[measure][position] += value
+                self.overall[measure][position] += value
+
+        for arrays in list(self.prefix.values()) + [self.overall]:
+            for values in arrays:
+                for position in range(1, length):
+                    values[position] += values[position - 1]
+
+        self._group_order = {group: position for position, group in enumerate(self.prefix)}
+
+        # the groups that have each value of each dimension, in order, so a
+        # question about a few platforms only looks at their groups
+        self._groups_with = [{} for dimension in dimensions]
+        for group in self.prefix:
+            for position, value in enumerate((group,) if single else group):
+                self._groups_with[position].setdefault(value, []).append(group)
+
+        # the running totals of each genre on its own, so questions that
+        # aren't sliced on anything else don't have to add up every group
+        # (running totals can be added together like any other totals)
+        self.genre_prefix = None
+        if single and dimensions[0] == "genre":
+            self.genre_prefix = self.prefix
+        elif "genre" in dimensions:
+            self.genre_prefix = {}
+            genre_position = dimensions.index("genre")
+            for genre, groups in self._groups_with[genre_position].items():
+                arrays = self.genre_prefix[genre] = empty()
+                for group in groups:
+                    for values, running in zip(arrays, self.prefix[group]):
+                        for position in range(length):
+                            values[position] += running[position]
+
+    @classmethod
+    def build(cls, data, dimensions=("genre",)):
+        """
+        Does:
+            Builds the index from the games in one pass
+
+        Parameters:
+            •data
+                •a GameTable, SalesDatabase or 2D list of converted rows
+                (normally the non-empty data, so every year is in it)
+            •dimensions (str or tuple of str)
+                •what to keep running totals for: any of "genre",
+                "platform" and "publisher"
+
+        Returns:
+            YearIndex
+        """
+        if isinstance(dimensions, str):
+            dimensions = (dimensions,)
+        dimensions = tuple(dimensions)
+        _check_dimensions(dimensions)
+
+        key = (COLUMN_YEAR,) + tuple(DIMENSION_COLUMNS[dimension] for dimension in dimensions)
+        totals = {group_key: (running[0], running[1])
+                  for group_key, running in running_totals(data, key, SALES_COLUMNS).items()}
+        return cls(totals, dimensions)
+
+    @classmethod
+    def from_cube(cls, cube, dimensions=("genre",)):
+        """
+        Does:
+            Builds the index from a sales cube instead of the games (which
+            is quicker, since there are fewer cells than games)
+
+        Parameters:
+            •cube (SalesCube)
+            •dimensions (str or tuple of str)
+                •see build
+
+        Returns:
+            YearIndex
+        """
+        if isinstance(dimensions, str):
+            dimensions = (dimensions,)
+        dimensions = tuple(dimensions)
+        _check_dimensions(dimensions)
+
+        groups = cube.roll_up(("year",) + dimensions)
+        totals = {group_key: (stats["count"], [stats["sum"][col] for col in SALES_COLUMNS])
+                  for group_key, stats in groups.items()}
+        return cls(totals, dimensions)
+
+    def _bounds(self, first_year, last_year):
+        """
+        Does:
+            Turns a range of years into the two spots in the arrays to take
+            away from each other (years past either end of the data are
+            cut off)
+
+        Parameters:
+            •first_year, last_year (int or None)
+                •None for no limit on that end
+
+        Returns:
+            tuple of the two positions (the same one twice for no years)
+        """
+        if self.first_year is None:
+            return 0, 0
+        length = self.last_year - self.first_year + 1
+        start = 0 if first_year is None else min(max(first_year - self.first_year, 0), length)
+        end = length if last_year is None else min(max(last_year - self.first_year + 1, 0), length)
+        return start, max(start, end)
+
+    def _arrays(self, group):
+        # a group has to be one value for one dimension, or a tuple of one
+        # value per dimension, except that a bare genre on an index with more
+        # dimensions is answered from the genre totals
+        if len(self.dimensions) == 1:
+            if isinstance(group, tuple):
+                raise ValueError("the index only has {}, so a group is one value, not {!r}"
+                                 .format(self.dimensions[0], group))
+            return self.prefix.get(group)
+        if isinstance(group, tuple):
+            if len(group) != len(self.dimensions):
+                raise ValueError("a group needs one value for each of {}, not {!r}"
+                                 .format(", ".join(self.dimensions), group))
+            return self.prefix.get(group)
+        if self.genre_prefix is None:
+            raise ValueError("a group needs one value for each of {}, not {!r}"
+                             .format(", ".join(self.dimensions), group))
+        return self.genre_prefix.get(group)
+
+    def _measure(self, group, measure, first_year, last_year):
+        arrays = self._arrays(group)
+        if arrays is None:
+            return 0
+        start, end = self._bounds(first_year, last_year)
+        return arrays[measure][end] - arrays[measure][start]
+
+    def groups(self):
+        return list(self.prefix)
+
+    def count(self, group, first_year=None, last_year=None):
+        """
+        Does:
+            Gets how many games a group has in a range of years
+
+        Parameters:
+            •group
+                •a value, or a tuple of values for more than one dimension
+                (or just a genre, for every group with that genre)
+            •first_year, last_year (int or None)
+                •the years to include (both ends included), None for no
+                limit
+
+        Returns:
+            int (0 for a group that isn't in the data, and a ValueError for
+            a group that doesn't fit the dimensions)
+        """
+        return self._measure(group, 0, first_year, last_year)
+
+    def total(self, group, col, first_year=None, last_year=None):
+        """
+        Does:
+            Gets a group's total sales in a range of years
+
+        Parameters:
+            •group
+            •col (int)
+                •one of SALES_COLUMNS
+            •first_year, last_year (int or None)
+
+        Returns:
+            int number of single sales
+        """
+        return self._measure(group, SALES_COLUMNS.index(col) + 1, first_year, last_year)
+
+    def average(self, group, col, first_year=None, last_year=None):
+        """
+        Does:
+            Gets the average sales of a game from a group in a range of years
+
+        Returns:
+            float, or None if the group has no games in those years
+        """
+        count = self.count(group, first_year, last_year)
+        if count == 0:
+            return None
+        return self.total(group, col, first_year, last_year) / count
+
+    def share(self, group, col, first_year=None, last_year=None):
+        """
+        Does:
+            Gets a group's part of every group's sales in a range of years
+
+        Returns:
+            float between 0 and 1 (0 if nothing was sold in those years)
+        """
+        start, end = self._bounds(first_year, last_year)
+        measure = SALES_COLUMNS.index(col) + 1
+        everything = self.overall[measure][end] - self.overall[measure][start]
+        if everything == 0:
+            return 0.0
+        return self.total(group, col, first_year, last_year) / everything
+
+    def genre_stats(self, first_year=2013, last_year=None, **conditions):
+        """
+        Does:
+            Gives the same thing as aggregate.group_by_genre for a range of
+            years (without min and max, which can't be taken away), so it can
+            be handed to calc_region_totals, find_genres, get_genre_sizes,
+            get_genre_total_sales and get_all_genre_averages_by_region as
+            their genre_stats. Each group only takes two lookups, so this
+            takes the same time for any range of years
+
+        Parameters:
+            •first_year, last_year (int or None)
+                •the years to include (2013 onwards by default, like
+                remove_games_before_year)
+            •conditions
+                •values to keep for any of the other dimensions, like
+                platform="PS4" or platform={"PS4", "XOne"}
+
+        Returns:
+            dict of genre : {"count", "sum", "mean"}, in the order the genres
+            first show up in the data
+        """
+        if "genre" not in self.dimensions:
+            raise ValueError("the index doesn't have genres in it")
+        _check_dimensions(conditions)
+        for dimension in conditions:
+            if dimension not in self.dimensions:
+                raise ValueError("the index can't be sliced on {!r} (it only has {})"
+                                 .format(dimension, ", ".join(self.dimensions)))
+
+        start, end = self._bounds(first_year, last_year)
+        totals = {}
+
+        if not conditions:
+            for genre, arrays in self.genre_prefix.items():
+                totals[genre] = [running[end] - running[start] for running in arrays]
+        else:
+            checks = []
+            for dimension, wanted in conditions.items():
+                wanted = {wanted} if isinstance(wanted, str) else set(wanted)
+                checks.append((self.dimensions.index(dimension), wanted))
+
+            # only the groups with one of the wanted values of the first
+            # condition need to be looked at (kept in their usual order)
+            position, wanted = checks[0]
+            order = self._groups_with[position]
+            groups = sorted((group for value in wanted for group in order.get(value, ())),
+                            key=self._group_order.__getitem__)
+
+            single = len(self.dimensions) == 1
+            genre_position = self.dimensions.index("genre")
+            for group in groups:
+                values = (group,) if single else group
+                if not all(values[position] in wanted for position, wanted in checks[1:]):
+                    continue
+
+                genre_totals = totals.get(values[genre_position])
+                if genre_totals is None:
+                    genre_totals = totals[values[genre_position]] = [0] * (len(SALES_COLUMNS) + 1)
+                for measure, running in enumerate(self.prefix[group]):
+                    genre_totals[measure] += running[end] - running[start]
+
+        stats = {}
+        for genre, (count, *sums) in totals.items():
+            # genres with no games in those years are left out
+            if count == 0:
+                continue
+            sums = dict(zip(SALES_COLUMNS, sums))
+            stats[genre] = {"count": count, "sum": sums,
+                            "mean": {col: total / count for col, total in sums.items()}}
+        return stats
+
+    def nbytes(self):
+        """
+        Does:
+            Roughly measures how much memory the running totals take up
+
+        Returns:
+            int number of bytes
+        """
+        prefixes = list(self.prefix.values()) + [self.overall]
+        if self.genre_prefix is not None and self.genre_prefix is not self.prefix:
+            prefixes += list(self.genre_prefix.values())
+        return sum(values.itemsize * len(values) for arrays in prefixes for values in arrays)
+
+
+def parse_windows(text):
+    """
+    Does:
+        Turns a comma separated list of year ranges from the command line
+        (like "2009:2012,2013:2016") into their ends (see
+        columnar.parse_years)
+
+    Parameters:
+        •text (str)
+
+    Returns:
+        list of (first, last) year tuples
+    """
+    from columnar import parse_years
+    return [parse_years(window) for window in text.split(",") if window]
+
+
+def window_label(window):
+    first, last = window
+    if first == last:
+        return str(first)
+    return "{}-{}".format("" if first is None else first, "" if last is None else last)
+
+
+def main():
+    from clean import FILENAME, load_non_empty_table
+    from analysis import calc_region_totals, find_genres
+    from analysis2 import print_regional_values
+
+    parser = argparse.ArgumentParser(description="Genre sales by region for any ranges of years")
+    parser.add_argument("--file", default=FILENAME, help="CSV (or .vgt) file to read (default: %(default)s)")
+    parser.add_argument("--windows", help="comma separated year ranges, like 2009:2012,2013:2016")
+    parser.add_argument("--width", type=int,
+                        help="instead of --windows, every window of this many years in the data")
+    parser.add_argument("--step", type=int, default=1, help="years between the windows with --width")
+    parser.add_argument("--platform", help="comma separated platforms to only count")
+    args = parser.parse_args()
+
+    table, rows_in_file = load_non_empty_table(args.file)
+    dimensions = ("genre", "platform") if args.platform else ("genre",)
+    index = YearIndex.build(table, dimensions)
+
+    if args.windows:
+        windows = parse_windows(args.windows)
+    elif args.width:
+        windows = sliding_windows(index.first_year, index.last_year, args.width, args.step)
+    else:
+        windows = [(2009, 2012), (2013, 2016)]
+    conditions = {"platform": args.platform.split(",")} if args.platform else {}
+
+    for window in windows:
+        genre_stats = index.genre_stats(*window, **conditions)
+        print("Sales by genre by region, {}".format(window_label(window)))
+        print("-" * 60)
+        print_regional_values(calc_region_totals(None, REGIONS, genre_stats), find_genres(None, genre_stats))
+        print()
+
+
+if __name__ == "__main__":
+    main()